@@ -306,7 +306,17 @@ def label_editing_app(doc):
             load_button.button_type = "warning"
             alert_box.text = f"LFP file doesn't exist: {lfp_fn}"
             return
-        lfps = lpne.load_lfps(lfp_fn)
+        # Only load the displayed channels.
+        channels = [
+            channel_input.value
+            for channel_input in [
+                emg_channel_input,
+                hipp_channel_input,
+                cortical_channel_input,
+            ]
+            if len(channel_input.value) > 0
+        ]
+        lfps = lpne.load_lfps(lfp_fn, channels=channels)
 
         # Make sure the samplerate is valid.
         try:
@@ -336,17 +346,19 @@ def label_editing_app(doc):
         emg_channel = emg_channel_input.value
         hipp_channel = hipp_channel_input.value
         cortex_channel = cortical_channel_input.value
-        all_keys = sorted(list(lfps.keys()))
         if len(emg_channel) > 0 and emg_channel not in lfps:
             load_button.button_type = "warning"
+            all_keys = lpne.get_lfp_channels(lfp_fn)
             alert_box.text = f"Didn't find the channel '{emg_channel}' in: {all_keys}"
             return
         if len(hipp_channel) > 0 and hipp_channel not in lfps:
             load_button.button_type = "warning"
+            all_keys = lpne.get_lfp_channels(lfp_fn)
             alert_box.text = f"Didn't find the channel '{hipp_channel}' in: {all_keys}"
             return
         if len(cortex_channel) > 0 and cortex_channel not in lfps:
             load_button.button_type = "warning"
+            all_keys = lpne.get_lfp_channels(lfp_fn)
             alert_box.text = (
                 f"Didn't find the channel '{cortex_channel}' in: {all_keys}"
             )
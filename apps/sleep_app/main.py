@@ -353,19 +353,18 @@ def sleep_app(doc):
             alert_box.text = "Specify the EMG and Hippocampus channel names!"
             return
 
-        # Just load the first LFP to make sure the right channels exist.
+        # Just check the first LFP file to make sure the right channels exist.
         try:
-            lfps = lpne.load_lfps(lfp_fns[0])
+            all_keys = lpne.get_lfp_channels(lfp_fns[0])
         except NotImplementedError:
             load_button.button_type = "warning"
             alert_box.text = f"LPNE cannot load file: {lfp_fns[0]}"
             return
-        all_keys = list(lfps.keys())
-        if emg_channel not in lfps:
+        if emg_channel not in all_keys:
             load_button.button_type = "warning"
             alert_box.text = f"Didn't find the channel '{emg_channel}' in: {all_keys}"
             return
-        if hipp_channel not in lfps:
+        if hipp_channel not in all_keys:
             load_button.button_type = "warning"
             alert_box.text = f"Didn't find the channel '{hipp_channel}' in: {all_keys}"
             return
@@ -535,16 +534,18 @@ def get_emg_lfp_features(
         #         f"{lfp_fn} doesn't end with {LFP_SUFFIX}"
         # Load the LFPs.
         try:
-            lfps = lpne.load_lfps(lfp_fn)
+            lfps = lpne.load_lfps(lfp_fn, channels=[emg_channel, hipp_channel])
         except (NotImplementedError, FileNotFoundError):
             INVALID_FILE = lfp_fn
             raise NotImplementedError
-        assert emg_channel in lfps, (
-            f"{emg_channel} not in " f"{list(lfps.keys())} in file {lfp_fn}"
-        )
-        assert hipp_channel in lfps, (
-            f"{hipp_channel} not in " f"{list(lfps.keys())} in file {lfp_fn}"
-        )
+        if emg_channel not in lfps or hipp_channel not in lfps:
+            all_keys = lpne.get_lfp_channels(lfp_fn)
+            assert (
+                emg_channel in lfps
+            ), f"{emg_channel} not in {all_keys} in file {lfp_fn}"
+            assert (
+                hipp_channel in lfps
+            ), f"{hipp_channel} not in {all_keys} in file {lfp_fn}"
         emg_tr = lfps[emg_channel].flatten()
         dhipp_tr = lfps[hipp_channel].flatten()
         # Calculate features of the LFP and EMG.
@@ -54,7 +54,7 @@ def wave_app(doc):
             return
         # Try loading the LFP file.
         try:
-            lfps = lpne.load_lfps(file_in.value)
+            lfps = lpne.load_lfps(file_in.value, channels=[channel_input.value])
         except (NotImplementedError, FileNotFoundError):
             save_button.button_type = "warning"
             alert_box.text = f"LPNE cannot load file: {file_in.value}"
@@ -62,9 +62,8 @@ def wave_app(doc):
         # Make sure the channel is there.
         if channel_input.value not in lfps:
             save_button.button_type = "warning"
-            alert_box.text = (
-                f"Channel {channel_input.value} is not in: {list(lfps.keys())}"
-            )
+            all_keys = lpne.get_lfp_channels(file_in.value)
+            alert_box.text = f"Channel {channel_input.value} is not in: {all_keys}"
             return
         if not file_out.value.endswith(".wav"):
             save_button.button_type = "warning"
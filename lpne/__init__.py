@@ -4,7 +4,7 @@ LPNE pipeline
 Code for preprocessing and building factor models with local field potentials.
 
 """
-__date__ = "July 2021 - January 2024"
+__date__ = "July 2021 - October 2026"
 __version__ = "0.1.22"
 
 try:
@@ -55,14 +55,20 @@ from .preprocess.bispectrum import (
 from .preprocess.channel_maps import *
 from .preprocess.directed_measures import get_directed_spectral_measures
 from .preprocess.filter import filter_signal, filter_lfps
-from .preprocess.make_features import make_features
+from .preprocess.interval_mask import IntervalMask
+from .preprocess.make_features import make_features, stream_features
 from .preprocess.normalize import normalize_features, normalize_lfps
 from .preprocess.outlier_detection import mark_outliers
 from .preprocess.phase_slope_index import get_psi
+from .preprocess.spectral_cache import SpectralCache
 
 from .utils.array_utils import *
 from .utils.data import *
+from .utils.feature_dataset import *
+from .utils.feature_index import *
+from .utils.feature_store import *
 from .utils.file_utils import *
+from .utils.lfp_cache import *
 from .utils.utils import *
 from .utils.viterbi import *
 
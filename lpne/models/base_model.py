@@ -2,7 +2,7 @@
 Base model defining the training procedure and some common methods for SAEs
 
 """
-__date__ = "June - July 2022"
+__date__ = "June 2022 - October 2026"
 
 
 import numpy as np
@@ -14,6 +14,7 @@ import warnings
 from .. import __commit__ as LPNE_COMMIT
 from .. import __version__ as LPNE_VERSION
 from .. import INVALID_LABEL
+from ..utils.feature_dataset import FeatureDataset, FeatureLoader
 from ..utils.utils import get_weights
 
 
@@ -66,7 +67,7 @@ class BaseModel(torch.nn.Module):
 
         Parameters
         ----------
-        features : numpy.ndarray
+        features : numpy.ndarray or lpne.FeatureDataset
             Shape: [b,f,r,r]
         labels : numpy.ndarray
             Shape: [b]
@@ -89,10 +90,15 @@ class BaseModel(torch.nn.Module):
         assert labels.ndim == 1
         assert groups.ndim == 1
         assert len(features) == len(labels) and len(labels) == len(groups)
+        lazy = isinstance(features, FeatureDataset)
         # Remove missing data.
-        axes = tuple(i for i in range(1, features.ndim))
-        idx = np.argwhere(np.isnan(features).sum(axis=axes) == 0).flatten()
-        features = features[idx]
+        if lazy:
+            idx = np.argwhere(~features.get_nan_mask()).flatten()
+            features = features.subset(idx)
+        else:
+            axes = tuple(i for i in range(1, features.ndim))
+            idx = np.argwhere(np.isnan(features).sum(axis=axes) == 0).flatten()
+            features = features[idx]
         labels = labels[idx]
         if groups is not None:
             groups = groups[idx]
@@ -119,13 +125,23 @@ class BaseModel(torch.nn.Module):
         self.features_shape_ = features.shape
         self._initialize()
         # NumPy arrays to PyTorch tensors.
-        features = torch.tensor(features, dtype=FLOAT).to(self.device)
         labels = torch.tensor(labels, dtype=INT).to(self.device)
         groups = torch.tensor(groups, dtype=INT).to(self.device)
         weights = torch.tensor(weights, dtype=FLOAT).to(self.device)
         # Make a Dataset, a DataLoader, and an optimizer.
-        dset = TensorDataset(features, labels, groups, weights)
-        loader = DataLoader(dset, batch_size=self.batch_size, shuffle=True)
+        if lazy:
+            # Read shuffled batches from disk instead of holding every window.
+            loader = FeatureLoader(
+                features,
+                [labels, groups, weights],
+                self.batch_size,
+                dtype=FLOAT,
+                device=self.device,
+            )
+        else:
+            features = torch.tensor(features, dtype=FLOAT).to(self.device)
+            dset = TensorDataset(features, labels, groups, weights)
+            loader = DataLoader(dset, batch_size=self.batch_size, shuffle=True)
         optimizer = torch.optim.Adam(self.parameters(), lr=self.lr)
         # Train.
         while self.iter_ <= self.n_iter:
@@ -140,7 +156,7 @@ class BaseModel(torch.nn.Module):
                 print(f"iter {self.iter_:04d}, loss: {i_loss:.3f}")
             if score_freq is not None and self.iter_ % score_freq == 0:
                 weighted_acc = self.score(
-                    features[idx_comp],
+                    features.subset(idx_comp) if lazy else features[idx_comp],
                     np_labels[idx_comp],
                     np_groups[idx_comp],
                 )
@@ -148,6 +164,32 @@ class BaseModel(torch.nn.Module):
             self.iter_ += 1
         return self
 
+    def _iter_feature_batches(self, features):
+        """
+        Iterate over batches of features in order.
+
+        Parameters
+        ----------
+        features : numpy.ndarray, torch.Tensor, or lpne.FeatureDataset
+            Shape: ``[b,...]``
+
+        Yields
+        ------
+        i : int
+            Index of the first window in the batch
+        batch : torch.Tensor
+            Features on the model's device
+            Shape: ``[batch_size,...]``
+        """
+        if isinstance(features, FeatureDataset):
+            for idx, batch in features.iter_batches(self.batch_size):
+                yield idx[0], torch.tensor(batch, dtype=FLOAT).to(self.device)
+            return
+        if isinstance(features, np.ndarray):
+            features = torch.tensor(features, dtype=FLOAT)
+        for i in range(0, len(features), self.batch_size):
+            yield i, features[i : i + self.batch_size].to(self.device)
+
     @torch.no_grad()
     def reconstruct(self, features):
         """
@@ -2,7 +2,7 @@
 CANDECOMP/PARAFAC supervised autoencoder with deterministic factors
 
 """
-__date__ = "November 2021 - June 2023"
+__date__ = "November 2021 - October 2026"
 
 
 import numpy as np
@@ -332,7 +332,7 @@ class CpSae(BaseModel):
 
         Parameters
         ----------
-        features : numpy.ndarray or torch.Tensor
+        features : numpy.ndarray, torch.Tensor, or lpne.FeatureDataset
             Shape: ``[b,f,r,r]``
         groups : ``None`` or numpy.ndarray
             Shape: ``[b]``
@@ -349,8 +349,6 @@ class CpSae(BaseModel):
             Shape: ``[batch, n_classes]``
         """
         check_is_fitted(self, attributes=self.FIT_ATTRIBUTES)
-        if isinstance(features, np.ndarray):
-            features = torch.tensor(features, dtype=FLOAT)
         # Figure out group mapping.
         if groups is not None:
             if isinstance(groups, torch.Tensor):
@@ -379,17 +377,12 @@ class CpSae(BaseModel):
                     new_groups[idx] = INVALID_GROUP
             groups = new_groups
             # To PyTorch Tensors.
-            if not isinstance(features, torch.Tensor):
-                features = torch.tensor(features, dtype=FLOAT)
             groups = torch.tensor(groups, dtype=INT).to(self.device)
         logits = []
-        i = 0
-        while i <= len(features):
-            batch_f = features[i : i + self.batch_size].to(self.device)
-            batch_g = None if groups is None else groups[i : i + self.batch_size]
+        for i, batch_f in self._iter_feature_batches(features):
+            batch_g = None if groups is None else groups[i : i + len(batch_f)]
             batch_logit = self(batch_f, None, batch_g, None, return_logits=True)
             logits.append(batch_logit)
-            i += self.batch_size
         logits = torch.cat(logits, dim=0)
         if return_logits:
             to_return = logits
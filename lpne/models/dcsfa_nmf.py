@@ -2,7 +2,7 @@
 Hunter's supervised autoencoder model
 
 """
-__date__ = "September - October 2022"
+__date__ = "September 2022 - October 2026"
 
 
 import numpy as np
@@ -16,6 +16,11 @@ import warnings
 
 
 from .nmf_base import NmfBase
+from ..utils.feature_dataset import FeatureDataset, FeatureLoader
+
+
+DEFAULT_NMF_MAX_SAMPLES = 4096
+"""Default number of windows read from a ``FeatureDataset`` for NMF pretraining"""
 
 
 class DcsfaNmf(NmfBase):
@@ -451,7 +456,7 @@ class DcsfaNmf(NmfBase):
 
         Parameters
         ----------
-        X (torch.Tensor): Input Features
+        X (torch.Tensor or lpne.FeatureDataset): Input Features
             Shape: ``[n_samples,n_features]``
         y (torch.Tensor): ground truth labels
             Shape: ``[n_samples,n_sup_networks]``
@@ -475,18 +480,22 @@ class DcsfaNmf(NmfBase):
         # Freeze the decoder
         self.W_nmf.requires_grad = False
         # Load arguments onto device
-        X = torch.Tensor(X).float().to("cpu")
         y = torch.Tensor(y).float().to("cpu")
         y_pred_weights = torch.Tensor(y_pred_weights).float().to("cpu")
         task_mask = torch.Tensor(task_mask).long().to("cpu")
         intercept_mask = torch.Tensor(intercept_mask).to("cpu")
         sample_weights = torch.Tensor(sample_weights).to("cpu")
-        # Create a Dataset.
-        # dset = TensorDataset(X,y,y_pred_weights,task_mask,intercept_mask)
-        # NOTE: I changed the order to match ``self.forward``
-        dset = TensorDataset(X, y, task_mask, y_pred_weights, intercept_mask)
         sampler = WeightedRandomSampler(sample_weights, len(sample_weights))
-        loader = DataLoader(dset, batch_size=batch_size, sampler=sampler)
+        tensors = [y, task_mask, y_pred_weights, intercept_mask]
+        if isinstance(X, FeatureDataset):
+            loader = FeatureLoader(X, tensors, batch_size, sampler=sampler)
+        else:
+            # Create a Dataset.
+            # dset = TensorDataset(X,y,y_pred_weights,task_mask,intercept_mask)
+            # NOTE: I changed the order to match ``self.forward``
+            X = torch.Tensor(X).float().to("cpu")
+            dset = TensorDataset(X, *tensors)
+            loader = DataLoader(dset, batch_size=batch_size, sampler=sampler)
         # Instantiate Optimizer
         optimizer = self.instantiate_optimizer()
         # Define iterator
@@ -523,6 +532,7 @@ class DcsfaNmf(NmfBase):
         n_epochs=100,
         n_pre_epochs=100,
         nmf_max_iter=100,
+        nmf_max_samples=None,
         batch_size=128,
         lr=1e-3,
         pretrain=True,
@@ -541,7 +551,9 @@ class DcsfaNmf(NmfBase):
 
         Parameters
         ----------
-        X (np.ndarray): Input Features
+        X (np.ndarray or lpne.FeatureDataset): Input Features. If this is a
+            ``FeatureDataset``, batches are read from disk as they're needed. Its
+            ``transform`` should flatten the windows.
             Shape: ``[n_samples, n_features]``
         y (np.ndarray): ground truth labels
             Shape: ``[n_samples, n_sup_networks]``
@@ -567,6 +579,12 @@ class DcsfaNmf(NmfBase):
             number of pretraining epochs. Defaults to 100.
         nmf_max_iter (int, optional):
             max iterations for NMF pretraining solver. Defaults to 100.
+        nmf_max_samples (int, optional):
+            max number of randomly chosen windows held in memory for NMF
+            pretraining. If ``None``, every window of an in-memory ``X`` is used
+            and at most ``DEFAULT_NMF_MAX_SAMPLES`` windows of a
+            ``FeatureDataset`` are read, so that the whole dataset is only loaded
+            if ``nmf_max_samples`` is at least ``len(X)``. Defaults to None.
         batch_size (int, optional):
             batch size for gradient descent. Defaults to 128.
         lr (_type_, optional):
@@ -575,8 +593,9 @@ class DcsfaNmf(NmfBase):
             whether or not to pretrain the generative model. Defaults to True.
         verbose (bool, optional):
             activate or deactivate print statements. Defaults to False.
-        X_val (np.ndarray, optional):
-            Validation Features for checkpointing. Defaults to None.
+        X_val (np.ndarray or lpne.FeatureDataset, optional):
+            Validation Features for checkpointing. These are read into memory.
+            Defaults to None.
             Shape: ``[n_val_samples,n_features]``
         y_val (np.ndarray, optional):
             Validation Labels for checkpointing. Defaults to None.
@@ -597,6 +616,8 @@ class DcsfaNmf(NmfBase):
             The fitted model. NOTE: sklearn convention
         """
         # Initialize model parameters.
+        assert X.ndim == 2, f"Expected flattened features, found shape {X.shape}"
+        lazy = isinstance(X, FeatureDataset)
         self._initialize(X.shape[1])
 
         # Establish loss histories.
@@ -635,7 +656,14 @@ class DcsfaNmf(NmfBase):
 
         # Pretrain the model.
         if pretrain:
-            self.pretrain_NMF(X, y, nmf_max_iter)
+            if nmf_max_samples is None and lazy:
+                nmf_max_samples = DEFAULT_NMF_MAX_SAMPLES
+            if nmf_max_samples is not None and nmf_max_samples < len(y):
+                nmf_idx = np.random.choice(len(y), nmf_max_samples, replace=False)
+                nmf_idx = np.sort(nmf_idx)
+                self.pretrain_NMF(X[nmf_idx], y[nmf_idx], nmf_max_iter)
+            else:
+                self.pretrain_NMF(np.asarray(X), y, nmf_max_iter)
             self.pretrain_encoder(
                 X,
                 y,
@@ -648,7 +676,8 @@ class DcsfaNmf(NmfBase):
             )
 
         # Send training arguments to Tensors.
-        X = torch.Tensor(X).float().to("cpu")
+        if not lazy:
+            X = torch.Tensor(X).float().to("cpu")
         y = torch.Tensor(y).float().to("cpu")
         y_pred_weights = torch.Tensor(y_pred_weights).float().to("cpu")
         task_mask = torch.Tensor(task_mask).long().to("cpu")
@@ -674,7 +703,7 @@ class DcsfaNmf(NmfBase):
             if y_pred_weights_val is None:
                 y_pred_weights_val = np.ones((y_val[:, 0].shape[0], 1))
 
-            X_val = torch.Tensor(X_val).float().to("cpu")
+            X_val = torch.Tensor(np.asarray(X_val)).float().to("cpu")
             y_val = torch.Tensor(y_val).float().to("cpu")
             task_mask_val = torch.Tensor(task_mask_val).long().to("cpu")
             y_pred_weights_val = (
@@ -686,9 +715,13 @@ class DcsfaNmf(NmfBase):
             )
 
         # Instantiate the dataloader and optimizer.
-        dset = TensorDataset(X, y, task_mask, y_pred_weights, intercept_mask)
         sampler = WeightedRandomSampler(samples_weights, len(samples_weights))
-        loader = DataLoader(dset, batch_size=batch_size, sampler=sampler)
+        tensors = [y, task_mask, y_pred_weights, intercept_mask]
+        if lazy:
+            loader = FeatureLoader(X, tensors, batch_size, sampler=sampler)
+        else:
+            dset = TensorDataset(X, *tensors)
+            loader = DataLoader(dset, batch_size=batch_size, sampler=sampler)
         optimizer = self.instantiate_optimizer()
 
         # Define the training iterator.
@@ -718,13 +751,28 @@ class DcsfaNmf(NmfBase):
             self.training_hist.append(epoch_loss / len(loader))
             with torch.no_grad():
                 self.eval()
-                X_recon, y_pred, _ = self.transform(
-                    X,
-                    intercept_mask,
-                    avg_intercept=False,
-                    return_npy=True,
-                )
-                training_mse_loss = np.mean((X.detach().numpy() - X_recon) ** 2)
+                if lazy:
+                    # Evaluate the training set one batch at a time.
+                    sq_err, y_pred = 0.0, []
+                    for idx, batch in X.iter_batches(batch_size):
+                        batch_recon, batch_pred, _ = self.transform(
+                            batch,
+                            intercept_mask[idx],
+                            avg_intercept=False,
+                            return_npy=True,
+                        )
+                        sq_err += np.sum((batch - batch_recon) ** 2)
+                        y_pred.append(batch_pred)
+                    y_pred = np.concatenate(y_pred, axis=0)
+                    training_mse_loss = sq_err / np.prod(X.shape)
+                else:
+                    X_recon, y_pred, _ = self.transform(
+                        X,
+                        intercept_mask,
+                        avg_intercept=False,
+                        return_npy=True,
+                    )
+                    training_mse_loss = np.mean((X.detach().numpy() - X_recon) ** 2)
                 training_auc_list = []
                 for sup_net in range(self.n_sup_networks):
                     temp_mask = task_mask[:, sup_net].detach().numpy()
@@ -2,7 +2,7 @@
 Factor Analysis-regularized logistic regression.
 
 """
-__date__ = "June 2021 - June 2023"
+__date__ = "June 2021 - October 2026"
 
 
 import numpy as np
@@ -388,7 +388,7 @@ class FaSae(BaseModel):
 
         Parameters
         ----------
-        features : torch.Tensor
+        features : numpy.ndarray, torch.Tensor, or lpne.FeatureDataset
             The features to make predictions for
             Shape: ``[n,f,r,r]``
         to_numpy : bool, optional
@@ -405,13 +405,9 @@ class FaSae(BaseModel):
             Shape: ``[n,c]``
         """
         check_is_fitted(self, attributes=self.FIT_ATTRIBUTES)
-        if isinstance(features, np.ndarray):
-            features = torch.tensor(features, dtype=FLOAT)
-        features = features.reshape(len(features), -1)  # [n,x]
         logits = []
-        i = 0
-        while i <= len(features):
-            batch_f = features[i : i + self.batch_size].to(self.device)
+        for _, batch_f in self._iter_feature_batches(features):
+            batch_f = batch_f.reshape(len(batch_f), -1)  # [b,x]
             batch_logit = self(
                 batch_f,
                 None,
@@ -421,7 +417,6 @@ class FaSae(BaseModel):
                 stochastic=stochastic,
             )
             logits.append(batch_logit)
-            i += self.batch_size
         logits = torch.cat(logits, dim=0)
         probs = F.softmax(logits, dim=1)  # [b,c]
         if to_numpy:
@@ -2,7 +2,7 @@
 A simple grid search cross validation model.
 
 """
-__date__ = "December 2021 - November 2022"
+__date__ = "December 2021 - October 2026"
 
 
 from itertools import product
@@ -11,6 +11,8 @@ from sklearn.model_selection import StratifiedKFold, GroupShuffleSplit
 from sklearn.utils.validation import check_is_fitted
 import torch
 
+from ..utils.feature_dataset import FeatureDataset
+
 
 FIT_ATTRIBUTES = ["best_estimator_", "best_params_", "best_score_"]
 
@@ -58,8 +60,9 @@ class GridSearchCV:
 
         Parameters
         ----------
-        features : numpy.ndarray
-            Shape: ``[b,f,r,r]``
+        features : numpy.ndarray or lpne.FeatureDataset
+            Shape: ``[b,f,r,r]``. If this is a ``FeatureDataset``, each fold is a lazy
+            view of the windows instead of a copy.
         labels : numpy.ndarray
             Shape: ``[b]``
         groups : None or numpy.ndarray
@@ -69,13 +72,18 @@ class GridSearchCV:
         score_freq : int or None, optional
             Print weighted accuracy every ``score_freq`` epochs.
         """
+        # Index folds without copying lazily loaded features.
+        if isinstance(features, FeatureDataset):
+            take = features.subset
+        else:
+            take = features.__getitem__
         # Split data into folds.
         if groups is None:
             groups = np.zeros(len(features))
             # Balance folds by class.
             def get_cv_gen():
                 skf = StratifiedKFold(n_splits=self.cv, random_state=self.cv_seed)
-                return enumerate(skf.split(features, labels))
+                return enumerate(skf.split(np.zeros(len(labels)), labels))
 
         else:
             # Make sure groups aren't in multiple folds.
@@ -85,7 +93,7 @@ class GridSearchCV:
                     n_splits=self.cv,
                     random_state=self.cv_seed,
                 )
-                return enumerate(skf.split(features, labels, groups))
+                return enumerate(skf.split(np.zeros(len(labels)), labels, groups))
 
         best_score = -np.inf
         best_params = None
@@ -101,7 +109,7 @@ class GridSearchCV:
                 # Set the parameters, fit the model, and score the model.
                 self.model.set_params(**params)
                 self.model.fit(
-                    features[train_idx],
+                    take(train_idx),
                     labels[train_idx],
                     groups[train_idx],
                     print_freq=print_freq,
@@ -109,7 +117,7 @@ class GridSearchCV:
                     random_state=self.training_seed,
                 )
                 model_score = self.model.score(
-                    features[test_idx],
+                    take(test_idx),
                     labels[test_idx],
                     groups[test_idx],
                     warn=False,
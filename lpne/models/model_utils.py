@@ -2,7 +2,7 @@
 Useful functions for SAE models
 
 """
-__date__ = "October - November 2022"
+__date__ = "October 2022 - October 2026"
 
 from sklearn.decomposition import PCA
 import numpy as np
@@ -45,7 +45,10 @@ def get_reconstruction_stats(model, features):
     ----------
     model : BaseModel
     features : numpy.ndarray
-        Shape: ``[b,x]`` or ``[b,f,r,r]``
+        Shape: ``[b,x]`` or ``[b,f,r,r]``. Statistics are calculated in double
+        precision. If the features were quantized (see ``lpne.FeatureStore``), the
+        quantization error is reported separately by
+        ``FeatureStore.get_quantization_error``.
 
     Returns
     -------
@@ -68,6 +71,9 @@ def get_reconstruction_stats(model, features):
     ), f"We need at least {model.z_dim} windows to do PCA, found {n}"
     # Calculate the R^2.
     rec_features = model.reconstruct(features)
+    # Accumulate in double precision, even for single precision or quantized features.
+    features = np.asarray(features, dtype=np.float64)
+    rec_features = np.asarray(rec_features, dtype=np.float64)
     mean_features = np.mean(features, axis=0, keepdims=True)
     orig_variance = np.power(features - mean_features, 2).sum() / n
     residual_variance = np.power(features - rec_features, 2).sum() / n
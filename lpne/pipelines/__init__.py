@@ -3,6 +3,8 @@ pipelines subpackage
 
 """
 
+from .manifests import is_up_to_date, write_manifest
+
 from .pipeline_params import DEFAULT_PIPELINE_PARAMS
 
 from .standard_pipeline import standard_pipeline
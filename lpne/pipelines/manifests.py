@@ -0,0 +1,118 @@
+"""
+Record the inputs of each feature file so that up-to-date features can be skipped
+
+A manifest is a small JSON file saved next to a feature file, e.g.
+``features/Mouse1_0101_LFP.npy.manifest.json``. It holds the SHA-256 hash, size, and
+modification time of each input file (LFP, CHANS, and channel map) along with the
+preprocessing parameters and the LPNE version used to make the features. Features
+are up to date if the feature file and its manifest exist and nothing recorded in
+the manifest has changed. Input files are only rehashed if their size or
+modification time changed.
+
+"""
+__date__ = "October 2026"
+__all__ = ["is_up_to_date", "write_manifest"]
+
+
+import json
+import os
+
+from .. import __version__ as LPNE_VERSION
+from ..utils.file_utils import get_file_hash
+
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def get_manifest_fn(feature_fn):
+    """Return the manifest filename of a feature file."""
+    return feature_fn + MANIFEST_SUFFIX
+
+
+def is_up_to_date(feature_fn, input_fns, params):
+    """
+    Check whether a feature file was made from the same inputs and parameters.
+
+    Parameters
+    ----------
+    feature_fn : str
+        Feature filename
+    input_fns : dict
+        Maps input names, e.g. ``'lfp'``, to filenames
+    params : dict
+        Parameters used to make the features, e.g. ``params['preprocess']``
+
+    Returns
+    -------
+    up_to_date : bool
+    """
+    manifest_fn = get_manifest_fn(feature_fn)
+    if not os.path.exists(feature_fn) or not os.path.exists(manifest_fn):
+        return False
+    try:
+        with open(manifest_fn, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("__version__") != LPNE_VERSION:
+        return False
+    # Compare parameters after a JSON round trip so that tuples match lists.
+    if manifest.get("params") != json.loads(json.dumps(params)):
+        return False
+    prev_inputs = manifest.get("inputs", {})
+    if sorted(prev_inputs.keys()) != sorted(input_fns.keys()):
+        return False
+    for name, fn in input_fns.items():
+        record = _get_input_record(fn, prev_inputs[name])
+        if record["hash"] != prev_inputs[name].get("hash"):
+            return False
+    return True
+
+
+def write_manifest(feature_fn, input_fns, params):
+    """
+    Record the inputs and parameters used to make a feature file.
+
+    Parameters
+    ----------
+    feature_fn : str
+        Feature filename
+    input_fns : dict
+        Maps input names, e.g. ``'lfp'``, to filenames
+    params : dict
+        Parameters used to make the features, e.g. ``params['preprocess']``
+    """
+    manifest = dict(
+        inputs={name: _get_input_record(fn) for name, fn in input_fns.items()},
+        params=params,
+        __version__=LPNE_VERSION,
+    )
+    manifest_fn = get_manifest_fn(feature_fn)
+    temp_fn = manifest_fn + ".tmp"
+    with open(temp_fn, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_fn, manifest_fn)
+
+
+def _get_input_record(fn, prev_record=None):
+    """Describe an input file, reusing the previous hash if it looks unchanged."""
+    stat = os.stat(fn)
+    record = dict(
+        path=os.path.abspath(fn), size=stat.st_size, mtime_ns=stat.st_mtime_ns
+    )
+    if (
+        prev_record is not None
+        and prev_record.get("size") == record["size"]
+        and prev_record.get("mtime_ns") == record["mtime_ns"]
+    ):
+        record["hash"] = prev_record.get("hash")
+    else:
+        record["hash"] = get_file_hash(fn)
+    return record
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
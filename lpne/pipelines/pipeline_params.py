@@ -2,7 +2,7 @@
 Define the default parameters for the pipeline.
 
 """
-__date__ = "February 2023 - January 2024"
+__date__ = "February 2023 - October 2026"
 __all__ = ["DEFAULT_PIPELINE_PARAMS"]
 
 import yaml
@@ -23,6 +23,7 @@ DEFAULT_PIPELINE_PARAMS_STR = """
     strict_checking: false
   pipeline:
     make_features: true
+    n_workers: 1
     summary_plots: true
     train_model: true
     evaluate_model: true
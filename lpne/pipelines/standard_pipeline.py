@@ -4,17 +4,21 @@ Standard experimental piepline
 TODO: explicitly check for duplicate mice on different days
 TODO: group the parameters differently or add kwargs to functions?
 """
-__date__ = "October 2022 - January 2024"
+__date__ = "October 2022 - October 2026"
 __all__ = [
     "standard_pipeline",
 ]
 
 
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import os
+import warnings
 import yaml
 
 import lpne
+from .manifests import is_up_to_date, write_manifest
+from ..utils.utils import get_n_jobs
 
 
 USAGE = "Usage:\n$ python script.py <experiment_directory>"
@@ -67,57 +71,43 @@ def standard_pipeline(exp_dir, params=None, params_fn=None):
         # Load the channel map.
         channel_map_fn = os.path.join(exp_dir, params["file"]["channel_map_fn"])
         channel_map = lpne.load_channel_map(channel_map_fn)
-        # Make the features for each filename.
-        for file_num in range(len(lfp_fns)):
-            print(f"File {file_num+1}/{len(lfp_fns)}:", lfp_fns[file_num])
-            # Load the LFPs.
-            lfps = lpne.load_lfps(lfp_fns[file_num])
-            # Remove the bad channels marked in the CHANS file.
-            lfps = lpne.remove_channels_from_lfps(lfps, chans_fns[file_num])
-            # Filter the LFPs.
-            lfps = lpne.filter_lfps(
-                lfps,
-                params["preprocess"]["fs"],
-                lowcut=params["preprocess"]["filter_lowcut"],
-                highcut=params["preprocess"]["filter_highcut"],
-            )
-            if params["preprocess"]["remove_outliers"]:
-                # Mark outliers with NaNs.
-                lfps = lpne.mark_outliers(
-                    lfps,
-                    params["preprocess"]["fs"],
-                    lowcut=params["preprocess"]["outlier_lowcut"],
-                    highcut=params["preprocess"]["filter_highcut"],
-                    mad_threshold=params["preprocess"]["outlier_mad_threshold"],
-                )
-                # Print outlier summary.
-                msg = lpne.get_outlier_summary(
-                    lfps,
-                    params["preprocess"]["fs"],
-                    params["preprocess"]["window_duration"],
-                )
-                print(msg)
-            # Average channels and combine outliers in the same group.
-            lfps = lpne.average_channels(
-                lfps,
+        # Make the features for each filename, possibly on a process pool.
+        n_workers = get_n_jobs(params["pipeline"].get("n_workers", 1))
+        jobs = [
+            (
+                lfp_fns[file_num],
+                chans_fns[file_num],
+                feature_fns[file_num],
+                channel_map_fn,
                 channel_map,
-                **params["preprocess"]["channel_map_params"],
-            )
-            # Make features.
-            features = lpne.make_features(
-                lfps,
-                fs=params["preprocess"]["fs"],
-                min_freq=params["preprocess"]["feature_min_freq"],
-                max_freq=params["preprocess"]["feature_max_freq"],
-                window_duration=params["preprocess"]["window_duration"],
-                window_step=params["preprocess"]["window_step"],
-                max_n_windows=params["preprocess"]["max_n_windows"],
-                spectral_granger=params["preprocess"]["spectral_granger"],
-                directed_spectrum=params["preprocess"]["directed_spectrum"],
-                csd_params=params["preprocess"]["csd_params"],
+                params["preprocess"],
             )
-            # Save the features.
-            lpne.save_features(features, feature_fns[file_num])
+            for file_num in range(len(lfp_fns))
+        ]
+        failures = {}
+        executor = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
+        try:
+            # Report progress in file order.
+            results = _iter_file_results(jobs, executor)
+            for file_num, (msg, error) in enumerate(results):
+                print(f"File {file_num+1}/{len(lfp_fns)}:", lfp_fns[file_num])
+                if error is None:
+                    print(msg)
+                else:
+                    failures[file_num] = f"{type(error).__name__}: {error}"
+                    print("Failed!", failures[file_num])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        # Leave out the files that failed.
+        if len(failures) > 0:
+            msg = f"Unable to make features for {len(failures)} file(s):"
+            for file_num, error in failures.items():
+                msg += f"\n\t{lfp_fns[file_num]}: {error}"
+            warnings.warn(msg)
+            keep = [i for i in range(len(lfp_fns)) if i not in failures]
+            feature_fns = [feature_fns[i] for i in keep]
+            label_fns = [label_fns[i] for i in keep]
 
     # Load all the features and labels.
     features, labels, rois, groups, freqs = lpne.load_features_and_labels(
@@ -197,6 +187,101 @@ def standard_pipeline(exp_dir, params=None, params_fn=None):
         )
 
 
+def _make_file_features(
+    lfp_fn, chans_fn, feature_fn, channel_map_fn, channel_map, preprocess_params
+):
+    """
+    Make and save the features for a single LFP file.
+
+    Files are independent, so this can be run on a process pool.
+
+    Returns
+    -------
+    msg : str
+        Message summarizing the file, printed by the main process.
+    """
+    p = preprocess_params
+    # Skip features made from the same inputs and parameters.
+    input_fns = dict(lfp=lfp_fn, chans=chans_fn, channel_map=channel_map_fn)
+    if is_up_to_date(feature_fn, input_fns, p):
+        return "Features are up to date."
+    # Load the LFPs.
+    lfps = lpne.load_lfps(lfp_fn)
+    # Remove the bad channels marked in the CHANS file.
+    lfps = lpne.remove_channels_from_lfps(lfps, chans_fn)
+    # Filter the LFPs.
+    lfps = lpne.filter_lfps(
+        lfps,
+        p["fs"],
+        lowcut=p["filter_lowcut"],
+        highcut=p["filter_highcut"],
+    )
+    msg = "Features made."
+    mask = None
+    if p["remove_outliers"]:
+        # Mark outliers with NaNs and keep their intervals.
+        lfps, mask = lpne.mark_outliers(
+            lfps,
+            p["fs"],
+            lowcut=p["outlier_lowcut"],
+            highcut=p["filter_highcut"],
+            mad_threshold=p["outlier_mad_threshold"],
+            return_intervals=True,
+        )
+        # Summarize the outliers.
+        msg = lpne.get_outlier_summary(lfps, p["fs"], p["window_duration"], mask=mask)
+        # Average channels and combine outliers in the same group.
+        lfps, mask = lpne.average_channels(
+            lfps, channel_map, mask=mask, **p["channel_map_params"]
+        )
+    else:
+        # Average channels.
+        lfps = lpne.average_channels(lfps, channel_map, **p["channel_map_params"])
+    # Make features.
+    features = lpne.make_features(
+        lfps,
+        fs=p["fs"],
+        min_freq=p["feature_min_freq"],
+        max_freq=p["feature_max_freq"],
+        window_duration=p["window_duration"],
+        window_step=p["window_step"],
+        max_n_windows=p["max_n_windows"],
+        spectral_granger=p["spectral_granger"],
+        directed_spectrum=p["directed_spectrum"],
+        csd_params=p["csd_params"],
+        mask=mask,
+    )
+    # Save the features and record how they were made.
+    lpne.save_features(features, feature_fn)
+    write_manifest(feature_fn, input_fns, p)
+    return msg
+
+
+def _iter_file_results(jobs, executor=None):
+    """
+    Run ``_make_file_features`` for each job, yielding results in order.
+
+    Yields
+    ------
+    msg : None or str
+        Message returned by ``_make_file_features``. ``None`` if the job failed.
+    error : None or Exception
+        Exception raised by the job. ``None`` if the job succeeded.
+    """
+    if executor is not None:
+        futures = [executor.submit(_make_file_features, *job) for job in jobs]
+    for job_num, job in enumerate(jobs):
+        try:
+            if executor is None:
+                msg = _make_file_features(*job)
+            else:
+                msg = futures[job_num].result()
+        except Exception as error:
+            yield None, error
+        else:
+            yield msg, None
+
+
 if __name__ == "__main__":
     pass
 
@@ -2,7 +2,7 @@
 Channel maps are used to determine which channels to average together.
 
 """
-__date__ = "July 2021 - February 2024"
+__date__ = "July 2021 - October 2026"
 __all__ = [
     "average_channels",
     "get_default_channel_map",
@@ -27,12 +27,14 @@ def average_channels(
     check_lfp_channels_in_map=True,
     check_map_channels_in_lfps=False,
     strict_checking=False,
+    mask=None,
 ):
     """
     Average different channels in the the same region.
 
     Channels (keys) in ``lfps`` that map to the same group name (value) in
-    ``channel_map`` will be averaged together and named by the group name.
+    ``channel_map`` will be averaged together and named by the group name. A sample
+    of an averaged channel is a NaN if it's a NaN in any of the averaged channels.
 
     Parameters
     ----------
@@ -50,11 +52,16 @@ def average_channels(
     strict_checking : bool, optional
         Whether to throw an error (if ``strict_checking`` is ``True``) or a warning
         (otherwise) when checking the channels.
+    mask : None or lpne.IntervalMask, optional
+        NaN intervals of the LFPs, e.g. from ``lpne.mark_outliers``. If this is
+        given, the NaN intervals of the averaged channels are also returned.
 
     Returns
     -------
     lfps : dict
         Maps ROI names to LFP waveforms
+    mask : lpne.IntervalMask
+        NaN intervals of the averaged channels. Only returned if ``mask`` is given.
     """
     # Check the channels.
     if check_lfp_channels_in_map:
@@ -75,15 +82,11 @@ def average_channels(
             else:
                 warnings.warn(msg)
         else:
-            # Find NaNs and replace them with zeros to calculate an average.
-            nan_masks = [np.isnan(trace) for trace in avg]
-            nan_mask = np.minimum(sum(nan_masks), 1)
-            for i in range(len(avg)):
-                avg[i][nan_masks[i]] = 0.0
-            avg = sum(avg) / len(avg)
-            # Reintroduce the NaNs into the averaged LFP.
-            avg[nan_mask > 0] = np.nan
-            out_lfps[grouped_roi] = avg
+            # NaNs propagate through the sum, so they don't need to be found.
+            out_lfps[grouped_roi] = sum(avg) / len(avg)
+    if mask is not None:
+        group_map = {roi: channel_map[roi] for roi in lfps if roi in channel_map}
+        return out_lfps, mask.group(group_map)
     return out_lfps
 
 
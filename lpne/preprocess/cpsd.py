@@ -0,0 +1,351 @@
+"""
+Memory-efficient cross power spectral density estimation.
+
+Calling ``scipy.signal.csd`` on every pair of ROIs broadcasts the signals to
+``[n_roi,n_roi,n_samples]`` before taking FFTs, so it computes ``n_roi**2`` FFTs per
+segment and the full ``[n_roi,n_roi,n_freq]`` output. Here, each channel is
+transformed once per segment and only the ``n_roi*(n_roi+1)//2`` cross products
+within the requested frequency band are formed.
+
+"""
+__date__ = "October 2026"
+
+
+import warnings
+import numpy as np
+import scipy.fft as sp_fft
+from scipy.signal import detrend as sp_detrend
+from scipy.signal import get_window
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+DEFAULT_CSD_PARAMS = {
+    "detrend": "constant",
+    "window": "hann",
+    "nperseg": 512,
+    "noverlap": 256,
+    "nfft": None,
+}
+"""Default parameters sent to ``scipy.signal.csd``"""
+SUPPORTED_CSD_PARAMS = [
+    "window",
+    "nperseg",
+    "noverlap",
+    "nfft",
+    "detrend",
+    "return_onesided",
+    "scaling",
+    "average",
+]
+"""Parameters of ``scipy.signal.csd`` that are supported here"""
+
+
+def get_cpsd(X, fs, min_freq=0.0, max_freq=55.0, csd_params={}):
+    """
+    Estimate the cross power spectral density between every pair of ROIs.
+
+    This is equivalent to ``scipy.signal.csd(X[:,:,None], X[:,None], fs=fs,
+    **csd_params)`` restricted to ``min_freq <= f < max_freq`` and to the lower
+    triangle of the ROI dimensions.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Windowed LFPs
+        Shape: ``[n_window, n_roi, n_samples]``
+    fs : float
+        Samplerate
+    min_freq : float, optional
+        Minimum frequency
+    max_freq : float, optional
+        Maximum frequency
+    csd_params : dict, optional
+        Parameters accepted by ``scipy.signal.csd``. See ``SUPPORTED_CSD_PARAMS``.
+
+    Returns
+    -------
+    f : numpy.ndarray
+        Frequency bins
+        Shape: ``[n_freq]``
+    cpsd : numpy.ndarray
+        Complex cross power spectral density. The entry for ROIs ``i >= j`` is stored
+        at index ``i * (i + 1) // 2 + j``, as in ``lpne.squeeze_triangular_array``.
+        Shape: ``[n_window, n_roi*(n_roi+1)//2, n_freq]``
+    """
+    assert X.ndim == 3, f"len({X.shape}) != 3"
+    onesided = csd_params.get("return_onesided", True)
+    f, fft, win, nfft = get_segment_ffts(X, fs, csd_params=csd_params)
+    scale = get_cpsd_scale(
+        win,
+        fs,
+        nfft,
+        scaling=csd_params.get("scaling", "density"),
+        onesided=onesided,
+    )
+    # Truncate frequencies before forming any cross products.
+    if onesided:
+        i1, i2 = np.searchsorted(f, [min_freq, max_freq])
+        idx = slice(i1, i2)
+    else:
+        idx = np.argwhere((np.abs(f) >= min_freq) & (np.abs(f) < max_freq)).flatten()
+    cpsd = get_cross_products(fft[..., idx], scale[idx])
+    return f[idx], cpsd
+
+
+def get_cross_products(fft, scale=1.0, full=False):
+    """
+    Average the cross products ``conj(F_i) * F_j`` of segment FFTs over segments.
+
+    Parameters
+    ----------
+    fft : numpy.ndarray
+        Fourier transform of each segment
+        Shape: ``[n_window, n_roi, n_segment, n_freq]``
+    scale : float or numpy.ndarray, optional
+        Multiplies the averaged cross products
+        Shape: ``[n_freq]``
+    full : bool, optional
+        Whether to return the full Hermitian cross spectrum instead of its lower
+        triangle.
+
+    Returns
+    -------
+    cpsd : numpy.ndarray
+        Shape: ``[n_window, n_roi*(n_roi+1)//2, n_freq]`` or
+        ``[n_window, n_roi, n_roi, n_freq]`` if ``full``
+    """
+    n, r, n_seg, n_freq = fft.shape
+    cpsd = np.empty((n, (r * (r + 1)) // 2, n_freq), dtype=fft.dtype)
+    conj_fft = np.conj(fft)
+    for i in range(r):
+        # Average conj(F_i) * F_j over segments for j <= i.
+        k = (i * (i + 1)) // 2
+        cpsd[:, k : k + i + 1] = np.einsum(
+            "wsf,wjsf->wjf", conj_fft[:, i], fft[:, : i + 1]
+        )
+    cpsd *= scale / n_seg
+    if not full:
+        return cpsd
+    idx_i, idx_j = np.tril_indices(r)
+    full_cpsd = np.empty((n, r, r, n_freq), dtype=cpsd.dtype)
+    full_cpsd[:, idx_j, idx_i] = np.conj(cpsd)
+    full_cpsd[:, idx_i, idx_j] = cpsd
+    return full_cpsd
+
+
+def get_cpsd_scale(win, fs, nfft, scaling="density", onesided=True):
+    """
+    Get the factor converting averaged cross products into a cross spectrum.
+
+    Parameters
+    ----------
+    win : numpy.ndarray
+        Segment taper
+    fs : float
+        Samplerate
+    nfft : int
+        FFT length
+    scaling : {``'density'``, ``'spectrum'``}, optional
+        Same as in ``scipy.signal.csd``
+    onesided : bool, optional
+        Whether the spectrum is one-sided. If so, every bin except zero and Nyquist
+        is doubled.
+
+    Returns
+    -------
+    scale : numpy.ndarray
+        Shape: ``[nfft//2+1]`` if ``onesided``, otherwise ``[nfft]``
+    """
+    n_freq = nfft // 2 + 1 if onesided else nfft
+    if scaling == "density":
+        scale = np.full(n_freq, 1.0 / (fs * np.sum(win * win)))
+    elif scaling == "spectrum":
+        scale = np.full(n_freq, 1.0 / np.sum(win) ** 2)
+    else:
+        raise ValueError(f"Unknown scaling: {scaling}")
+    if onesided:
+        last = n_freq - 1 if nfft % 2 == 0 else n_freq
+        scale[1:last] *= 2.0
+    return scale
+
+
+def get_segment_ffts(X, fs, csd_params={}):
+    """
+    Split each window into segments, then detrend, taper, and Fourier transform them.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Windowed LFPs
+        Shape: ``[n_window, n_roi, n_samples]``
+    fs : float
+        Samplerate
+    csd_params : dict, optional
+        Parameters accepted by ``scipy.signal.csd``. See ``SUPPORTED_CSD_PARAMS``.
+
+    Returns
+    -------
+    f : numpy.ndarray
+        Frequency bins
+        Shape: ``[n_freq]``
+    fft : numpy.ndarray
+        Fourier transform of each segment. This is the real FFT unless
+        ``csd_params['return_onesided']`` is ``False``.
+        Shape: ``[n_window, n_roi, n_segment, n_freq]``
+    win : numpy.ndarray
+        Segment taper
+        Shape: ``[nperseg]``
+    nfft : int
+        FFT length
+    """
+    for key in csd_params:
+        assert key in SUPPORTED_CSD_PARAMS, f"Unsupported csd parameter: {key}"
+    average = csd_params.get("average", "mean")
+    assert average == "mean", f"Unsupported csd average: {average}"
+    win, nperseg, noverlap, nfft = _get_segment_params(X.shape[-1], csd_params)
+
+    # Segment the windows: [w,r,s,t]
+    segments = sliding_window_view(X, nperseg, axis=-1)[..., :: nperseg - noverlap, :]
+    detrend = csd_params.get("detrend", "constant")
+    if detrend == "constant":
+        segments = segments - np.mean(segments, axis=-1, keepdims=True)
+    elif detrend == "linear":
+        segments = sp_detrend(segments, type="linear", axis=-1)
+    elif callable(detrend):
+        segments = detrend(segments)
+    elif detrend is not False:
+        raise NotImplementedError(f"Unsupported detrend: {detrend}")
+    dtype = np.result_type(X.dtype, np.float32)  # float32 stays single precision
+    segments = segments.astype(dtype, copy=False) * win.astype(dtype, copy=False)
+
+    # Fourier transform the segments.
+    if csd_params.get("return_onesided", True):
+        f = sp_fft.rfftfreq(nfft, 1 / fs)
+        fft = sp_fft.rfft(segments, n=nfft, axis=-1)
+    else:
+        f = sp_fft.fftfreq(nfft, 1 / fs)
+        fft = sp_fft.fft(segments, n=nfft, axis=-1)
+    return f, fft, win, nfft
+
+
+def get_two_sided_cpsd(fft, win, nfft, fs):
+    """
+    Get the two-sided cross power spectral density used for directed measures.
+
+    This matches ``scipy.signal.csd(X[:,None], X[:,:,None], fs=fs,
+    scaling='spectrum', return_onesided=False)`` with the frequencies moved to the
+    second axis.
+
+    Parameters
+    ----------
+    fft : numpy.ndarray
+        One-sided segment FFTs, see ``get_segment_ffts``
+        Shape: ``[n_window, n_roi, n_segment, nfft//2+1]``
+    win : numpy.ndarray
+        Segment taper
+    nfft : int
+        FFT length
+    fs : float
+        Samplerate
+
+    Returns
+    -------
+    f : numpy.ndarray
+        Two-sided frequencies, ordered like ``scipy.fft.fftfreq``
+        Shape: ``[nfft]``
+    cpsd : numpy.ndarray
+        Complex CPSD with ``'spectrum'`` scaling, ``<conj(F_j) F_i>``
+        Shape: ``[n_window, nfft, n_roi, n_roi]``
+    """
+    scale = 1.0 / np.sum(win) ** 2
+    cpsd = get_cross_products(fft, scale, full=True)  # [n,r,r,f]
+    # Transpose the ROI dimensions and extend to negative frequencies.
+    cpsd = to_two_sided(np.conj(cpsd), nfft)
+    return sp_fft.fftfreq(nfft, 1 / fs), np.moveaxis(cpsd, 3, 1)
+
+
+def to_two_sided(cpsd, nfft):
+    """
+    Extend a one-sided cross spectrum of real signals to negative frequencies.
+
+    Parameters
+    ----------
+    cpsd : numpy.ndarray
+        Cross spectrum at the frequencies ``scipy.fft.rfftfreq(nfft)``
+        Shape: ``[..., nfft//2+1]``
+    nfft : int
+        FFT length
+
+    Returns
+    -------
+    two_sided_cpsd : numpy.ndarray
+        Cross spectrum at the frequencies ``scipy.fft.fftfreq(nfft)``
+        Shape: ``[..., nfft]``
+    """
+    n_freq = cpsd.shape[-1]
+    assert n_freq == nfft // 2 + 1, f"{n_freq} != {nfft // 2 + 1}"
+    out = np.empty(cpsd.shape[:-1] + (nfft,), dtype=cpsd.dtype)
+    out[..., :n_freq] = cpsd
+    out[..., n_freq:] = np.conj(cpsd[..., nfft - n_freq : 0 : -1])
+    return out
+
+
+def get_n_segments(n_samples, csd_params={}):
+    """
+    Get the number of segments each window is split into.
+
+    Parameters
+    ----------
+    n_samples : int
+        Window length, in samples
+    csd_params : dict, optional
+        Parameters accepted by ``scipy.signal.csd``
+
+    Returns
+    -------
+    n_segments : int
+    n_fft : int
+        FFT length
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        _, nperseg, noverlap, nfft = _get_segment_params(n_samples, csd_params)
+    return (n_samples - noverlap) // (nperseg - noverlap), nfft
+
+
+def _get_segment_params(n_samples, csd_params):
+    """Resolve the segment parameters like ``scipy.signal.csd``."""
+    window = csd_params.get("window", "hann")
+    nperseg = csd_params.get("nperseg", None)
+    if isinstance(window, (str, tuple)):
+        if nperseg is None:
+            nperseg = 256
+        if nperseg > n_samples:
+            warnings.warn(
+                f"nperseg = {nperseg} is greater than input length = {n_samples}, "
+                f"using nperseg = {n_samples}"
+            )
+            nperseg = n_samples
+        win = get_window(window, nperseg)
+    else:
+        win = np.asarray(window)
+        assert win.ndim == 1, "window must be 1-D"
+        assert n_samples >= len(win), "window is longer than input signal"
+        assert nperseg is None or nperseg == len(win), "nperseg != len(window)"
+        nperseg = len(win)
+    noverlap = csd_params.get("noverlap", None)
+    if noverlap is None:
+        noverlap = nperseg // 2
+    assert noverlap < nperseg, "noverlap must be less than nperseg."
+    nfft = csd_params.get("nfft", None)
+    if nfft is None:
+        nfft = nperseg
+    assert nfft >= nperseg, "nfft must be greater than or equal to nperseg."
+    return win, nperseg, noverlap, nfft
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
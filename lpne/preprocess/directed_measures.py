@@ -26,22 +26,17 @@ ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDI
 NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
 ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
-from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import warnings
 from warnings import warn
 import numpy as np
-from scipy.signal import csd
 from scipy.fft import fft, ifft
-from numpy.linalg import cholesky, solve
+from numpy.linalg import cholesky, LinAlgError, solve
 
-
-DEFAULT_CSD_PARAMS = {
-    "detrend": "constant",
-    "window": "hann",
-    "nperseg": 512,
-    "noverlap": 256,
-    "nfft": None,
-}
-"""Default parameters sent to ``scipy.signal.csd``"""
+from .cpsd import DEFAULT_CSD_PARAMS, get_segment_ffts, get_two_sided_cpsd
+from .windows import SUPPORTED_DTYPES
+from ..utils.utils import get_n_jobs
 
 
 def get_directed_spectral_measures(
@@ -56,10 +51,21 @@ def get_directed_spectral_measures(
     granger_reg=1e-2,
     csd_params={},
     conditional_covar_epsilon=1e-10,
+    n_jobs=1,
+    executor=None,
+    residual_tol=None,
+    return_diagnostics=False,
+    dtype=np.float64,
 ):
     """
     Calculate spectral Granger and directed spectrum from the signal ``X``.
 
+    The Wilson factorizations can be split across processes with ``n_jobs``. The
+    windows (or, if ``pairwise``, the window/ROI pair combinations) are divided into
+    ``n_jobs`` shards that are passed to the workers through shared memory. Each
+    window is factorized independently, so the results are identical to the serial
+    results.
+
     Parameters
     ----------
     X : numpy.ndarray
@@ -76,7 +82,8 @@ def get_directed_spectral_measures(
     max_iter : int, optional
         Maximum number of Wilson factorization iterations. Default: ``1000``
     tol : float, optional
-        Tolerance for Wilson factorization. Default: ``1e-6``
+        Tolerance for Wilson factorization. This is raised to ``1.2e-4`` in single
+        precision. Default: ``1e-6``
     cpsd_diag_reg : float, optional
         Regularize the CPSD diagonal by multiplying by 1 plus this value. Default:
         ``0.0``
@@ -88,6 +95,24 @@ def get_directed_spectral_measures(
     conditional_covar_epsilon : float, optional
         Used to prevent division by zero when calculating conditional innovation
         covariances. Default: ``1e-10``
+    n_jobs : int, optional
+        Number of shards the Wilson factorizations are split into. If ``executor``
+        is ``None``, this is also the number of worker processes. ``-1`` uses every
+        CPU. Default: ``1``
+    executor : None or concurrent.futures.Executor, optional
+        Runs the shards. Pass a ``ProcessPoolExecutor`` to reuse the same workers
+        across calls. If ``None`` and ``n_jobs > 1``, a ``ProcessPoolExecutor`` is
+        created and shut down within the call. Default: ``None``
+    residual_tol : None or float, optional
+        If given, the Wilson factorization of a window stops once the largest entry
+        of ``psi \\ cpsd / psi* - I`` is below this value, instead of once the
+        relative change in its factors is below ``tol``. ``max_iter`` still bounds
+        the number of iterations. Default: ``None``
+    return_diagnostics : bool, optional
+        Whether to return Wilson factorization diagnostics. Default: ``False``
+    dtype : {``numpy.float64``, ``numpy.float32``}, optional
+        Precision of the calculations and the returned measures. See
+        ``lpne.make_features``. Default: ``numpy.float64``
 
     Returns
     -------
@@ -100,12 +125,27 @@ def get_directed_spectral_measures(
     directed_spectrum : numpy.ndarray
         Directed spectrum measure. Returned if ``return_directed_spectrum``.
         Shape: ``[n_window, n_freq, n_roi, n_roi]``
+    diagnostics : dict
+        Wilson factorization diagnostics for each window. If ``pairwise``, these are
+        summarized over ROI pairs. Returned if ``return_diagnostics``.
+        'n_iter' : numpy.ndarray
+            Number of iterations, the maximum over pairs
+            Shape: ``[n_window]``
+        'residual' : numpy.ndarray
+            Largest absolute entry of ``psi \\ cpsd / psi* - I`` over frequencies
+            (and pairs)
+            Shape: ``[n_window]``
+        'converged' : numpy.ndarray
+            Whether the factorization converged (for every pair)
+            Shape: ``[n_window]``
     """
     # Check the input parameters.
     assert return_spectral_granger or return_directed_spectrum
     if X.ndim == 2:
         X = X.reshape(1, X.shape[0], X.shape[1])  # [r,t] -> [1,r,t]
     assert X.ndim == 3, f"len({X.shape}) != 3"
+    assert np.dtype(dtype) in SUPPORTED_DTYPES, f"Unsupported dtype: {dtype}"
+    X = X.astype(dtype, copy=False)
     r = X.shape[1]
     csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
     if "return_onesided" in csd_params:
@@ -118,33 +158,110 @@ def get_directed_spectral_measures(
     else:
         csd_params["scaling"] = "spectrum"
 
-    # Get a cross power spectral density matrix.
-    f, cpsd = csd(
-        X[:, np.newaxis],
-        X[:, :, np.newaxis],
-        fs=fs,
-        **csd_params,
-    )  # [f], [n,r,r,f]
-    cpsd = np.moveaxis(cpsd, 3, 1)  # [n,r,r,f] -> [n,f,r,r]
-    
+    # Get a two-sided cross power spectral density matrix from one-sided FFTs.
+    fft_params = {k: v for k, v in csd_params.items() if k != "return_onesided"}
+    _, seg_fft, win, nfft = get_segment_ffts(X, fs, csd_params=fft_params)
+    f, cpsd = get_two_sided_cpsd(seg_fft, win, nfft, fs)  # [f], [n,f,r,r]
+    del seg_fft
+    return _directed_measures_from_cpsd(
+        f,
+        cpsd,
+        return_spectral_granger=return_spectral_granger,
+        return_directed_spectrum=return_directed_spectrum,
+        pairwise=pairwise,
+        max_iter=max_iter,
+        tol=tol,
+        cpsd_diag_reg=cpsd_diag_reg,
+        granger_reg=granger_reg,
+        conditional_covar_epsilon=conditional_covar_epsilon,
+        n_jobs=n_jobs,
+        executor=executor,
+        residual_tol=residual_tol,
+        return_diagnostics=return_diagnostics,
+    )
+
+
+def _directed_measures_from_cpsd(
+    f,
+    cpsd,
+    return_spectral_granger=True,
+    return_directed_spectrum=True,
+    pairwise=True,
+    max_iter=1000,
+    tol=1e-6,
+    cpsd_diag_reg=0.0,
+    granger_reg=1e-2,
+    conditional_covar_epsilon=1e-10,
+    n_jobs=1,
+    executor=None,
+    residual_tol=None,
+    return_diagnostics=False,
+):
+    """
+    Calculate spectral Granger and directed spectrum from a two-sided CPSD.
+
+    See ``get_directed_spectral_measures`` for the other parameters.
+
+    Parameters
+    ----------
+    f : numpy.ndarray
+        Two-sided frequencies, ordered like ``scipy.fft.fftfreq``
+        Shape: ``[n_freq]``
+    cpsd : numpy.ndarray
+        Two-sided cross power spectral density with ``'spectrum'`` scaling. This is
+        modified in place if ``cpsd_diag_reg != 0``.
+        Shape: ``[n_window, n_freq, n_roi, n_roi]``
+
+    Returns
+    -------
+    f : numpy.ndarray
+        Array of sample frequencies
+        Shape: ``[n_freq]``
+    spectral_granger : numpy.ndarray
+        Spectral Granger measure. Returned if ``return_spectral_granger``.
+        Shape: ``[n_window, n_freq, n_roi, n_roi]``
+    directed_spectrum : numpy.ndarray
+        Directed spectrum measure. Returned if ``return_directed_spectrum``.
+        Shape: ``[n_window, n_freq, n_roi, n_roi]``
+    diagnostics : dict
+        Wilson factorization diagnostics. Returned if ``return_diagnostics``.
+    """
+    assert return_spectral_granger or return_directed_spectrum
+    r = cpsd.shape[-1]
+
     # Regularize the diagonal of the CPSD volume.
     if cpsd_diag_reg != 0.0:
-        cpsd[:,:,np.arange(r),np.arange(r)] *= 1.0 + cpsd_diag_reg
+        cpsd[:, :, np.arange(r), np.arange(r)] *= 1.0 + cpsd_diag_reg
 
     # Calculate the directed spectrum measure.
     if pairwise:
-        ds = np.zeros((X.shape[0], csd_params["nperseg"], r, r), dtype=np.float64)
-        for i1, i2 in combinations(range(r), 2):
-            idx = np.array([i1, i2], dtype=int)
-            sub_cpsd = cpsd[:, :, idx][:, :, :, idx]
-            # Factorize the CPSD.
-            H, Sigma = _wilson_factorize(sub_cpsd, max_iter, tol)  # [n,f,2,2], [n,2,2]
-            # Get the directed spectrum.
-            sub_ds = _H_Sigma_to_ds(H, Sigma, conditional_covar_epsilon)  # [n,f,2,2]
-            ds[:, :, i1, i2] = sub_ds[:, :, 0, 1]
-            ds[:, :, i2, i1] = sub_ds[:, :, 1, 0]
+        ds = np.zeros(cpsd.shape[:2] + (r, r), dtype=cpsd.real.dtype)
+        # Gather every pair of ROIs into one stack of 2x2 CPSDs: [n*p,f,2,2]
+        n, n_freq = cpsd.shape[:2]
+        i1, i2 = np.triu_indices(r, 1)  # same order as itertools.combinations
+        idx = np.stack([i1, i2], axis=1)  # [p,2]
+        sub_cpsd = cpsd[:, :, idx[:, :, None], idx[:, None, :]]  # [n,f,p,2,2]
+        sub_cpsd = np.moveaxis(sub_cpsd, 2, 1).reshape(-1, n_freq, 2, 2)
+        # Factorize the CPSDs: [n*p,f,2,2], [n*p,2,2], [n*p]
+        H, Sigma, diagnostics = _factorize(
+            sub_cpsd, max_iter, tol, residual_tol, n_jobs, executor
+        )
+        # Summarize the diagnostics over pairs.
+        diagnostics = dict(
+            n_iter=diagnostics["n_iter"].reshape(n, -1).max(axis=1),
+            residual=diagnostics["residual"].reshape(n, -1).max(axis=1),
+            converged=diagnostics["converged"].reshape(n, -1).all(axis=1),
+        )
+        # Get the directed spectrum.
+        sub_ds = _H_Sigma_to_ds(H, Sigma, conditional_covar_epsilon)  # [n*p,f,2,2]
+        sub_ds = np.moveaxis(sub_ds.reshape(n, -1, n_freq, 2, 2), 1, 2)  # [n,f,p,2,2]
+        ds[:, :, i1, i2] = sub_ds[..., 0, 1]
+        ds[:, :, i2, i1] = sub_ds[..., 1, 0]
     else:
-        H, Sigma = _wilson_factorize(cpsd, max_iter, tol)  # [n,f,r,r], [n,r,r]
+        # [n,f,r,r], [n,r,r], [n]
+        H, Sigma, diagnostics = _factorize(
+            cpsd, max_iter, tol, residual_tol, n_jobs, executor
+        )
         ds = _H_Sigma_to_ds(H, Sigma, conditional_covar_epsilon)
 
     # Now calculate spectral Granger.
@@ -172,6 +289,8 @@ def get_directed_spectral_measures(
         to_return.append(sg)
     if return_directed_spectrum:
         to_return.append(ds)
+    if return_diagnostics:
+        to_return.append(diagnostics)
     return tuple(to_return)
 
 
@@ -199,7 +318,115 @@ def _H_Sigma_to_ds(H, Sigma, eps=1e-10):
     return Sigma_cond[:, None] * H2.swapaxes(-1, -2)  # [n,f,r,r]
 
 
-def _wilson_factorize(cpsd, max_iter=1000, tol=1e-6, eps_multiplier=100.0):
+def _factorize(cpsd, max_iter, tol, residual_tol=None, n_jobs=1, executor=None):
+    """
+    Wilson factorize the CPSD, possibly split across worker processes.
+
+    See ``_wilson_factorize`` for the parameters. The diagnostics are always
+    returned.
+    """
+    params = dict(
+        max_iter=max_iter,
+        tol=tol,
+        residual_tol=residual_tol,
+        return_diagnostics=True,
+    )
+    n_jobs = min(get_n_jobs(n_jobs), max(len(cpsd), 1))
+    if n_jobs == 1 and executor is None:
+        return _wilson_factorize(cpsd, **params)
+    if executor is None:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            return _factorize(cpsd, max_iter, tol, residual_tol, n_jobs, executor)
+
+    # Copy the CPSD into shared memory and allocate shared outputs.
+    shapes = [cpsd.shape, cpsd.shape, cpsd.shape[:1] + cpsd.shape[2:]]
+    dtypes = [cpsd.dtype, np.result_type(cpsd.dtype, np.complex64), cpsd.real.dtype]
+    shms, arrs = [], []
+    try:
+        for shape, dtype in zip(shapes, dtypes):
+            n_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            shms.append(SharedMemory(create=True, size=max(n_bytes, 1)))
+            arrs.append(np.ndarray(shape, dtype=dtype, buffer=shms[-1].buf))
+        arrs[0][:] = cpsd
+        specs = [
+            (shm.name, shape, np.dtype(dtype).str)
+            for shm, shape, dtype in zip(shms, shapes, dtypes)
+        ]
+
+        # Factorize each shard.
+        bounds = np.linspace(0, len(cpsd), n_jobs + 1).astype(int)
+        futures = [
+            executor.submit(_wilson_shard, specs, k1, k2, params)
+            for k1, k2 in zip(bounds[:-1], bounds[1:])
+        ]
+        messages, diagnostics = [], []
+        for future in futures:
+            shard_messages, shard_diagnostics = future.result()
+            messages += [m for m in shard_messages if m not in messages]
+            diagnostics.append(shard_diagnostics)
+        H, Sigma = arrs[1].copy(), arrs[2].copy()
+    finally:
+        arrs = None  # release the buffers before closing
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    # Pass on any warnings raised in the workers.
+    for message in messages:
+        warn(message, stacklevel=3)
+    diagnostics = {
+        key: np.concatenate([d[key] for d in diagnostics]) for key in diagnostics[0]
+    }
+    return H, Sigma, diagnostics
+
+
+def _wilson_shard(specs, k1, k2, params):
+    """
+    Wilson factorize windows ``k1:k2`` of a CPSD stored in shared memory.
+
+    Parameters
+    ----------
+    specs : list of tuple
+        Name, shape, and dtype of the shared CPSD, H, and Sigma arrays
+    k1 : int
+        First window
+    k2 : int
+        One plus the last window
+    params : dict
+        Keyword arguments of ``_wilson_factorize``
+
+    Returns
+    -------
+    messages : list of str
+        Warnings raised during the factorization
+    diagnostics : dict
+        Diagnostics of each window
+    """
+    shms = [SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        cpsd, H, Sigma = [
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            for shm, (_, shape, dtype) in zip(shms, specs)
+        ]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            H[k1:k2], Sigma[k1:k2], diagnostics = _wilson_factorize(
+                cpsd[k1:k2], **params
+            )
+    finally:
+        cpsd = H = Sigma = None  # release the buffers before closing
+        for shm in shms:
+            shm.close()
+    return [str(w.message) for w in caught], diagnostics
+
+
+def _wilson_factorize(
+    cpsd,
+    max_iter=1000,
+    tol=1e-6,
+    eps_multiplier=100.0,
+    residual_tol=None,
+    return_diagnostics=False,
+):
     """Factorize CPSD into transfer matrix (H) and covariance (Sigma).
 
     Implements the algorithm outlined in the following reference:
@@ -209,6 +436,13 @@ def _wilson_factorize(cpsd, max_iter=1000, tol=1e-6, eps_multiplier=100.0):
     This code is based on an original implementation in MATLAB provided by M. Dhamala
     (mdhamala@mail.phy-ast.gsu.edu).
 
+    Every window is initialized from its own CPSD. There's deliberately no option to
+    warm-start a window from the factors of the previous window. On heavily
+    overlapping windows (window steps of 1/20 to 1/40 of the window duration), cold
+    starts converge in about 6-8 iterations, so warm starts saved less than one
+    iteration per window. Warm-started windows also converged to different exact
+    factors, and the directed features moved by 2-60% relative to cold starts.
+
     Parameters
     ----------
     cpsd : numpy.ndarray
@@ -217,10 +451,17 @@ def _wilson_factorize(cpsd, max_iter=1000, tol=1e-6, eps_multiplier=100.0):
     max_iter : int, optional
         Maximum number of iterations. Default: ``1000``
     tol : float, optional
-        Convergence tolerance value. Default: ``1e-6``
+        Convergence tolerance value. This is at least ``1000`` times the machine
+        epsilon, about ``1.2e-4`` in single precision. Default: ``1e-6``
     eps_multiplier : float, optional
         Constant multiplier used in stabilizing the Cholesky decomposition for positive
         semidefinite CPSD matrices. Default: ``100.0``
+    residual_tol : None or float, optional
+        If given, a window stops iterating once its residual is below this value,
+        instead of once the relative change in its factors is below ``tol``.
+        Default: ``None``
+    return_diagnostics : bool, optional
+        Whether to return convergence diagnostics. Default: ``False``
 
     Returns
     -------
@@ -230,47 +471,184 @@ def _wilson_factorize(cpsd, max_iter=1000, tol=1e-6, eps_multiplier=100.0):
     Sigma : numpy.ndarray
         shape(n_windows, n_signals, n_signals)
         Wilson factorization solutions for innovation covariance matrix.
+    diagnostics : dict
+        Returned if ``return_diagnostics``. Each value has shape (n_windows,).
+        'n_iter' : numpy.ndarray
+            Number of iterations
+        'residual' : numpy.ndarray
+            Maximum absolute entry of ``psi \\ cpsd / psi* - I`` over frequencies
+        'converged' : numpy.ndarray
+            Whether the window converged within ``max_iter`` iterations
     """
-    cpsd_cond = np.linalg.cond(cpsd)
-    if np.any(cpsd_cond > (1 / np.finfo(cpsd.dtype).eps)):
+    L, singular = _singular_cholesky(cpsd)
+    if np.any(singular):
         warn("CPSD matrix is singular!")
-        # Regularize the CPSD matrix.
-        this_eps = np.spacing(np.abs(cpsd)).max()
-        cpsd = cpsd + np.eye(cpsd.shape[-1]) * this_eps * eps_multiplier
+        # Regularize the singular CPSD matrices.
+        this_eps = np.spacing(np.abs(cpsd[singular])).max(axis=(1, 2, 3))
+        reg = this_eps[:, None, None, None] * eps_multiplier * np.eye(cpsd.shape[-1])
+        cpsd = cpsd.copy()
+        cpsd[singular] += reg
+        L[singular] = _cholesky(cpsd[singular])
 
     psi, A0 = _initialize_psi(cpsd)
-    L = cholesky(cpsd)
-    H = np.zeros_like(psi)
-    Sigma = np.zeros_like(A0)
-
-    for w in range(cpsd.shape[0]):
-        for _ in range(max_iter):
-            # These lines implement: g = psi \ cpsd / psi* + I
-            psi_inv_cpsd = solve(psi[w], L[w])
-            g = psi_inv_cpsd @ psi_inv_cpsd.conj().transpose(0, 2, 1)
-            g = g + np.identity(cpsd.shape[-1])
-            gplus, g0 = _plus_operator(g)
-
-            # S is chosen so that g0 + S is upper triangular; S + S* = 0
-            S = -np.tril(g0, -1)
-            S = S - S.conj().transpose()
-            gplus = gplus + S
-            psi_prev = psi[w].copy()
-            psi[w] = psi[w] @ gplus
-
-            A0_prev = A0[w].copy()
-            A0[w] = A0[w] @ (g0 + S)
-
-            if _check_convergence(psi[w], psi_prev, tol):
-                if _check_convergence(A0[w], A0_prev, tol):
+    n_iter, converged = _wilson_iterate(psi, A0, L, max_iter, tol, residual_tol)
+    if not np.all(converged):
+        warn(
+            f"Wilson factorization failed to converge in {np.sum(~converged)} of "
+            f"{len(converged)} windows.",
+            stacklevel=2,
+        )
+
+    # Collect the optimization results.
+    A0_T = A0.swapaxes(-1, -2)[:, np.newaxis]  # [n,1,r,r]
+    H = _solve(A0_T, psi.swapaxes(-1, -2)).swapaxes(-1, -2)  # [n,f,r,r]
+    Sigma = A0 @ A0.swapaxes(-1, -2)  # [n,r,r]
+    if return_diagnostics:
+        diagnostics = dict(
+            n_iter=n_iter,
+            residual=_get_residual(_solve(psi, L)),
+            converged=converged,
+        )
+        return H, Sigma, diagnostics
+    return H, Sigma
+
+
+def _wilson_iterate(psi, A0, L, max_iter, tol, residual_tol=None):
+    """
+    Run Wilson iterations until every window converges.
+
+    All the windows are iterated together, and windows are dropped once they've
+    converged. ``psi`` and ``A0`` are updated in place.
+
+    Parameters
+    ----------
+    psi : numpy.ndarray
+        Shape: [n,f,r,r]
+    A0 : numpy.ndarray
+        Shape: [n,r,r]
+    L : numpy.ndarray
+        Cholesky factors of the CPSD. Shape: [n,f,r,r]
+
+    Returns
+    -------
+    n_iter : numpy.ndarray
+        Number of iterations of each window. Shape: [n]
+    converged : numpy.ndarray
+        Whether each window converged. Shape: [n]
+    """
+    n_iter = np.zeros(len(psi), dtype=int)
+    converged = np.zeros(len(psi), dtype=bool)
+    eye = np.identity(psi.shape[-1], dtype=psi.real.dtype)
+    # Single precision round-off keeps the relative change above 1e-6.
+    tol = max(tol, 1000 * np.finfo(psi.dtype).eps)
+    idx = np.arange(len(psi))  # windows that are still being iterated
+    psi_a, A0_a, L_a = psi, A0, L
+
+    def drop(done):
+        # Save the windows that are done and stop iterating them.
+        converged[idx[done]] = True
+        psi[idx[done]] = psi_a[done]
+        A0[idx[done]] = A0_a[done]
+        keep = ~done
+        return keep, idx[keep], psi_a[keep], A0_a[keep], L_a[keep]
+
+    for i in range(max_iter + 1):
+        # These lines implement: g = psi \ cpsd / psi* + I
+        psi_inv_cpsd = _solve(psi_a, L_a)
+        g = _matmul(psi_inv_cpsd, psi_inv_cpsd.conj().swapaxes(-1, -2))
+        if residual_tol is not None:
+            done = _get_residual(psi_inv_cpsd, g) < residual_tol
+            if np.any(done):
+                keep, idx, psi_a, A0_a, L_a = drop(done)
+                if len(idx) == 0:
+                    break
+                g = g[keep]
+        if i == max_iter:
+            break
+        g = g + eye
+        gplus, g0 = _plus_operator(g)
+
+        # S is chosen so that g0 + S is upper triangular; S + S* = 0
+        S = -np.tril(g0, -1)
+        S = S - S.conj().swapaxes(-1, -2)
+        gplus = gplus + S[:, np.newaxis]
+        psi_prev, psi_a = psi_a, _matmul(psi_a, gplus)
+        A0_prev, A0_a = A0_a, _matmul(A0_a, g0 + S)
+        n_iter[idx] += 1
+
+        if residual_tol is None:
+            done = _check_convergence(psi_a, psi_prev, tol)
+            done &= _check_convergence(A0_a, A0_prev, tol)
+            if np.any(done):
+                _, idx, psi_a, A0_a, L_a = drop(done)
+                if len(idx) == 0:
                     break
-        else:
-            warn("Wilson factorization failed to converge.", stacklevel=2)
+    psi[idx] = psi_a
+    A0[idx] = A0_a
+    return n_iter, converged
 
-        # Collect the optimization results.
-        H[w] = (solve(A0[w].T, psi[w].transpose(0, 2, 1))).transpose(0, 2, 1)
-        Sigma[w] = A0[w] @ A0[w].T
-    return H, Sigma
+
+def _get_residual(psi_inv_cpsd, g=None):
+    """
+    Get the maximum absolute entry of ``psi \\ cpsd / psi* - I`` for each window.
+
+    Parameters
+    ----------
+    psi_inv_cpsd : numpy.ndarray
+        ``psi`` solved against the Cholesky factors of the CPSD. Shape: [n,f,r,r]
+    g : None or numpy.ndarray, optional
+        ``psi \\ cpsd / psi*``, if it has already been calculated. Shape: [n,f,r,r]
+
+    Returns
+    -------
+    residual : numpy.ndarray
+        Shape: [n]
+    """
+    if g is None:
+        g = _matmul(psi_inv_cpsd, psi_inv_cpsd.conj().swapaxes(-1, -2))
+    g = g - np.identity(g.shape[-1], dtype=g.real.dtype)
+    return np.abs(g).reshape(len(g), -1).max(axis=1)
+
+
+def _singular_cholesky(cpsd):
+    """
+    Find the singular CPSDs and get the Cholesky factors of the others.
+
+    Instead of calculating every condition number, a CPSD is singular if its Cholesky
+    decomposition fails or if a lower bound on its condition number is too big: the
+    smallest eigenvalue is at most the smallest squared diagonal entry of the
+    Cholesky factor, and the largest eigenvalue is at least the largest diagonal
+    entry of the CPSD.
+
+    Parameters
+    ----------
+    cpsd : numpy.ndarray
+        Shape: [n,f,r,r]
+
+    Returns
+    -------
+    L : numpy.ndarray
+        Cholesky factors. These are NaN for windows where the decomposition failed.
+        Shape: [n,f,r,r]
+    singular : numpy.ndarray
+        Shape: [n]
+    """
+    try:
+        L = _cholesky(cpsd)
+    except LinAlgError:
+        # Find the windows that failed.
+        L = np.full_like(cpsd, np.nan)
+        for i in range(len(cpsd)):
+            try:
+                L[i] = _cholesky(cpsd[i])
+            except LinAlgError:
+                pass
+    cpsd_diag = np.diagonal(cpsd, axis1=-2, axis2=-1).real  # [n,f,r]
+    L_diag = np.diagonal(L, axis1=-2, axis2=-1).real  # [n,f,r]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cond_bound = cpsd_diag.max(axis=-1) / L_diag.min(axis=-1) ** 2  # [n,f]
+    singular = ~np.all(cond_bound <= 1 / np.finfo(cpsd.dtype).eps, axis=1)  # [n]
+    return L, singular
 
 
 def _initialize_psi(cpsd):
@@ -291,8 +669,9 @@ def _initialize_psi(cpsd):
     gamma = ifft(cpsd, axis=1)
     gamma0 = gamma[:, 0]
     gamma0 = np.real((gamma0 + gamma0.conj().transpose(0, 2, 1)) / 2.0)
-    h = cholesky(gamma0).conj().transpose(0, 2, 1)
-    psi = np.tile(h[:, np.newaxis], (1, cpsd.shape[1], 1, 1)).astype(complex)
+    h = _cholesky(gamma0).conj().transpose(0, 2, 1)
+    psi = np.tile(h[:, np.newaxis], (1, cpsd.shape[1], 1, 1))
+    psi = psi.astype(np.result_type(cpsd.dtype, np.complex64))
     return psi, h
 
 
@@ -302,42 +681,93 @@ def _plus_operator(g):
     Parameters
     ----------
     g: numpy.ndarray
-        shape (n_frequencies, n_groups, n_groups)
+        shape (..., n_frequencies, n_groups, n_groups)
         Frequency-domain representation to which transformation will be applied.
 
     Returns
     -------
     g_pos : numpy.ndarray
-        shape (n_frequencies, n_groups, n_groups)
+        shape (..., n_frequencies, n_groups, n_groups)
         Transformed version of g with negative lag components removed.
-    gamma[0] : numpy.ndarray
-        shape (n_groups, n_groups)
+    gamma[..., 0, :, :] : numpy.ndarray
+        shape (..., n_groups, n_groups)
         Zero-lag component of g in time-domain.
     """
     # Remove imaginary components from ifft due to rounding error.
-    gamma = ifft(g, axis=0).real
+    gamma = ifft(g, axis=-3).real
     # Take half of zero lag.
-    gamma[0] *= 0.5
+    gamma[..., 0, :, :] *= 0.5
     # Take half of nyquist component if the FFT had even number of points.
-    F = gamma.shape[0]
+    F = gamma.shape[-3]
     N = np.floor(F / 2).astype(int)
     if F % 2 == 0:
-        gamma[N] *= 0.5
+        gamma[..., N, :, :] *= 0.5
     # Zero out the negative frequencies to make things causal.
-    gamma[N + 1 :] = 0
+    gamma[..., N + 1 :, :, :] = 0
     # Reconstitute things in the original domain.
-    gp = fft(gamma, axis=0)
-    return gp, gamma[0]
+    gp = fft(gamma, axis=-3)
+    return gp, gamma[..., 0, :, :]
+
+
+def _cholesky(a):
+    """
+    Cholesky decomposition with a closed form for stacks of 2x2 matrices.
+
+    LAPACK is called once per matrix by ``numpy.linalg.cholesky``, which dominates the
+    cost for the small matrices of the pairwise directed spectrum.
+    """
+    if a.shape[-1] != 2:
+        return cholesky(a)
+    with np.errstate(invalid="ignore"):
+        l11 = np.sqrt(a[..., 0, 0].real)
+        l21 = a[..., 1, 0] / l11
+        l22 = np.sqrt(a[..., 1, 1].real - (l21.real**2 + l21.imag**2))
+    if not (np.all(l11 > 0.0) and np.all(l22 > 0.0)):
+        raise LinAlgError("Matrix is not positive definite")
+    L = np.zeros_like(a)
+    L[..., 0, 0] = l11
+    L[..., 1, 0] = l21
+    L[..., 1, 1] = l22
+    return L
+
+
+def _solve(a, b):
+    """Same as ``numpy.linalg.solve``, with a closed form for 2x2 matrices."""
+    if a.shape[-1] != 2:
+        return solve(a, b)
+    a00, a01 = a[..., 0, 0, None], a[..., 0, 1, None]
+    a10, a11 = a[..., 1, 0, None], a[..., 1, 1, None]
+    det = a00 * a11 - a01 * a10
+    x = np.empty(np.broadcast_shapes(a.shape, b.shape), dtype=np.result_type(a, b))
+    x[..., 0, :] = (a11 * b[..., 0, :] - a01 * b[..., 1, :]) / det
+    x[..., 1, :] = (a00 * b[..., 1, :] - a10 * b[..., 0, :]) / det
+    return x
+
+
+def _matmul(a, b):
+    """Same as ``a @ b``, with a closed form for 2x2 matrices."""
+    if a.shape[-1] != 2 or b.shape[-1] != 2:
+        return a @ b
+    c = np.empty(np.broadcast_shapes(a.shape, b.shape), dtype=np.result_type(a, b))
+    for i in range(2):
+        for j in range(2):
+            c[..., i, j] = a[..., i, 0] * b[..., 0, j] + a[..., i, 1] * b[..., 1, j]
+    return c
 
 
 def _check_convergence(x, x_prev, tol):
-    """Determine whether maximum relative change is lower than tolerance."""
+    """
+    Determine whether maximum relative change is lower than tolerance.
+
+    The maximum is taken over all but the first axis, so this returns one boolean
+    per window.
+    """
     x_diff = np.abs(x - x_prev)
     ab_x = np.abs(x)
     this_eps = np.finfo(ab_x.dtype).eps
     ab_x[ab_x <= 2 * this_eps] = 1
     rel_diff = x_diff / ab_x
-    return rel_diff.max() < tol
+    return rel_diff.reshape(len(x), -1).max(axis=1) < tol
 
 
 if __name__ == "__main__":
@@ -1,12 +1,20 @@
 """
 Filter LFP waveforms.
 
+The bandpass filter and the 60Hz notch filters are combined into a single cascade of
+second-order sections, which is designed once for each set of filter parameters and
+shared by every channel.
+
 """
-__date__ = "October 2021 - May 2022"
+__date__ = "October 2021 - October 2026"
 
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-from scipy.signal import butter, lfilter, iirnotch
+from scipy.signal import butter, iirnotch, sosfilt, tf2sos
+
+from ..utils.utils import get_n_jobs
 
 
 ORDER = 3  # Butterworth bandpass filter order
@@ -52,38 +60,57 @@ def filter_signal(
     # Remove NaNs.
     nan_mask = np.isnan(x)
     x[nan_mask] = 0.0
-    # Bandpass.
-    x = _butter_bandpass_filter(x, lowcut, highcut, fs, order=order)
-    # Remove electrical noise at 60Hz and harmonics.
-    if apply_notch_filters:
-        for i, freq in enumerate(range(60, int(fs / 2), 60)):
-            b, a = iirnotch(freq, (i + 1) * q, fs)
-            x = lfilter(b, a, x)
+    # Bandpass and remove electrical noise at 60Hz and harmonics.
+    sos = get_filter_sos(fs, lowcut, highcut, q, order, apply_notch_filters)
+    x = sosfilt(sos, x)
     # Reintroduce NaNs.
     x[nan_mask] = np.nan
     return x
 
 
-def filter_lfps(lfps, fs, lowcut=LOWCUT, highcut=HIGHCUT, q=Q, order=ORDER):
+def filter_lfps(
+    lfps,
+    fs,
+    lowcut=LOWCUT,
+    highcut=HIGHCUT,
+    q=Q,
+    order=ORDER,
+    n_threads=None,
+    executor=None,
+):
     """
     Apply a bandpass filter and notch filters to all the LFPs.
 
+    The filters are designed once and shared by every channel. Channels are filtered
+    one at a time, which is faster than filtering a stacked ``[channel,time]`` array
+    because each channel's samples stay in cache. SciPy releases the GIL while
+    filtering, so channels can be filtered concurrently on a thread pool. The results
+    don't depend on the number of threads.
+
     Parameters
     ----------
     lfps : dict
-        Maps channel names to waveforms.
+        Maps channel names to waveforms. This is updated in place.
     fs : float
     lowcut : float
     highcut : float
     q : float
     order : int
+    n_threads : None or int, optional
+        Number of threads used to filter channels. ``None`` filters channels one at a
+        time and ``-1`` uses every CPU. Ignored if ``executor`` is given.
+    executor : None or concurrent.futures.Executor, optional
+        Filters the channels concurrently. Pass a ``ThreadPoolExecutor`` to share
+        threads across calls.
 
     Returns
     -------
     lfps : dict
     """
-    for channel in list(lfps.keys()):
-        lfps[channel] = filter_signal(
+    channels = list(lfps.keys())
+
+    def filter_channel(channel):
+        return filter_signal(
             lfps[channel],
             fs,
             lowcut=lowcut,
@@ -91,21 +118,63 @@ def filter_lfps(lfps, fs, lowcut=LOWCUT, highcut=HIGHCUT, q=Q, order=ORDER):
             q=q,
             order=order,
         )
+
+    traces = _map_channels(filter_channel, channels, n_threads, executor)
+    for channel, trace in zip(channels, traces):
+        lfps[channel] = trace
     return lfps
 
 
-def _butter_bandpass(lowcut, highcut, fs, order=ORDER):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype="band")
-    return b, a
+@lru_cache(maxsize=None)
+def get_filter_sos(
+    fs, lowcut=LOWCUT, highcut=HIGHCUT, q=Q, order=ORDER, apply_notch_filters=True
+):
+    """
+    Design the bandpass and notch filters as second-order sections.
 
+    Results are cached, so each filter is only designed once.
+
+    Parameters
+    ----------
+    fs : float
+        Samplerate
+    lowcut : float, optional
+        Lower frequency parameter of bandpass filter
+    highcut : float, optional
+        Higher frequency parameter of bandpass filter
+    q : float, optional
+        Notch filter quality factor. The notch filter at the ``i``-th harmonic of
+        60Hz has a quality factor of ``i * q``.
+    order : int, optional
+        Order of bandpass filter
+    apply_notch_filter : bool, optional
+        Whether to include the notch filters
 
-def _butter_bandpass_filter(data, lowcut, highcut, fs, order=ORDER):
-    b, a = _butter_bandpass(lowcut, highcut, fs, order=order)
-    y = lfilter(b, a, data)
-    return y
+    Returns
+    -------
+    sos : numpy.ndarray
+        Second-order sections, to be passed to ``scipy.signal.sosfilt``. This is
+        shared between calls, so it shouldn't be modified.
+        Shape: ``[n_sections,6]``
+    """
+    nyq = 0.5 * fs
+    sos = [butter(order, [lowcut / nyq, highcut / nyq], btype="band", output="sos")]
+    if apply_notch_filters:
+        for i, freq in enumerate(range(60, int(fs / 2), 60)):
+            b, a = iirnotch(freq, (i + 1) * q, fs)
+            sos.append(tf2sos(b, a))
+    return np.concatenate(sos, axis=0)
+
+
+def _map_channels(func, channels, n_threads=None, executor=None):
+    """Apply ``func`` to each channel, possibly on a thread pool, in order."""
+    if executor is not None:
+        return list(executor.map(func, channels))
+    n_threads = min(get_n_jobs(n_threads), max(1, len(channels)))
+    if n_threads == 1:
+        return [func(channel) for channel in channels]
+    with ThreadPoolExecutor(n_threads) as executor:
+        return list(executor.map(func, channels))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+"""
+A compact representation of the NaN samples in each LFP channel
+
+Outliers are marked by writing NaNs into the LFPs. Rather than scanning every sample
+with ``np.isnan`` to find them again, ``lpne.mark_outliers`` can also return an
+``IntervalMask`` holding the sorted ``[start,stop)`` sample intervals of the NaNs in
+each channel. ``lpne.average_channels``, ``lpne.get_outlier_summary``, and
+``lpne.make_features`` accept the mask, so finding the windows with NaNs takes time
+proportional to the number of windows and intervals instead of samples.
+
+"""
+__date__ = "October 2026"
+__all__ = ["IntervalMask"]
+
+
+import numpy as np
+
+
+class IntervalMask:
+    """
+    Sorted, disjoint ``[start,stop)`` intervals of NaN samples in each channel.
+
+    Parameters
+    ----------
+    intervals : dict
+        Maps channel names to interval arrays. Intervals are sorted and merged if
+        they aren't already.
+        Shape: ``[n_intervals,2]``
+    n_samples : int
+        Number of samples in each channel
+
+    Examples
+    --------
+    >>> lfps, mask = lpne.mark_outliers(lfps, fs, return_intervals=True)
+    >>> mask["Hipp_D_L_02"]  # [n_intervals,2]
+    >>> lfps, mask = lpne.average_channels(lfps, channel_map, mask=mask)
+    >>> features = lpne.make_features(lfps, fs, mask=mask)
+    """
+
+    def __init__(self, intervals, n_samples):
+        assert n_samples >= 0, f"Invalid number of samples: {n_samples}"
+        self.n_samples = int(n_samples)
+        self.intervals = {channel: _union([arr]) for channel, arr in intervals.items()}
+        for channel, arr in self.intervals.items():
+            assert len(arr) == 0 or (
+                arr[0, 0] >= 0 and arr[-1, 1] <= self.n_samples
+            ), f"Intervals of {channel} are out of bounds!"
+
+    @classmethod
+    def from_lfps(cls, lfps):
+        """
+        Find the NaNs in the LFPs.
+
+        Parameters
+        ----------
+        lfps : dict
+            Maps channel names to LFP waveforms, all the same length
+
+        Returns
+        -------
+        mask : IntervalMask
+        """
+        lengths = set(len(trace) for trace in lfps.values())
+        assert len(lengths) <= 1, f"LFPs have different lengths: {lengths}"
+        intervals = {k: get_intervals(np.isnan(v)) for k, v in lfps.items()}
+        return cls(intervals, lengths.pop() if len(lengths) == 1 else 0)
+
+    def keys(self):
+        """Channel names"""
+        return self.intervals.keys()
+
+    def __getitem__(self, channel):
+        return self.intervals[channel]
+
+    def __contains__(self, channel):
+        return channel in self.intervals
+
+    def union(self, channels):
+        """
+        Return the samples that are NaNs in any of the given channels.
+
+        Parameters
+        ----------
+        channels : list of str
+
+        Returns
+        -------
+        intervals : numpy.ndarray
+            Shape: ``[n_intervals,2]``
+        """
+        return _union([self.intervals[channel] for channel in channels])
+
+    def group(self, channel_map):
+        """
+        Combine the intervals of channels that map to the same group.
+
+        This matches ``lpne.average_channels``, where a sample of the averaged LFP is
+        a NaN if it's a NaN in any of the averaged channels.
+
+        Parameters
+        ----------
+        channel_map : dict
+            Maps channel names to grouped channel names
+
+        Returns
+        -------
+        mask : IntervalMask
+        """
+        groups = {}
+        for channel in self.intervals:
+            if channel in channel_map:
+                groups.setdefault(channel_map[channel], []).append(channel)
+        intervals = {group: self.union(groups[group]) for group in sorted(groups)}
+        return IntervalMask(intervals, self.n_samples)
+
+    def get_sample_mask(self, channel):
+        """
+        Return which samples of a channel are NaNs.
+
+        Returns
+        -------
+        sample_mask : numpy.ndarray
+            Shape: ``[n_samples]``
+        """
+        sample_mask = np.zeros(self.n_samples, dtype=bool)
+        for start, stop in self.intervals[channel]:
+            sample_mask[start:stop] = True
+        return sample_mask
+
+    def get_window_mask(self, onsets, window_samp, channels=None):
+        """
+        Find the windows that contain NaNs.
+
+        Parameters
+        ----------
+        onsets : numpy.ndarray
+            Window onsets, in samples
+            Shape: ``[n_window]``
+        window_samp : int
+            Window length, in samples
+        channels : None or list of str, optional
+            Channels to check. Defaults to every channel in sorted order.
+
+        Returns
+        -------
+        window_mask : numpy.ndarray
+            Whether each window of each channel contains NaNs
+            Shape: ``[n_channel,n_window]``
+        """
+        if channels is None:
+            channels = sorted(self.intervals.keys())
+        onsets = np.asarray(onsets, dtype=np.int64)
+        window_mask = np.zeros((len(channels), len(onsets)), dtype=bool)
+        for i, channel in enumerate(channels):
+            arr = self.intervals[channel]
+            if len(arr) == 0:
+                continue
+            # Find the last interval starting before each window ends.
+            idx = np.searchsorted(arr[:, 0], onsets + window_samp, side="left") - 1
+            valid = idx >= 0
+            window_mask[i, valid] = arr[idx[valid], 1] > onsets[valid]
+        return window_mask
+
+    def apply(self, lfps):
+        """
+        Write NaNs into the masked samples of the LFPs, in place.
+
+        Parameters
+        ----------
+        lfps : dict
+            Maps channel names to LFP waveforms
+
+        Returns
+        -------
+        lfps : dict
+        """
+        for channel, arr in self.intervals.items():
+            if channel in lfps:
+                for start, stop in arr:
+                    lfps[channel][start:stop] = np.nan
+        return lfps
+
+
+def get_intervals(sample_mask):
+    """
+    Return the ``[start,stop)`` indices of the runs of ``True`` in a mask.
+
+    Parameters
+    ----------
+    sample_mask : numpy.ndarray
+        Shape: ``[n_samples]``
+
+    Returns
+    -------
+    intervals : numpy.ndarray
+        Shape: ``[n_intervals,2]``
+    """
+    diff = np.diff(sample_mask.astype(np.int8), prepend=0, append=0)
+    starts, stops = np.flatnonzero(diff == 1), np.flatnonzero(diff == -1)
+    return np.stack([starts, stops], axis=1).astype(np.int64)
+
+
+def _union(interval_arrays):
+    """Sort the intervals and merge the ones that overlap or touch."""
+    arrays = [np.asarray(arr, dtype=np.int64).reshape(-1, 2) for arr in interval_arrays]
+    intervals = np.concatenate(arrays, axis=0) if len(arrays) > 0 else []
+    intervals = np.array(intervals, dtype=np.int64).reshape(-1, 2)
+    intervals = intervals[intervals[:, 1] > intervals[:, 0]]  # drop empty intervals
+    if len(intervals) < 2:
+        return intervals
+    intervals = intervals[np.argsort(intervals[:, 0], kind="stable")]
+    # Start a new interval wherever there's a gap after all the previous intervals.
+    prev_stops = np.maximum.accumulate(intervals[:, 1])
+    new = np.concatenate([[True], intervals[1:, 0] > prev_stops[:-1]])
+    idx = np.flatnonzero(new)
+    stops = np.maximum.reduceat(intervals[:, 1], idx)
+    return np.stack([intervals[idx, 0], stops], axis=1)
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
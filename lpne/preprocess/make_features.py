@@ -2,27 +2,27 @@
 Make features
 
 """
-__date__ = "July 2021 - January 2024"
+__date__ = "July 2021 - October 2026"
 
 
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from scipy.signal import csd
 
-from .directed_measures import get_directed_spectral_measures
+from .cpsd import DEFAULT_CSD_PARAMS, get_n_segments
+from .directed_measures import _directed_measures_from_cpsd
+from .phase_slope_index import get_psi_from_cpsd
+from .spectral_cache import SegmentFFT, SpectralCache
+from .windows import (
+    DEFAULT_CHUNK_SIZE,
+    EPSILON,
+    SUPPORTED_DTYPES,
+    get_window_view,
+    stack_lfps,
+)
+from ..utils.feature_store import FeatureStore
+from ..utils.utils import get_n_jobs
 from .. import __commit__ as LPNE_COMMIT
 from .. import __version__ as LPNE_VERSION
-from ..utils.array_utils import squeeze_triangular_array
-
-
-EPSILON = 1e-6
-DEFAULT_CSD_PARAMS = {
-    "detrend": "constant",
-    "window": "hann",
-    "nperseg": 512,
-    "noverlap": 256,
-    "nfft": None,
-}
-"""Default parameters sent to ``scipy.signal.csd``"""
 
 
 def make_features(
@@ -36,7 +36,14 @@ def make_features(
     spectral_granger=False,
     directed_spectrum=False,
     pairwise=True,
+    psi=False,
     csd_params={},
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    memory_budget=None,
+    n_jobs=1,
+    executor=None,
+    dtype=np.float64,
+    mask=None,
 ):
     """
     Main function: make features from an LFP waveform.
@@ -51,8 +58,9 @@ def make_features(
 
     Parameters
     ----------
-    lfps : dict
-        Maps region names to LFP waveforms.
+    lfps : dict or SpectralCache
+        Maps region names to LFP waveforms. If this is a ``SpectralCache``, its
+        segment FFTs are reused and the windowing parameters below must match it.
     fs : int, optional
         LFP samplerate
     min_freq : float, optional
@@ -72,8 +80,39 @@ def make_features(
         Whether to make directed spectrum features
     pairwise : bool, optional
         Whether spectral Granger and directed spectrum should be pairwise
+    psi : bool, optional
+        Whether to make phase slope index features. See ``lpne.get_psi``.
     csd_params : dict, optional
-        Parameters sent to ``scipy.signal.csd``
+        Parameters sent to ``scipy.signal.csd``. See
+        ``lpne.preprocess.cpsd.SUPPORTED_CSD_PARAMS``.
+    chunk_size : int, optional
+        Maximum number of windows processed at once. Overlapping windows are read
+        from a strided view of the LFPs, so only one chunk of windows is copied into
+        memory at a time. Ignored if ``lfps`` is a ``SpectralCache``.
+    memory_budget : None or int, optional
+        Approximate upper bound on the memory used by intermediate arrays, in bytes.
+        If given, ``chunk_size`` is lowered so that each chunk of windows fits in
+        the budget. This doesn't include the input LFPs or the returned features.
+        Ignored if ``lfps`` is a ``SpectralCache``.
+    n_jobs : int, optional
+        Number of processes used for spectral Granger and directed spectrum
+        features. ``-1`` uses every CPU. The features are identical to the serial
+        features. See ``lpne.get_directed_spectral_measures``.
+    executor : None or concurrent.futures.Executor, optional
+        Runs the directed spectral measures in parallel. If ``None`` and
+        ``n_jobs > 1``, a ``ProcessPoolExecutor`` is created for this call.
+    dtype : {``numpy.float64``, ``numpy.float32``}, optional
+        Precision of the calculations and the returned features. Single precision
+        halves the memory used. Compared to double precision, single precision
+        features differ by at most ``1e-6`` (power) or ``1e-5`` (spectral Granger,
+        directed spectrum, and phase slope index) times the largest value of the
+        same feature. See ``lpne.get_directed_spectral_measures``.
+    mask : None, lpne.IntervalMask, or numpy.ndarray, optional
+        NaN intervals of the LFPs, e.g. from ``lpne.average_channels``, or which
+        windows of which ROIs contain NaNs, e.g. the outlier matrix from
+        ``lpne.get_outlier_summary``. If this is given, the windows with NaNs are
+        found from the mask instead of by scanning every sample. It must include
+        every NaN in the LFPs. Ignored if ``lfps`` is a ``SpectralCache``.
 
     Returns
     -------
@@ -87,6 +126,9 @@ def make_features(
         'dir_spec' : numpy.ndarray
             Directed spectrum features. Only included if ``directed_spectrum``.
             Shape: ``[n_window, n_roi, n_roi, n_freq]``
+        'psi' : numpy.ndarray
+            Phase slope index features. Only included if ``psi``.
+            Shape: ``[n_window, n_roi, n_roi, n_freq]``
         'freq' : numpy.ndarray
             Frequency bins
             Shape: ``[n_freq]``
@@ -97,101 +139,350 @@ def make_features(
         '__version__' : str
             Version number of LPNE package
     """
-    assert (
-        window_step is None or window_step > 0.0
-    ), f"Nonpositive window step: {window_step}"
-    assert max_n_windows is None or max_n_windows > 0
-    rois = sorted(lfps.keys())
-    n = len(rois)
-    assert n >= 1, f"{n} < 1"
-    duration = len(lfps[rois[0]]) / fs
-    assert (
-        duration >= window_duration
-    ), f"LFPs are too short: {duration} < {window_duration}"
-    window_samp = int(fs * window_duration)
-    csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
-
-    # Stack the LFPs into a big array, X: [r,t]
-    X = np.vstack([lfps[rois[i]].flatten() for i in range(len(rois))])
-    if window_step is None:
-        # No window overlap: reshape the data.
-        idx = (X.shape[1] // window_samp) * window_samp
-        X = X[:, :idx]  # [r,t]
-        X = X.reshape(X.shape[0], -1, window_samp).transpose(1, 0, 2)  # [w,r,t]
-        if max_n_windows is not None:
-            X = X[:max_n_windows]  # [w,r,t]
-    else:
-        # Window overlap: copy the data.
-        onsets = np.arange(
-            0.0,
-            duration - window_duration + EPSILON,
+    if isinstance(lfps, SpectralCache):
+        spectra = lfps
+        spectra.check_params(
+            fs,
+            window_duration,
             window_step,
+            max_n_windows,
+            csd_params=csd_params,
+            dtype=dtype,
+        )
+    else:
+        csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
+        if memory_budget is not None:
+            bytes_per_window = _estimate_window_bytes(
+                len(lfps),
+                int(fs * window_duration),
+                csd_params,
+                spectral_granger or directed_spectrum,
+                pairwise,
+                dtype,
+            )
+            chunk_size = min(chunk_size, max(1, int(memory_budget // bytes_per_window)))
+        spectra = SpectralCache(
+            lfps,
+            fs=fs,
+            window_duration=window_duration,
+            window_step=window_step,
+            max_n_windows=max_n_windows,
+            csd_params=csd_params,
+            chunk_size=chunk_size,
+            cache=False,
+            dtype=dtype,
+            mask=mask,
         )
-        if max_n_windows is not None:
-            onsets = onsets[:max_n_windows]
-        temp_X = []
-        for k in range(len(onsets)):
-            k1 = int(fs * onsets[k])
-            k2 = k1 + window_samp
-            temp_X.append(X[:, k1:k2])
-        X = np.stack(temp_X, axis=0)  # [w,r,t]
-    assert X.ndim == 3, f"len({X.shape}) != 3"
 
-    # Make cross power spectral density features for each pair of ROIs.
-    # f: [f], cpsd: [w,r,r,f]
-    nan_mask = np.sum(np.isnan(X), axis=(1, 2)) != 0
-    X[nan_mask] = np.random.randn(*X[nan_mask].shape)
-    f, cpsd = csd(
-        X[:, :, np.newaxis],
-        X[:, np.newaxis],
-        fs=fs,
-        **csd_params,
+    # Share one process pool between all the chunks.
+    n_jobs = get_n_jobs(n_jobs)
+    own_executor = executor is None and n_jobs > 1
+    own_executor &= spectral_granger or directed_spectrum
+    if own_executor:
+        executor = ProcessPoolExecutor(n_jobs)
+
+    # Find the frequency bins, even if there aren't any windows.
+    i1, i2 = spectra.get_freq_idx(min_freq, max_freq)
+    f = spectra.freq[i1:i2]
+
+    # Make the features one chunk of windows at a time.
+    res = _get_empty_features(
+        len(spectra.rois),
+        len(f),
+        spectra.dtype,
+        spectral_granger,
+        directed_spectrum,
+        psi,
     )
-    i1, i2 = np.searchsorted(f, [min_freq, max_freq])
-    f = f[i1:i2]
-    cpsd = np.abs(cpsd[..., i1:i2])
-    cpsd = squeeze_triangular_array(cpsd, dims=(1, 2))  # [w,r*(r+1)//2,f]
-    cpsd[:, :] *= f  # scale the power features by frequency
-    cpsd[nan_mask] = np.nan  # reintroduce NaNs
+    try:
+        for k1, k2, chunk in spectra.iter_chunks():
+            _, chunk_res = _make_chunk_features(
+                chunk,
+                min_freq,
+                max_freq,
+                spectral_granger,
+                directed_spectrum,
+                pairwise,
+                psi,
+                n_jobs=n_jobs,
+                executor=executor,
+            )
+            if k1 == 0:
+                for key, arr in chunk_res.items():
+                    shape = (spectra.n_windows,) + arr.shape[1:]
+                    res[key] = np.empty(shape, dtype=arr.dtype)
+            for key, arr in chunk_res.items():
+                res[key][k1:k2] = arr
+    finally:
+        if own_executor:
+            executor.shutdown()
 
     # Assemble features.
     res = {
-        "power": cpsd,
+        **res,
         "freq": f,
-        "rois": rois,
+        "rois": spectra.rois,
         "__commit__": LPNE_COMMIT,
         "__version__": LPNE_VERSION,
     }
+    return res
+
+
+def stream_features(
+    lfp_chunks,
+    fs=1000,
+    min_freq=0.0,
+    max_freq=55.0,
+    window_duration=5.0,
+    window_step=None,
+    max_n_windows=None,
+    spectral_granger=False,
+    directed_spectrum=False,
+    pairwise=True,
+    psi=False,
+    csd_params={},
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    n_jobs=1,
+    executor=None,
+    dtype=np.float64,
+    store=None,
+):
+    """
+    Make features from a recording that arrives in consecutive chunks.
+
+    This is a streaming version of ``lpne.make_features`` for recordings that don't
+    fit in memory. Only the samples of windows that haven't been made yet are kept
+    between chunks, so windows that straddle chunk boundaries are handled exactly and
+    the features are the same as those made from the whole recording.
+
+    Parameters
+    ----------
+    lfp_chunks : iterable of dict
+        Consecutive chunks of the recording. Each chunk maps region names to the next
+        LFP samples of that region. Every chunk must have the same regions and the
+        same number of samples in each region, but chunks can have different lengths.
+    store : None, str, or lpne.FeatureStore, optional
+        If given, every batch of features is appended to this feature store.
+
+    See ``lpne.make_features`` for the other parameters.
+
+    Yields
+    ------
+    res : dict
+        Features of the next (at most ``chunk_size``) windows, in the same format as
+        ``lpne.make_features``.
+    """
+    csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
+    assert csd_params.get("return_onesided", True), "Spectrum must be one-sided!"
+    assert chunk_size >= 1, f"Invalid chunk size: {chunk_size}"
+    assert (
+        window_step is None or window_step > 0.0
+    ), f"Nonpositive window step: {window_step}"
+    assert max_n_windows is None or max_n_windows > 0
+    dtype = np.dtype(dtype)
+    assert dtype in SUPPORTED_DTYPES, f"Unsupported dtype: {dtype}"
+    if isinstance(store, str):
+        store = FeatureStore(store)
+    window_samp = int(fs * window_duration)
+
+    def get_onset(k):
+        # Same onsets as lpne.preprocess.windows.get_window_onsets
+        if window_step is None:
+            return k * window_samp
+        return int(fs * (k * window_step))
+
+    def is_ready(k, n_samples):
+        # Whether window k is in the first n_samples of the recording
+        if max_n_windows is not None and k >= max_n_windows:
+            return False
+        if get_onset(k) + window_samp > n_samples:
+            return False
+        if window_step is None:
+            return True
+        return k * window_step < n_samples / fs - window_duration + EPSILON
+
+    n_jobs = get_n_jobs(n_jobs)
+    own_executor = executor is None and n_jobs > 1
+    own_executor &= spectral_granger or directed_spectrum
+    if own_executor:
+        executor = ProcessPoolExecutor(n_jobs)
+
+    rois, buffer = None, None  # [r,t]
+    buffer_start = 0  # index of the first buffered sample
+    k = 0  # index of the next window
+    try:
+        for lfps in lfp_chunks:
+            chunk_rois, X = stack_lfps(lfps)
+            if rois is None:
+                rois, buffer = chunk_rois, np.zeros((len(chunk_rois), 0), dtype=dtype)
+            assert chunk_rois == rois, f"ROIs don't match: {chunk_rois} != {rois}"
+            buffer = np.concatenate([buffer, X.astype(dtype, copy=False)], axis=1)
+            n_samples = buffer_start + buffer.shape[1]
+
+            # Make features for every window that's been read.
+            while is_ready(k, n_samples):
+                k2 = k + 1
+                while k2 - k < chunk_size and is_ready(k2, n_samples):
+                    k2 += 1
+                onsets = np.array([get_onset(i) for i in range(k, k2)]) - buffer_start
+                view = get_window_view(buffer, window_samp)  # [t',r,t]
+                chunk = SegmentFFT(view[onsets], fs, csd_params)
+                f, res = _make_chunk_features(
+                    chunk,
+                    min_freq,
+                    max_freq,
+                    spectral_granger,
+                    directed_spectrum,
+                    pairwise,
+                    psi,
+                    n_jobs=n_jobs,
+                    executor=executor,
+                )
+                res = {
+                    **res,
+                    "freq": f,
+                    "rois": rois,
+                    "__commit__": LPNE_COMMIT,
+                    "__version__": LPNE_VERSION,
+                }
+                if store is not None:
+                    store.append(res)
+                yield res
+                k = k2
+
+            # Drop the samples that precede the next window.
+            n_drop = min(get_onset(k), n_samples) - buffer_start
+            buffer = buffer[:, n_drop:].copy()
+            buffer_start += n_drop
+            if max_n_windows is not None and k >= max_n_windows:
+                break
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def _estimate_window_bytes(
+    n_roi, window_samp, csd_params, directed, pairwise, dtype=np.float64
+):
+    """
+    Estimate the peak memory used by intermediate arrays for a single window.
+
+    Parameters
+    ----------
+    n_roi : int
+        Number of ROIs
+    window_samp : int
+        Window length, in samples
+    csd_params : dict
+        Parameters sent to ``scipy.signal.csd``. See
+        ``lpne.preprocess.cpsd.SUPPORTED_CSD_PARAMS``.
+    directed : bool
+        Whether directed spectral measures are calculated
+    pairwise : bool
+        Whether the pairwise directed spectrum is calculated
+    dtype : {``numpy.float64``, ``numpy.float32``}, optional
+        Precision of the calculations
+
+    Returns
+    -------
+    n_bytes : int
+    """
+    n_seg, n_fft = get_n_segments(window_samp, csd_params)
+    n_pair = (n_roi * (n_roi + 1)) // 2
+    n_words = n_roi * window_samp  # window copy
+    n_words += 2 * n_roi * n_seg * n_fft  # segments
+    n_words += 2 * 2 * n_roi * n_seg * (n_fft // 2 + 1)  # FFTs
+    n_words += 3 * 2 * n_pair * (n_fft // 2 + 1)  # cross products and features
+    if directed:
+        n_words += 3 * 2 * n_roi**2 * n_fft  # two-sided CPSD
+        # Every pair of ROIs is factorized at once in the pairwise case.
+        n_wilson = 2 * n_roi * (n_roi - 1) if pairwise else n_roi ** 2
+        n_words += 8 * 2 * max(n_wilson, n_roi**2) * n_fft  # Wilson factorization
+    return np.dtype(dtype).itemsize * n_words
+
+
+def _get_empty_features(n_roi, n_freq, dtype, spectral_granger, directed_spectrum, psi):
+    """Make features for zero windows."""
+    res = {"power": np.empty((0, (n_roi * (n_roi + 1)) // 2, n_freq), dtype=dtype)}
+    keys = [(psi, "psi"), (spectral_granger, "spectral_granger")]
+    keys += [(directed_spectrum, "dir_spec")]
+    for flag, key in keys:
+        if flag:
+            res[key] = np.empty((0, n_roi, n_roi, n_freq), dtype=dtype)
+    return res
+
+
+def _make_chunk_features(
+    chunk,
+    min_freq,
+    max_freq,
+    spectral_granger,
+    directed_spectrum,
+    pairwise,
+    psi,
+    n_jobs=1,
+    executor=None,
+):
+    """
+    Make features for a chunk of windows.
+
+    See ``make_features`` for the other parameters.
+
+    Parameters
+    ----------
+    chunk : lpne.preprocess.spectral_cache.SegmentFFT
+        Segment FFTs of the windows in the chunk
+
+    Returns
+    -------
+    f : numpy.ndarray
+        Frequency bins
+        Shape: ``[n_freq]``
+    res : dict
+        Maps feature names to feature arrays
+    """
+    i1, i2 = chunk.get_freq_idx(min_freq, max_freq)
+    f = chunk.freq[i1:i2]
+
+    # Make cross power spectral density features for each pair of ROIs.
+    cpsd = np.abs(chunk.get_cpsd(i1, i2))  # [w,r*(r+1)//2,f]
+    cpsd[:, :] *= f  # scale the power features by frequency
+    cpsd[chunk.nan_mask] = np.nan  # reintroduce NaNs
+    res = {"power": cpsd}
+
+    # Make phase slope index features.
+    if psi:
+        assert i2 < len(chunk.freq), f"Need {i2 - len(chunk.freq) + 1} more bin(s)!"
+        psi_arr = get_psi_from_cpsd(chunk.get_cpsd(i1, i2 + 1, full=True))
+        psi_arr[chunk.nan_mask] = np.nan  # reintroduce NaNs
+        res["psi"] = psi_arr
 
     # Make directed spectrum features.
     if spectral_granger or directed_spectrum:
         # f_temp: [f], sg and ds: [w,f,r,r]
-        temp_res = get_directed_spectral_measures(
-            X,
-            fs,
+        temp_res = _directed_measures_from_cpsd(
+            *chunk.get_two_sided_cpsd(),
             return_spectral_granger=spectral_granger,
             return_directed_spectrum=directed_spectrum,
             pairwise=pairwise,
-            csd_params=csd_params,
+            n_jobs=n_jobs,
+            executor=executor,
         )
         # Figure out frequencies.
-        f_temp = temp_res[0]
-        i1, i2 = np.searchsorted(f, [min_freq, max_freq])
-        f_temp = f_temp[i1:i2]
+        f_temp = temp_res[0][i1:i2]
         assert np.allclose(f, f_temp), f"Frequencies don't match:\n{f}\n{f_temp}"
-        f_reshape = f_temp.reshape(1, -1, 1, 1)
+        f_reshape = f_temp.reshape(1, -1, 1, 1).astype(chunk.dtype)
         if spectral_granger:
-            sg = temp_res[1][:, i1:i2] # don't scale by frequency
+            sg = temp_res[1][:, i1:i2]  # don't scale by frequency
             sg = np.moveaxis(sg, 1, -1)  # [w,r,r,f]
-            sg[nan_mask] = np.nan  # reintroduce NaNs
+            sg[chunk.nan_mask] = np.nan  # reintroduce NaNs
             res["spectral_granger"] = sg
         if directed_spectrum:
             ds = temp_res[-1][:, i1:i2] * f_reshape  # scale by frequency
             ds = np.moveaxis(ds, 1, -1)  # [w,r,r,f]
-            ds[nan_mask] = np.nan  # reintroduce NaNs
+            ds[chunk.nan_mask] = np.nan  # reintroduce NaNs
             res["dir_spec"] = ds
-
-    return res
+    return f, res
 
 
 if __name__ == "__main__":
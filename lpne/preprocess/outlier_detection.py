@@ -1,13 +1,21 @@
 """
 Remove artifacts in the LFPs.
 
+Samples are outliers if their deviation from the median of the high-pass filtered
+signal is more than ``mad_threshold`` times the median absolute deviation (MAD). The
+median and MAD are found either exactly, with in-place selection on a single scratch
+copy of the filtered signal, or approximately, from two passes of histograms over
+chunks of the filtered signal, which needs no full-length copies at all.
+
 """
-__date__ = "May 2022"
+__date__ = "May 2022 - October 2026"
 
 
 import numpy as np
+from scipy.signal import sosfilt
 
-from .filter import filter_signal
+from .filter import get_filter_sos, _map_channels
+from .interval_mask import IntervalMask, get_intervals, _union
 
 
 DEFAULT_MAD_TRESHOLD = 15.0
@@ -16,14 +24,33 @@ LOWCUT = 30.0  # Butterworth bandpass filter parameter
 """Default lowcut for filtering (Hz)"""
 HIGHCUT = 55.0  # Butterworth bandpass filter parameter
 """Default highcut for filtering (Hz)"""
+MAD_METHODS = ["exact", "histogram"]
+"""Ways of calculating the median and MAD"""
+DEFAULT_CHUNK_SIZE = 2**20
+"""Default number of samples processed at once"""
+HISTOGRAM_BINS = 2**12
+"""Number of bins in each level of the histograms used by the ``'histogram'`` method"""
 
 
 def mark_outliers(
-    lfps, fs, lowcut=LOWCUT, highcut=HIGHCUT, mad_threshold=DEFAULT_MAD_TRESHOLD
+    lfps,
+    fs,
+    lowcut=LOWCUT,
+    highcut=HIGHCUT,
+    mad_threshold=DEFAULT_MAD_TRESHOLD,
+    n_threads=None,
+    executor=None,
+    mad_method="exact",
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    return_intervals=False,
 ):
     """
     Detect outlying samples in the LFPs.
 
+    Outliers are marked with NaNs in place. Channels are independent, so they can be
+    processed concurrently on a thread pool without changing the results. Samples
+    that are already NaNs are ignored when calculating the median and MAD.
+
     Parameters
     ----------
     lfps : dict
@@ -33,34 +60,130 @@ def mark_outliers(
     mad_threshold : float, optional
         A median absolute deviation treshold used to determine whether a point
         is an outlier. A lower value marks more points as outliers.
+    n_threads : None or int, optional
+        Number of threads used to process channels. ``None`` processes channels one
+        at a time and ``-1`` uses every CPU. Ignored if ``executor`` is given.
+    executor : None or concurrent.futures.Executor, optional
+        Processes the channels concurrently. Pass a ``ThreadPoolExecutor`` to share
+        threads across calls.
+    mad_method : {``'exact'``, ``'histogram'``}, optional
+        How the median and MAD are calculated. ``'exact'`` uses linear-time
+        selection on one copy of the filtered signal. ``'histogram'`` approximates
+        them, to within a ``HISTOGRAM_BINS**-2`` fraction of the range of the
+        filtered signal, using histograms of ``chunk_size`` samples at a time.
+    chunk_size : int, optional
+        Number of samples compared to the threshold at once, and the number of
+        samples in each histogram for the ``'histogram'`` method.
+    return_intervals : bool, optional
+        Whether to also return the NaN samples, both the new outliers and any NaNs
+        that were already in the LFPs, as an ``lpne.IntervalMask``.
 
     Returns
     -------
     lfps : dict
         Maps ROI names to LFP waveforms.
+    mask : lpne.IntervalMask
+        Sorted ``[start,stop)`` sample intervals of the NaNs in each channel. Only
+        returned if ``return_intervals``.
     """
     assert mad_threshold > 0.0, "mad_threshold must be positive!"
-    for roi in lfps:
-        # Copy the signal.
-        trace = np.copy(lfps[roi])
-        # Filter the signal.
-        trace = filter_signal(
-            trace,
-            fs,
-            lowcut=lowcut,
-            highcut=highcut,
-            apply_notch_filters=False,
+    assert lowcut < highcut, f"{lowcut} >= {highcut}"
+    assert mad_method in MAD_METHODS, f"Unsupported MAD method: {mad_method}"
+    assert chunk_size >= 1, f"Invalid chunk_size: {chunk_size}"
+    sos = get_filter_sos(fs, lowcut, highcut, apply_notch_filters=False)
+
+    def mark_channel(roi):
+        # Filter the signal, only copying it if it has NaNs.
+        nan_mask = np.isnan(lfps[roi])
+        has_nans = nan_mask.any()
+        trace = sosfilt(
+            sos, np.where(nan_mask, 0.0, lfps[roi]) if has_nans else lfps[roi]
         )
-        # Subtract out the median and rectify.
-        trace = np.abs(trace - np.median(trace))
-        # Calculate the MAD and the treshold.
-        mad = np.median(trace)  # median absolute deviation
+        if has_nans:
+            trace[nan_mask] = np.nan
+        # Calculate the median, the MAD, and the treshold.
+        if mad_method == "exact":
+            median, mad = _get_median_and_mad(trace[~nan_mask] if has_nans else trace)
+        else:
+            median = _get_histogram_median(trace, chunk_size)
+            mad = _get_histogram_median(trace, chunk_size, center=median)
         thresh = mad_threshold * mad
-        # Mark outlying samples.
-        lfps[roi][trace > thresh] = np.nan
+        # Mark outlying samples one chunk at a time.
+        intervals = [get_intervals(nan_mask)] if has_nans and return_intervals else []
+        for i in range(0, len(trace), chunk_size):
+            outliers = np.abs(trace[i : i + chunk_size] - median) > thresh
+            lfps[roi][i : i + chunk_size][outliers] = np.nan
+            if return_intervals:
+                intervals.append(get_intervals(outliers) + i)
+        if return_intervals:
+            return _union(intervals)
+
+    res = _map_channels(mark_channel, list(lfps.keys()), n_threads, executor)
+    if return_intervals:
+        lengths = set(len(trace) for trace in lfps.values())
+        assert len(lengths) <= 1, f"LFPs have different lengths: {lengths}"
+        n_samples = lengths.pop() if len(lengths) == 1 else 0
+        return lfps, IntervalMask(dict(zip(lfps.keys(), res)), n_samples)
     return lfps
 
 
+def _get_median_and_mad(x):
+    """Return the median and MAD using in-place selection on a single copy."""
+    work = np.array(x, dtype=np.float64)
+    if len(work) == 0:
+        return np.nan, np.nan
+    median = _select_median(work)
+    np.subtract(work, median, out=work)
+    np.abs(work, out=work)
+    return median, _select_median(work)
+
+
+def _select_median(work):
+    """Return the median of an array, partitioning it in place."""
+    k = len(work) // 2
+    work.partition(k)
+    if len(work) % 2 == 1:
+        return work[k]
+    return 0.5 * (work[:k].max() + work[k])
+
+
+def _get_histogram_median(x, chunk_size, center=None, n_bins=HISTOGRAM_BINS):
+    """
+    Approximate the median of ``x`` or ``abs(x-center)`` ignoring NaNs.
+
+    The median is found in a histogram over the range of the values, and then in a
+    second histogram over the bin that holds the median. Both histograms are built
+    one chunk of ``chunk_size`` values at a time.
+    """
+
+    def iter_chunks():
+        for i in range(0, len(x), chunk_size):
+            chunk = x[i : i + chunk_size]
+            chunk = chunk[~np.isnan(chunk)]
+            yield chunk if center is None else np.abs(chunk - center)
+
+    low, high, n = np.inf, -np.inf, 0
+    for chunk in iter_chunks():
+        if len(chunk) > 0:
+            low, high = min(low, chunk.min()), max(high, chunk.max())
+            n += len(chunk)
+    if n == 0:
+        return np.nan
+    rank = n // 2  # zero-based rank of the median
+    for _ in range(2):
+        if low == high:
+            break
+        counts = np.zeros(n_bins, dtype=np.int64)
+        for chunk in iter_chunks():
+            counts += np.histogram(chunk, bins=n_bins, range=(low, high))[0]
+        cumsum = np.cumsum(counts)
+        b = int(np.searchsorted(cumsum, rank, side="right"))
+        rank -= cumsum[b - 1] if b > 0 else 0
+        width = (high - low) / n_bins
+        low, high = low + b * width, low + (b + 1) * width
+    return 0.5 * (low + high)
+
+
 if __name__ == "__main__":
     pass
 
@@ -2,14 +2,14 @@
 Calculate the phase-slope index
 
 """
-__date__ = "January 2023"
+__date__ = "January 2023 - October 2026"
 __all__ = ["get_psi"]
 
 
 import numpy as np
-from scipy.signal import csd
 
-from .make_features import EPSILON, DEFAULT_CSD_PARAMS
+from .spectral_cache import SpectralCache
+from .windows import DEFAULT_CHUNK_SIZE, EPSILON
 
 
 def get_psi(
@@ -21,6 +21,8 @@ def get_psi(
     window_step=None,
     max_n_windows=None,
     csd_params={},
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    dtype=np.float64,
 ):
     """
     Calculate the Phase-Slope Index (PSI).
@@ -31,8 +33,9 @@ def get_psi(
 
     Parameters
     ----------
-    lfps : dict
-        Maps region names to LFP waveforms.
+    lfps : dict or SpectralCache
+        Maps region names to LFP waveforms. If this is a ``SpectralCache``, its
+        segment FFTs are reused and the windowing parameters below must match it.
     fs : int, optional
         LFP samplerate
     min_freq : float, optional
@@ -48,6 +51,12 @@ def get_psi(
         Maximum number of windows
     csd_params : dict, optional
         Parameters sent to ``scipy.signal.csd``
+    chunk_size : int, optional
+        Maximum number of windows processed at once. Ignored if ``lfps`` is a
+        ``SpectralCache``.
+    dtype : {``numpy.float64``, ``numpy.float32``}, optional
+        Precision of the calculations and the returned features. See
+        ``lpne.make_features``.
 
     Returns
     -------
@@ -61,76 +70,73 @@ def get_psi(
         'rois' : list of str
             Sorted list of grouped channel names
     """
-    assert (
-        window_step is None or window_step > 0.0
-    ), f"Nonpositive window step: {window_step}"
-    assert max_n_windows is None or max_n_windows > 0
-    rois = sorted(lfps.keys())
-    n = len(rois)
-    assert n >= 1, f"{n} < 1"
-    duration = len(lfps[rois[0]]) / fs
-    assert (
-        duration >= window_duration
-    ), f"LFPs are too short: {duration} < {window_duration}"
-    window_samp = int(fs * window_duration)
-    csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
-
-    # Stack the LFPs into a big array, X: [r,t]
-    X = np.vstack([lfps[rois[i]].flatten() for i in range(len(rois))])
-    if window_step is None:
-        # No window overlap: reshape the data.
-        idx = (X.shape[1] // window_samp) * window_samp
-        X = X[:, :idx]  # [r,t]
-        X = X.reshape(X.shape[0], -1, window_samp).transpose(1, 0, 2)  # [w,r,t]
-        if max_n_windows is not None:
-            X = X[:max_n_windows]  # [w,r,t]
-    else:
-        # Window overlap: copy the data.
-        onsets = np.arange(
-            0.0,
-            duration - window_duration + EPSILON,
+    if isinstance(lfps, SpectralCache):
+        spectra = lfps
+        spectra.check_params(
+            fs,
+            window_duration,
             window_step,
+            max_n_windows,
+            csd_params=csd_params,
+            dtype=dtype,
+        )
+    else:
+        spectra = SpectralCache(
+            lfps,
+            fs=fs,
+            window_duration=window_duration,
+            window_step=window_step,
+            max_n_windows=max_n_windows,
+            csd_params=csd_params,
+            chunk_size=chunk_size,
+            cache=False,
+            dtype=dtype,
         )
-        if max_n_windows is not None:
-            onsets = onsets[:max_n_windows]
-        temp_X = []
-        for k in range(len(onsets)):
-            k1 = int(fs * onsets[k])
-            k2 = k1 + window_samp
-            temp_X.append(X[:, k1:k2])
-        X = np.stack(temp_X, axis=0)  # [w,r,t]
-    assert X.ndim == 3, f"len({X.shape}) != 3"
-
-    # Make cross power spectral density features for each pair of ROIs.
-    # f: [f], cpsd: [w,r,r,f]
-    nan_mask = np.sum(np.isnan(X), axis=(1, 2)) != 0
-    X[nan_mask] = np.random.randn(*X[nan_mask].shape)
-    f, cpsd = csd(
-        X[:, :, np.newaxis],
-        X[:, np.newaxis],
-        fs=fs,
-        **csd_params,
-    )
-    i1, i2 = np.searchsorted(f, [min_freq, max_freq])
-    assert i2 < len(f), f"Need {i1 - len(f) + 1} more frequency bin(s)!"
-    f = f[i1:i2]
-    cpsd = cpsd[..., i1 : i2 + 1]  # [w,r,r,f]
-
-    # Calculate the phase-slope index.
-    amp = np.sqrt(np.diagonal(cpsd, 0, 1, 2).real + EPSILON)  # [w,f,r]
-    amp = np.moveaxis(amp, 1, -1)  # [w,r,f]
-    coh = cpsd / (amp[:, np.newaxis] * amp[:, :, np.newaxis])  # [w,r,r,f]
-    psi = np.imag(np.conj(coh[..., :-1]) * coh[..., 1:])  # [w,r,r,f]
-    psi[nan_mask] = np.nan  # reintroduce NaNs
+
+    # Find the frequency bins, even if there aren't any windows.
+    freq = spectra.freq
+    i1, i2 = spectra.get_freq_idx(min_freq, max_freq)
+    assert i2 < len(freq), f"Need {i2 - len(freq) + 1} more frequency bin(s)!"
+    n_roi = len(spectra.rois)
+    psi = np.empty((spectra.n_windows, n_roi, n_roi, i2 - i1), dtype=spectra.dtype)
+
+    # Calculate the phase-slope index one chunk of windows at a time.
+    for k1, k2, chunk in spectra.iter_chunks():
+        psi_chunk = get_psi_from_cpsd(chunk.get_cpsd(i1, i2 + 1, full=True))
+        psi_chunk[chunk.nan_mask] = np.nan  # reintroduce NaNs
+        psi[k1:k2] = psi_chunk
 
     res = {
         "psi": psi,
-        "freq": f,
-        "rois": rois,
+        "freq": freq[i1:i2],
+        "rois": spectra.rois,
     }
     return res
 
 
+def get_psi_from_cpsd(cpsd):
+    """
+    Calculate the phase-slope index from a cross power spectral density.
+
+    Parameters
+    ----------
+    cpsd : numpy.ndarray
+        Complex cross power spectral density, ``<conj(F_i) F_j>``, with one more
+        frequency bin than the returned phase-slope index.
+        Shape: ``[n_window, n_roi, n_roi, n_freq+1]``
+
+    Returns
+    -------
+    psi : numpy.ndarray
+        Phase slope index
+        Shape: ``[n_window, n_roi, n_roi, n_freq]``
+    """
+    amp = np.sqrt(np.diagonal(cpsd, 0, 1, 2).real + EPSILON)  # [w,f,r]
+    amp = np.moveaxis(amp, 1, -1)  # [w,r,f]
+    coh = cpsd / (amp[:, np.newaxis] * amp[:, :, np.newaxis])  # [w,r,r,f]
+    return np.imag(np.conj(coh[..., :-1]) * coh[..., 1:])  # [w,r,r,f]
+
+
 if __name__ == "__main__":
     pass
 
@@ -0,0 +1,309 @@
+"""
+Share the per-segment FFTs of windowed LFPs between spectral features.
+
+Power, spectral Granger, directed spectrum, and phase slope index features are all
+derived from cross products of the same segment FFTs. A ``SpectralCache`` computes
+these FFTs once per recording and windowing configuration.
+
+"""
+__date__ = "October 2026"
+__all__ = ["SpectralCache"]
+
+
+import numpy as np
+from scipy import fft as sp_fft
+
+from .cpsd import (
+    DEFAULT_CSD_PARAMS,
+    get_cpsd_scale,
+    get_cross_products,
+    get_n_segments,
+    get_segment_ffts,
+    get_two_sided_cpsd,
+)
+from .interval_mask import IntervalMask
+from .windows import (
+    DEFAULT_CHUNK_SIZE,
+    SUPPORTED_DTYPES,
+    get_window_onsets,
+    get_window_view,
+    stack_lfps,
+)
+
+
+class SpectralCache:
+    """
+    Per-segment FFTs of windowed LFPs.
+
+    Pass the same ``SpectralCache`` in place of the LFPs to ``lpne.make_features`` and
+    ``lpne.get_psi`` to compute the FFTs only once. Windows are processed in chunks of
+    ``chunk_size`` windows. If ``cache`` is ``True``, the FFTs of every chunk are kept
+    in memory after they are first computed, which takes roughly twice the memory of
+    the windowed LFPs. Otherwise they are recomputed on every pass.
+
+    If ``dtype`` is ``numpy.float32``, the LFPs are stored in single precision and the
+    FFTs are ``numpy.complex64``, which halves the memory used. See
+    ``lpne.make_features`` for the accuracy of single-precision features.
+
+    Parameters
+    ----------
+    lfps : dict
+        Maps region names to LFP waveforms.
+    fs : int, optional
+        LFP samplerate
+    window_duration : float, optional
+        Window duration, in seconds
+    window_step : None or float, optional
+        Time between consecutive window onsets, in seconds. If ``None``, this is
+        set to ``window_duration``.
+    max_n_windows : None or int, optional
+        Maximum number of windows
+    csd_params : dict, optional
+        Parameters sent to ``scipy.signal.csd``. See
+        ``lpne.preprocess.cpsd.SUPPORTED_CSD_PARAMS``.
+    chunk_size : int, optional
+        Maximum number of windows processed at once
+    cache : bool, optional
+        Whether to keep the FFTs in memory
+    dtype : {``numpy.float64``, ``numpy.float32``}, optional
+        Precision of the LFPs and FFTs
+    mask : None, lpne.IntervalMask, or numpy.ndarray, optional
+        NaN intervals of the LFPs, e.g. from ``lpne.mark_outliers``, or which
+        windows contain NaNs, e.g. the outlier matrix from
+        ``lpne.get_outlier_summary``. Window masks have shape ``[n_roi,n_window]``
+        or ``[n_window]``. If this is given, the windows with NaNs are found from
+        the mask instead of by scanning every sample. It must include every NaN in
+        the LFPs.
+    """
+
+    def __init__(
+        self,
+        lfps,
+        fs=1000,
+        window_duration=5.0,
+        window_step=None,
+        max_n_windows=None,
+        csd_params={},
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        cache=True,
+        dtype=np.float64,
+        mask=None,
+    ):
+        csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
+        assert csd_params.get("return_onesided", True), "Spectrum must be one-sided!"
+        assert chunk_size >= 1, f"Invalid chunk size: {chunk_size}"
+        dtype = np.dtype(dtype)
+        assert dtype in SUPPORTED_DTYPES, f"Unsupported dtype: {dtype}"
+        self.dtype = dtype
+        self.rois, self.X = stack_lfps(lfps)  # [r,t]
+        self.X = self.X.astype(dtype, copy=False)
+        self.fs = fs
+        self.window_duration = window_duration
+        self.window_step = window_step
+        self.max_n_windows = max_n_windows
+        self.csd_params = csd_params
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.window_samp = int(fs * window_duration)
+        self.onsets = get_window_onsets(
+            self.X.shape[1],
+            fs,
+            window_duration,
+            window_step=window_step,
+            max_n_windows=max_n_windows,
+        )
+        self._chunks = {}
+        self.nan_mask = None
+        if isinstance(mask, IntervalMask):
+            assert mask.n_samples == self.X.shape[1], "Mask doesn't match the LFPs!"
+            window_mask = mask.get_window_mask(self.onsets, self.window_samp, self.rois)
+            self.nan_mask = np.any(window_mask, axis=0)  # [n_window]
+        elif mask is not None:
+            window_mask = np.asarray(mask, dtype=bool)
+            if window_mask.ndim == 2:
+                assert len(window_mask) == len(self.rois), "Mask doesn't match ROIs!"
+                window_mask = np.any(window_mask, axis=0)
+            assert window_mask.shape == (
+                self.n_windows,
+            ), f"Mask doesn't match the windows: {window_mask.shape}"
+            self.nan_mask = window_mask  # [n_window]
+
+    @property
+    def n_windows(self):
+        """Number of windows"""
+        return len(self.onsets)
+
+    @property
+    def freq(self):
+        """One-sided frequencies of the segment FFTs"""
+        _, nfft = get_n_segments(self.window_samp, self.csd_params)
+        return sp_fft.rfftfreq(nfft, 1 / self.fs)
+
+    def get_freq_idx(self, min_freq, max_freq):
+        """Return the frequency bin indices ``i1, i2`` of the band."""
+        return np.searchsorted(self.freq, [min_freq, max_freq])
+
+    def check_params(
+        self,
+        fs=None,
+        window_duration=None,
+        window_step=None,
+        max_n_windows=None,
+        csd_params={},
+        dtype=np.float64,
+    ):
+        """
+        Make sure the given windowing parameters match the cached ones.
+
+        Raises
+        ------
+        * AssertionError if any of the parameters don't match.
+        """
+        csd_params = {**DEFAULT_CSD_PARAMS, **csd_params}
+        assert fs == self.fs, f"Samplerate doesn't match: {fs} != {self.fs}"
+        assert (
+            window_duration == self.window_duration
+        ), f"Window duration doesn't match: {window_duration} != {self.window_duration}"
+        assert (
+            window_step == self.window_step
+        ), f"Window step doesn't match: {window_step} != {self.window_step}"
+        assert (
+            max_n_windows == self.max_n_windows
+        ), f"max_n_windows doesn't match: {max_n_windows} != {self.max_n_windows}"
+        assert (
+            csd_params == self.csd_params
+        ), f"csd_params don't match: {csd_params} != {self.csd_params}"
+        assert (
+            np.dtype(dtype) == self.dtype
+        ), f"dtype doesn't match: {np.dtype(dtype)} != {self.dtype}"
+
+    def iter_chunks(self):
+        """
+        Iterate over chunks of windows.
+
+        Yields
+        ------
+        k1 : int
+            Index of the first window in the chunk
+        k2 : int
+            One plus the index of the last window in the chunk
+        chunk : SegmentFFT
+            Segment FFTs of the windows in the chunk
+        """
+        if self.n_windows == 0:
+            return
+        view = get_window_view(self.X, self.window_samp)  # [t',r,t]
+        for k1 in range(0, self.n_windows, self.chunk_size):
+            k2 = min(k1 + self.chunk_size, self.n_windows)
+            if k1 in self._chunks:
+                yield k1, k2, self._chunks[k1]
+                continue
+            nan_mask = None if self.nan_mask is None else self.nan_mask[k1:k2]
+            chunk = SegmentFFT(
+                view[self.onsets[k1:k2]], self.fs, self.csd_params, nan_mask=nan_mask
+            )
+            if self.cache:
+                self._chunks[k1] = chunk
+            yield k1, k2, chunk
+
+    def clear(self):
+        """Free the cached FFTs."""
+        self._chunks = {}
+
+
+class SegmentFFT:
+    """
+    One-sided FFTs of every segment of a chunk of windows.
+
+    Windows containing NaNs are replaced with white noise before the FFTs are taken.
+    They are marked in ``nan_mask`` so that features can be set to NaN afterwards.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Windowed LFPs. This is modified in place.
+        Shape: ``[n_window, n_roi, n_samples]``
+    fs : float
+        Samplerate
+    csd_params : dict
+        Parameters sent to ``scipy.signal.csd``
+    nan_mask : None or numpy.ndarray, optional
+        Which windows contain NaNs. If ``None``, this is found by scanning ``X``.
+        Shape: ``[n_window]``
+
+    Attributes
+    ----------
+    freq : numpy.ndarray
+        One-sided frequencies
+        Shape: ``[n_freq]``
+    fft : numpy.ndarray
+        Segment FFTs
+        Shape: ``[n_window, n_roi, n_segment, n_freq]``
+    nan_mask : numpy.ndarray
+        Which windows contain NaNs
+        Shape: ``[n_window]``
+    """
+
+    def __init__(self, X, fs, csd_params, nan_mask=None):
+        assert X.ndim == 3, f"len({X.shape}) != 3"
+        if nan_mask is None:
+            nan_mask = np.sum(np.isnan(X), axis=(1, 2)) != 0
+        assert nan_mask.shape == X.shape[:1], f"{nan_mask.shape} != {X.shape[:1]}"
+        self.nan_mask = nan_mask
+        X[self.nan_mask] = np.random.randn(*X[self.nan_mask].shape)
+        self.fs = fs
+        self.dtype = X.dtype
+        self.scaling = csd_params.get("scaling", "density")
+        fft_params = {k: v for k, v in csd_params.items() if k != "return_onesided"}
+        self.freq, self.fft, self.win, self.nfft = get_segment_ffts(
+            X, fs, csd_params=fft_params
+        )
+
+    def get_freq_idx(self, min_freq, max_freq):
+        """Return the frequency bin indices ``i1, i2`` of the band."""
+        return np.searchsorted(self.freq, [min_freq, max_freq])
+
+    def get_cpsd(self, i1, i2, full=False):
+        """
+        Get the one-sided cross power spectral density in frequency bins ``i1:i2``.
+
+        Parameters
+        ----------
+        i1 : int
+            First frequency bin
+        i2 : int
+            One plus the last frequency bin
+        full : bool, optional
+            Whether to return the full Hermitian CPSD instead of its lower triangle.
+
+        Returns
+        -------
+        cpsd : numpy.ndarray
+            Complex CPSD, ``<conj(F_i) F_j>``
+            Shape: ``[n_window, n_roi*(n_roi+1)//2, n_freq]`` or
+            ``[n_window, n_roi, n_roi, n_freq]`` if ``full``
+        """
+        scale = get_cpsd_scale(self.win, self.fs, self.nfft, scaling=self.scaling)
+        return get_cross_products(self.fft[..., i1:i2], scale[i1:i2], full=full)
+
+    def get_two_sided_cpsd(self):
+        """
+        Get the two-sided cross power spectral density used for directed measures.
+
+        Returns
+        -------
+        f : numpy.ndarray
+            Two-sided frequencies, ordered like ``scipy.fft.fftfreq``
+            Shape: ``[n_freq]``
+        cpsd : numpy.ndarray
+            Complex CPSD with ``'spectrum'`` scaling, ``<conj(F_j) F_i>``
+            Shape: ``[n_window, n_freq, n_roi, n_roi]``
+        """
+        return get_two_sided_cpsd(self.fft, self.win, self.nfft, self.fs)
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
@@ -0,0 +1,153 @@
+"""
+Split stacked LFPs into (possibly overlapping) windows without copying them.
+
+"""
+__date__ = "October 2026"
+
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+EPSILON = 1e-6
+DEFAULT_CHUNK_SIZE = 128
+"""Default number of windows processed at once"""
+SUPPORTED_DTYPES = [np.dtype(np.float64), np.dtype(np.float32)]
+"""Precisions that spectral features can be computed in"""
+
+
+def stack_lfps(lfps):
+    """
+    Stack the LFPs into a single array, sorted by ROI name.
+
+    Parameters
+    ----------
+    lfps : dict
+        Maps region names to LFP waveforms.
+
+    Returns
+    -------
+    rois : list of str
+        Sorted ROI names
+    X : numpy.ndarray
+        Stacked LFPs
+        Shape: ``[n_roi, n_samples]``
+    """
+    rois = sorted(lfps.keys())
+    assert len(rois) >= 1, f"{len(rois)} < 1"
+    X = np.vstack([lfps[roi].flatten() for roi in rois])
+    return rois, X
+
+
+def get_window_onsets(
+    n_samples, fs, window_duration, window_step=None, max_n_windows=None
+):
+    """
+    Get the onset of each window, in samples.
+
+    Parameters
+    ----------
+    n_samples : int
+        Number of LFP samples
+    fs : int
+        LFP samplerate
+    window_duration : float
+        Window duration, in seconds
+    window_step : None or float, optional
+        Time between consecutive window onsets, in seconds. If ``None``, this is
+        set to ``window_duration``.
+    max_n_windows : None or int, optional
+        Maximum number of windows
+
+    Returns
+    -------
+    onsets : numpy.ndarray
+        Window onsets, in samples. This is empty if the LFPs are shorter than a
+        window.
+        Shape: ``[n_window]``
+    """
+    assert (
+        window_step is None or window_step > 0.0
+    ), f"Nonpositive window step: {window_step}"
+    assert max_n_windows is None or max_n_windows > 0
+    duration = n_samples / fs
+    window_samp = int(fs * window_duration)
+    if window_step is None:
+        # No window overlap: tile the recording.
+        onsets = window_samp * np.arange(n_samples // window_samp)
+    else:
+        onsets = np.arange(
+            0.0,
+            duration - window_duration + EPSILON,
+            window_step,
+        )
+        onsets = np.array([int(fs * onset) for onset in onsets], dtype=int)
+    if max_n_windows is not None:
+        onsets = onsets[:max_n_windows]
+    return onsets
+
+
+def get_window_view(X, window_samp):
+    """
+    Return a read-only strided view of every length-``window_samp`` window of ``X``.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Stacked LFPs
+        Shape: ``[n_roi, n_samples]``
+    window_samp : int
+        Window length, in samples
+
+    Returns
+    -------
+    view : numpy.ndarray
+        Windows indexed by onset sample. No data is copied.
+        Shape: ``[n_samples - window_samp + 1, n_roi, window_samp]``
+    """
+    assert X.ndim == 2, f"len({X.shape}) != 2"
+    view = sliding_window_view(X, window_samp, axis=1)  # [r,t',t]
+    return view.transpose(1, 0, 2)  # [t',r,t]
+
+
+def iter_window_chunks(X, onsets, window_samp, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterate over windows of ``X`` in chunks.
+
+    Only one chunk of windows is copied into memory at a time.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Stacked LFPs
+        Shape: ``[n_roi, n_samples]``
+    onsets : numpy.ndarray
+        Window onsets, in samples
+        Shape: ``[n_window]``
+    window_samp : int
+        Window length, in samples
+    chunk_size : int, optional
+        Maximum number of windows in each chunk
+
+    Yields
+    ------
+    k1 : int
+        Index of the first window in the chunk
+    k2 : int
+        One plus the index of the last window in the chunk
+    chunk : numpy.ndarray
+        A writeable copy of the windows in the chunk
+        Shape: ``[k2-k1, n_roi, window_samp]``
+    """
+    assert chunk_size >= 1, f"Invalid chunk size: {chunk_size}"
+    view = get_window_view(X, window_samp)  # [t',r,t]
+    for k1 in range(0, len(onsets), chunk_size):
+        k2 = min(k1 + chunk_size, len(onsets))
+        yield k1, k2, view[onsets[k1:k2]]  # fancy indexing copies the chunk
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
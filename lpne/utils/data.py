@@ -2,8 +2,9 @@
 Data utilities
 
 """
-__date__ = "July 2021 - June 2023"
+__date__ = "July 2021 - October 2026"
 __all__ = [
+    "get_lfp_channels",
     "load_channel_map",
     "load_features",
     "load_features_and_labels",
@@ -14,6 +15,7 @@ __all__ = [
 ]
 
 
+from concurrent.futures import ThreadPoolExecutor
 import h5py
 import numpy as np
 import os
@@ -23,13 +25,46 @@ try:
     import pandas as pd
 except ModuleNotFoundError:
     PANDAS_INSTALLED = False
-from scipy.io import loadmat
+from scipy.io import loadmat, whosmat
 import warnings
 
 
+from .feature_index import _get_feature_info
+from .feature_store import FEATURE_STORE_EXT, FeatureStore
+from .lfp_cache import get_lfp_cache_dir, load_cached_lfps
 from .. import MATLAB_IGNORED_KEYS
 
 
+def get_lfp_channels(fn):
+    """
+    Return the names of the channels in an LFP file without reading any samples.
+
+    Raises
+    ------
+    * NotImplementedError if ``fn`` is an unsupported file type.
+
+    Parameters
+    ----------
+    fn : str
+        File containing LFP data. Supported file types: {'.mat'}
+
+    Returns
+    -------
+    channels : list of str
+        Sorted channel names
+    """
+    assert isinstance(fn, str)
+    if not fn.endswith(".mat"):
+        raise NotImplementedError(f"Cannot load file: {fn}")
+    try:
+        channels = [name for name, _, _ in whosmat(fn)]
+    except NotImplementedError:
+        # This must be one of the older HDF5 mat files.
+        with h5py.File(fn, "r") as f:
+            channels = list(f.keys())
+    return sorted(c for c in channels if c not in MATLAB_IGNORED_KEYS)
+
+
 def load_channel_map(fn):
     """
     Load the channel map from the file.
@@ -64,18 +99,26 @@ def load_channel_map(fn):
         raise NotImplementedError(f"Cannot load the channel map file: {fn}")
 
 
-def load_features(fns, return_counts=False, feature="power", return_freqs=False):
+def load_features(
+    fns, return_counts=False, feature="power", return_freqs=False, mmap=False
+):
     """
     Load the features saved in the given filenames.
 
+    Only the requested feature is read from feature stores (``'.lpne'``
+    directories). See ``lpne.FeatureStore``.
+
     Parameters
     ----------
     fns : str or list of str
-        Where the data is saved. Supported file types: {'.npy'}
+        Where the data is saved. Supported file types: {'.npy', '.lpne'}
     return_counts : bool, optional
         Return the number of windows for each file.
     feature : str, optional
         Which feature in {"power","dir_spec"} to load.
+    mmap : bool, optional
+        Whether to return a read-only memory map of the features instead of reading
+        them into memory. This requires a single feature store.
 
     Returns
     -------
@@ -94,13 +137,13 @@ def load_features(fns, return_counts=False, feature="power", return_freqs=False)
     if isinstance(fns, str):
         fns = [fns]
     assert isinstance(fns, list)
+    assert not mmap or (
+        len(fns) == 1 and fns[0].endswith(FEATURE_STORE_EXT)
+    ), f"Only a single feature store can be memory-mapped: {fns}"
     features, counts = [], []
     prev_rois, prev_freqs = None, None
     for fn in fns:
-        assert fn.endswith(".npy"), f"Unsupported file type: {fn}"
-        temp = np.load(fn, allow_pickle=True).item()
-        rois = temp["rois"]
-        freqs = temp["freq"]
+        feature_arr, rois, freqs = _load_feature_file(fn, feature, mmap=mmap)
         if prev_rois is not None:
             assert prev_rois == rois, f"Inconsitent ROIs: {rois} != {prev_rois}"
         if prev_freqs is not None:
@@ -109,9 +152,9 @@ def load_features(fns, return_counts=False, feature="power", return_freqs=False)
             ), f"Inconsitent frequencies: {freqs} != {prev_freqs}"
         prev_rois = rois
         prev_freqs = freqs
-        features.append(temp[feature])
+        features.append(feature_arr)
         counts.append(len(features[-1]))
-    features = np.concatenate(features, axis=0)
+    features = features[0] if mmap else np.concatenate(features, axis=0)
     res = (features, rois)
     if return_counts:
         res += (counts,)
@@ -120,6 +163,33 @@ def load_features(fns, return_counts=False, feature="power", return_freqs=False)
     return res
 
 
+def _load_feature_file(fn, feature, mmap=False):
+    """
+    Load a single feature from a feature file.
+
+    ``mmap`` is ignored for ``'.npy'`` files, which are always read into memory.
+
+    Raises
+    ------
+    * NotImplementedError if ``fn`` is an unsupported file type.
+
+    Returns
+    -------
+    features : numpy.ndarray
+    rois : list of str
+    freqs : numpy.ndarray
+    """
+    if fn.endswith(FEATURE_STORE_EXT):
+        store = FeatureStore(fn)
+        assert len(store.keys()) > 0, f"No features in {fn}"
+        metadata = store.metadata
+        return store.load(feature, mmap=mmap), metadata["rois"], metadata["freq"]
+    if fn.endswith(".npy"):
+        temp = np.load(fn, allow_pickle=True).item()
+        return temp[feature], temp["rois"], temp["freq"]
+    raise NotImplementedError(f"Unsupported file type: {fn}")
+
+
 def load_features_and_labels(
     feature_fns,
     label_fns,
@@ -128,12 +198,24 @@ def load_features_and_labels(
     return_counts=False,
     soft_labels=False,
     return_freqs=False,
+    n_threads=None,
+    out_fn=None,
+    use_index=True,
+    write_index=False,
 ):
     """
     Load the features and labels.
 
     If ``group_func`` or ``group_map`` is specified, then groups are also returned.
 
+    The feature files are checked for consistency and their windows are counted
+    from the metadata of each feature store, or from the index in each feature
+    directory (see ``lpne.get_feature_info``). ``'.npy'`` files that aren't indexed
+    have to be read entirely to be checked, so their features are kept until they're
+    copied instead of being read twice. Then the features array is allocated once
+    and filled in place, with label and feature files read concurrently on a thread
+    pool.
+
     Parameters
     ----------
     feature_fns : list of str
@@ -153,6 +235,18 @@ def load_features_and_labels(
         If labels are given as probabilities, don't perform an argmax operation.
     return_freqs : bool, optional
         Whether to return the frequencies associated with the features
+    n_threads : None or int, optional
+        Number of threads used to read files. If ``None``, this is the default of
+        ``concurrent.futures.ThreadPoolExecutor``.
+    out_fn : None or str, optional
+        If given, the features are written to a memory-mapped ``'.npy'`` file with
+        this name instead of being held in memory.
+    use_index : bool, optional
+        Whether to read the index in each feature directory. See
+        ``lpne.get_feature_info``.
+    write_index : bool, optional
+        Whether to write the updated index to each feature directory. See
+        ``lpne.get_feature_info``.
 
     Returns
     -------
@@ -192,42 +286,68 @@ def load_features_and_labels(
                     return group_map[key]
             raise NotImplementedError(fn)
 
-    # Collect everything.
-    features, labels, groups, counts = [], [], [], []
-    prev_rois, prev_freqs = None, None
-    for i, (feature_fn, label_fn) in enumerate(zip(feature_fns, label_fns)):
-        power, rois, freqs = load_features(feature_fn, return_freqs=True)
-        if prev_rois is not None:
-            assert prev_rois == rois, (
-                f"Inconsitent ROIs: {prev_rois} != {rois}"
-                f"\n\tFile 1: {feature_fns[i-1]}"
-                f"\n\tFile 2: {feature_fns[i]}"
-            )
-        prev_rois = rois
-        if prev_freqs is not None:
-            assert np.allclose(freqs, prev_freqs), (
-                f"Inconsistent frequencies: {prev_freqs} != {freqs}"
-                f"\n\tFile 1: {feature_fns[i-1]}"
-                f"\n\tFile 2: {feature_fns[i]}"
-            )
-        prev_freqs = freqs
-        features.append(power)
-        counts.append(len(power))
-        labels.append(load_labels(label_fn))
-        assert len(power) == len(labels[-1]), (
-            f"Number of windows doesn't match for feature and label file!"
-            f"\n\tFeatures: {feature_fn} (len({power.shape}))"
-            f"\n\tLabels: {label_fn} ({len(labels[-1])})"
+    # Check the files and count their windows, reading as few features as possible.
+    info, loaded_power = _get_feature_info(
+        list(feature_fns), n_threads, use_index, write_index
+    )
+    for i in range(1, len(info)):
+        assert info[i - 1]["rois"] == info[i]["rois"], (
+            f"Inconsitent ROIs: {info[i - 1]['rois']} != {info[i]['rois']}"
+            f"\n\tFile 1: {feature_fns[i-1]}"
+            f"\n\tFile 2: {feature_fns[i]}"
+        )
+        assert len(info[i]["freq"]) == len(info[i - 1]["freq"]) and np.allclose(
+            info[i]["freq"], info[i - 1]["freq"]
+        ), (
+            f"Inconsistent frequencies: {info[i - 1]['freq']} != {info[i]['freq']}"
+            f"\n\tFile 1: {feature_fns[i-1]}"
+            f"\n\tFile 2: {feature_fns[i]}"
         )
-        if group_func is not None:
-            groups.append([group_func(feature_fn)] * len(labels[-1]))
+    rois, freqs = info[0]["rois"], info[0]["freq"]
+    counts = [file_info["n_windows"] for file_info in info]
+    offsets = np.cumsum([0] + counts)
+
+    # Preallocate the features with a type that can hold every file's features.
+    shape = (offsets[-1],) + info[0]["shape"]
+    dtype = np.result_type(*[file_info["dtype"] for file_info in info])
+    if out_fn is None:
+        features = np.empty(shape, dtype=dtype)
+    else:
+        features = np.lib.format.open_memmap(
+            out_fn, mode="w+", dtype=dtype, shape=shape
+        )
+
+    # Read the labels and fill in the features one file at a time.
+    def fill_features(i):
+        power = loaded_power[i]
+        if power is None:
+            power = _load_feature_file(feature_fns[i], "power", mmap=True)[0]
+        loaded_power[i] = None  # free the features once they're copied
+        assert len(power) == counts[i], f"{feature_fns[i]} changed while loading!"
+        features[offsets[i] : offsets[i + 1]] = power
+
+    with ThreadPoolExecutor(n_threads) as executor:
+        label_futures = [executor.submit(load_labels, fn) for fn in label_fns]
+        feature_futures = [
+            executor.submit(fill_features, i) for i in range(len(feature_fns))
+        ]
+        labels = [future.result() for future in label_futures]
+        for i in range(len(labels)):
+            assert len(labels[i]) == counts[i], (
+                f"Number of windows doesn't match for feature and label file!"
+                f"\n\tFeatures: {feature_fns[i]} ({counts[i]})"
+                f"\n\tLabels: {label_fns[i]} ({len(labels[i])})"
+            )
+        for future in feature_futures:
+            future.result()
+
     # Concatenate and return.
-    features = np.concatenate(features, axis=0)
     labels = np.concatenate(labels, axis=0)
     if labels.ndim == 2 and not soft_labels:
         labels = np.argmax(labels, axis=1)
     res = (features, labels, rois)
     if group_func is not None:
+        groups = [[group_func(fn)] * count for fn, count in zip(feature_fns, counts)]
         groups = np.concatenate(groups, axis=0)
         res += (groups,)
     if return_counts:
@@ -276,14 +396,37 @@ def load_labels(fns, soft_labels=False):
     return np.concatenate(res, axis=0)
 
 
-def load_lfps(fn):
+def load_lfps(fn, channels=None, t_start=None, t_stop=None, cache_dir=None):
     """
     Load LFPs from the given filename.
 
+    Only the requested channels are read. For HDF5-based (v7.3) mat files, only the
+    requested samples are read as well.
+
+    If a cache directory is given, or set in the ``LPNE_LFP_CACHE`` environment
+    variable, the file is converted once into a memory-mappable float32 binary and
+    later loads are read from the converted file. The conversion is redone when the
+    contents of the file change. See ``lpne.utils.lfp_cache``.
+
+    Raises
+    ------
+    * UserWarning if any of the requested channels aren't in the file.
+
     Parameters
     ----------
     fn : str
         File containing LFP data. Supported file types: {'.mat'}
+    channels : None or list of str, optional
+        Channels to load. If ``None``, every channel is loaded.
+    t_start : None or int, optional
+        First sample to load. If ``None``, this is the start of the recording.
+    t_stop : None or int, optional
+        One plus the last sample to load. If ``None``, this is the end of the
+        recording.
+    cache_dir : None, bool, or str, optional
+        Directory of converted LFP files. If ``None``, the ``LPNE_LFP_CACHE``
+        environment variable is used, if it's set. If ``False``, the cache isn't
+        used.
 
     Returns
     -------
@@ -291,28 +434,80 @@ def load_lfps(fn):
         Maps ROI names to LFP waveforms.
     """
     assert isinstance(fn, str)
-    if fn.endswith(".mat"):
-        try:
-            lfps = loadmat(fn)
-        except NotImplementedError:
-            # This must be one of the older HDF5 mat files.
-            lfps = dict(h5py.File(fn, "r"))
-    else:
+    assert channels is None or isinstance(channels, (list, tuple))
+    if not fn.endswith(".mat"):
         raise NotImplementedError(f"Cannot load file: {fn}")
+    samples = slice(t_start, t_stop)
+    lfps = None
+    cache_dir = get_lfp_cache_dir(cache_dir)
+    if cache_dir is not None:
+        lfps = load_cached_lfps(
+            fn, cache_dir, _load_mat_lfps, channels=channels, samples=samples
+        )
+    if lfps is None:
+        lfps = _load_mat_lfps(fn, channels=channels, samples=samples)
+    if channels is not None:
+        missing = [channel for channel in channels if channel not in lfps]
+        if len(missing) > 0:
+            warnings.warn(f"Channels not found in {fn}: {missing}")
+    return lfps
+
+
+def _load_mat_lfps(fn, channels=None, samples=slice(None)):
+    """Read LFPs from a mat file. See ``load_lfps``."""
+    try:
+        lfps = loadmat(fn, variable_names=channels)
+    except NotImplementedError:
+        # This must be one of the older HDF5 mat files.
+        lfps = _load_hdf5_lfps(fn, channels, samples)
+        samples = slice(None)
     # Make sure all the channels are 1D float arrays.
     for channel in list(lfps.keys()):
         if channel in MATLAB_IGNORED_KEYS:
             del lfps[channel]
             continue
         try:
-            lfps[channel] = np.array(lfps[channel]).astype(np.float32).flatten()
+            lfp = np.array(lfps[channel]).flatten()[samples]
+            lfps[channel] = lfp.astype(np.float32)
         except (ValueError, TypeError):
             warnings.warn(f"Unable to read channel: {channel}")
             del lfps[channel]
     return lfps
 
 
-def save_features(features, fn):
+def _load_hdf5_lfps(fn, channels, samples):
+    """
+    Read the given channels and samples from an HDF5-based mat file.
+
+    Matlab stores vectors as ``[1,n]`` or ``[n,1]`` datasets, so the samples are
+    read as a hyperslab along the longer axis. Other datasets are read entirely.
+
+    Returns
+    -------
+    lfps : dict
+        Maps channel names to LFP waveforms.
+    """
+    lfps = {}
+    with h5py.File(fn, "r") as f:
+        if channels is None:
+            channels = list(f.keys())
+        for channel in channels:
+            if channel not in f:
+                continue
+            dset = f[channel]
+            if not isinstance(dset, h5py.Dataset):
+                warnings.warn(f"Unable to read channel: {channel}")
+            elif dset.ndim == 1:
+                lfps[channel] = dset[samples]
+            elif dset.ndim == 2 and 1 in dset.shape:
+                idx = (0, samples) if dset.shape[0] == 1 else (samples, 0)
+                lfps[channel] = dset[idx]
+            else:
+                lfps[channel] = np.array(dset).flatten()[samples]
+    return lfps
+
+
+def save_features(features, fn, compression=None, quantization=None):
     """
     Save the features to the given filename.
 
@@ -325,10 +520,26 @@ def save_features(features, fn):
     features : dict
         Maps fields to data
     fn : str
-        Where to save the data. Supported file types: {'.npy'}
+        Where to save the data. Supported file types: {'.npy', '.lpne'}. Feature
+        stores (``'.lpne'``) keep each feature in a separate raw binary file, so a
+        single feature can be loaded or memory-mapped without reading the others.
+        See ``lpne.FeatureStore``.
+    compression : {None, ``'zlib'``, ``'lz4'``, ``'zstd'``}, optional
+        Compress the features in chunks of windows. This requires a feature store.
+    quantization : {None, ``'float16'``, ``'int8'``, ``'uint16'``}, optional
+        Quantize the floating point features. Quantized features are dequantized to
+        ``numpy.float32`` when they're loaded. This requires a feature store. See
+        ``lpne.FeatureStore``.
     """
     assert isinstance(fn, str)
-    if fn.endswith(".npy"):
+    assert (compression is None and quantization is None) or fn.endswith(
+        FEATURE_STORE_EXT
+    ), f"Only feature stores can be compressed or quantized: {fn}"
+    if fn.endswith(FEATURE_STORE_EXT):
+        store = FeatureStore(fn, compression=compression, quantization=quantization)
+        store.clear()
+        store.append(features)
+    elif fn.endswith(".npy"):
         np.save(fn, features)
     else:
         raise NotImplementedError(f"Unsupported file type: {fn}")
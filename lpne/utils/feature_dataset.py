@@ -0,0 +1,288 @@
+"""
+Lazily load features from disk for model training
+
+"""
+__date__ = "October 2026"
+__all__ = ["FeatureDataset"]
+
+
+from queue import Queue
+import numpy as np
+from threading import Event, Thread
+import torch
+
+from .data import _load_feature_file
+
+
+DEFAULT_PREFETCH = 2
+"""Default number of batches read ahead by the background thread"""
+
+
+class FeatureDataset:
+    """
+    Windows of features read lazily from feature files.
+
+    Feature stores (``'.lpne'`` directories, see ``lpne.FeatureStore``) are
+    memory-mapped, so only the windows that are indexed are read from disk. Pickled
+    ``'.npy'`` feature files are read into memory when the dataset is made.
+
+    A ``FeatureDataset`` can be passed in place of a feature array to
+    ``BaseModel.fit``, ``DcsfaNmf.fit``, and ``GridSearchCV.fit``. Indexing it like a
+    NumPy array reads the windows into memory. ``subset`` makes a lazy view of some
+    of the windows instead, e.g. a cross validation fold.
+
+    Parameters
+    ----------
+    fns : str or list of str
+        Feature filenames. Supported file types: {'.npy', '.lpne'}
+    feature : str, optional
+        Which feature in {"power","dir_spec"} to load.
+    transform : None or function, optional
+        Applied to every batch of windows after it's read, e.g.
+        ``lpne.unsqueeze_triangular_array`` for power features.
+    prefetch : int, optional
+        Number of batches read ahead by a background thread in ``iter_batches``.
+
+    Attributes
+    ----------
+    rois : list of str
+        ROI names
+    freq : numpy.ndarray
+        Feature frequencies
+    """
+
+    def __init__(self, fns, feature="power", transform=None, prefetch=DEFAULT_PREFETCH):
+        assert feature in ["power", "dir_spec"], f"Unsupported feature: {feature}"
+        assert prefetch >= 0, f"Invalid prefetch: {prefetch}"
+        if isinstance(fns, str):
+            fns = [fns]
+        assert isinstance(fns, list) and len(fns) > 0
+        self.fns = fns
+        self.feature = feature
+        self.transform = transform
+        self.prefetch = prefetch
+        self._arrays = []
+        for fn in fns:
+            arr, rois, freq = _load_feature_file(fn, feature, mmap=True)
+            if len(self._arrays) > 0:
+                assert rois == self.rois, f"Inconsistent ROIs: {rois} != {self.rois}"
+                assert np.allclose(
+                    freq, self.freq
+                ), f"Inconsistent frequencies: {freq} != {self.freq}"
+            self._arrays.append(arr)
+            self.rois, self.freq = rois, freq
+        self._offsets = np.cumsum([0] + [len(arr) for arr in self._arrays])
+        self._indices = np.arange(self._offsets[-1])
+        self._window_shape = self[:1].shape[1:]
+
+    def __len__(self):
+        return len(self._indices)
+
+    @property
+    def shape(self):
+        """Shape of the transformed features"""
+        return (len(self),) + self._window_shape
+
+    @property
+    def ndim(self):
+        """Number of dimensions of the transformed features"""
+        return len(self.shape)
+
+    def __getitem__(self, idx):
+        """Read the indexed windows into memory and transform them."""
+        indices = self._indices[idx]
+        if np.ndim(indices) == 0:
+            return self._read(indices.reshape(1))[0]
+        return self._read(indices)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[:]
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+    def subset(self, idx):
+        """
+        Make a lazy view of some of the windows.
+
+        Parameters
+        ----------
+        idx : slice or numpy.ndarray
+            Window indices or a boolean mask
+
+        Returns
+        -------
+        dataset : FeatureDataset
+        """
+        res = object.__new__(FeatureDataset)
+        res.__dict__.update(self.__dict__)
+        res._indices = self._indices[idx]
+        return res
+
+    def iter_batches(self, batch_size, order=None):
+        """
+        Iterate over batches of windows.
+
+        Batches are read by a background thread, ``prefetch`` batches ahead.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of windows in each batch
+        order : None or numpy.ndarray, optional
+            Window indices in the order they should be visited, possibly with
+            repeats. Defaults to every window in order.
+
+        Yields
+        ------
+        idx : numpy.ndarray
+            Indices of the windows in the batch
+            Shape: ``[b]``
+        batch : numpy.ndarray
+            Transformed windows
+            Shape: ``[b,...]``
+        """
+        assert batch_size >= 1, f"Invalid batch size: {batch_size}"
+        if order is None:
+            order = np.arange(len(self))
+        batch_idx = [
+            order[i : i + batch_size] for i in range(0, len(order), batch_size)
+        ]
+        if self.prefetch == 0:
+            for idx in batch_idx:
+                yield idx, self[idx]
+            return
+        queue, stop = Queue(maxsize=self.prefetch), Event()
+
+        def read_batches():
+            try:
+                for idx in batch_idx:
+                    if stop.is_set():
+                        return
+                    queue.put((idx, self[idx]))
+            except Exception as e:
+                queue.put(e)
+            queue.put(None)
+
+        thread = Thread(target=read_batches, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Unblock and stop the reader if iteration ended early.
+            stop.set()
+            while thread.is_alive():
+                while not queue.empty():
+                    queue.get()
+                thread.join(timeout=0.01)
+
+    def get_nan_mask(self, batch_size=1024):
+        """
+        Find the windows that contain NaNs.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of windows read at once
+
+        Returns
+        -------
+        nan_mask : numpy.ndarray
+            Shape: ``[n_windows]``
+        """
+        nan_mask = np.zeros(len(self), dtype=bool)
+        for idx, batch in self.iter_batches(batch_size):
+            axes = tuple(range(1, batch.ndim))
+            nan_mask[idx] = np.isnan(batch).sum(axis=axes) != 0
+        return nan_mask
+
+    def _read(self, indices):
+        """Read the windows with the given global indices."""
+        # Read each file in sorted order, then restore the requested order.
+        perm = np.argsort(indices, kind="stable")
+        sorted_indices = indices[perm]
+        file_nums = np.searchsorted(self._offsets, sorted_indices, side="right") - 1
+        parts = []
+        for file_num in np.unique(file_nums):
+            local = sorted_indices[file_nums == file_num] - self._offsets[file_num]
+            parts.append(np.asarray(self._arrays[file_num][local]))
+        if len(parts) == 0:
+            shape = (0,) + self._arrays[0].shape[1:]
+            res = np.empty(shape, dtype=self._arrays[0].dtype)
+        else:
+            res = np.concatenate(parts, axis=0)
+        res[perm] = res.copy()
+        if self.transform is not None:
+            res = self.transform(res)
+        return res
+
+
+class FeatureLoader:
+    """
+    Batches of lazily loaded features along with in-memory tensors.
+
+    This plays the role of a ``torch.utils.data.DataLoader`` over a
+    ``TensorDataset`` for models trained on a ``FeatureDataset``.
+
+    Parameters
+    ----------
+    features : FeatureDataset
+        Features
+    tensors : list of torch.Tensor
+        Other per-window tensors, e.g. labels
+    batch_size : int
+        Number of windows in each batch
+    sampler : None or torch.utils.data.Sampler, optional
+        Window indices to visit in each epoch. If ``None``, the windows are shuffled.
+    dtype : torch.dtype, optional
+        Type of the feature tensors
+    device : str, optional
+        Pytorch device of the feature tensors
+    """
+
+    def __init__(
+        self,
+        features,
+        tensors,
+        batch_size,
+        sampler=None,
+        dtype=torch.float32,
+        device="cpu",
+    ):
+        assert isinstance(features, FeatureDataset)
+        for tensor in tensors:
+            assert len(tensor) == len(features), f"{len(tensor)} != {len(features)}"
+        self.features = features
+        self.tensors = tensors
+        self.batch_size = batch_size
+        self.sampler = sampler
+        self.dtype = dtype
+        self.device = device
+
+    def __len__(self):
+        n = len(self.features) if self.sampler is None else len(self.sampler)
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.sampler is None:
+            order = torch.randperm(len(self.features)).numpy()
+        else:
+            order = np.array(list(self.sampler), dtype=int)
+        for idx, batch in self.features.iter_batches(self.batch_size, order=order):
+            # Dequantized float32 batches are used without another copy.
+            batch = torch.as_tensor(batch, dtype=self.dtype).to(self.device)
+            idx = torch.as_tensor(idx)
+            yield (batch,) + tuple(
+                tensor[idx.to(tensor.device)] for tensor in self.tensors
+            )
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
@@ -0,0 +1,196 @@
+"""
+An index of the feature files in each feature directory
+
+Checking that feature files are consistent and counting their windows used to mean
+reading every feature file. Instead, a feature directory can keep a small JSON file,
+``.lpne_feature_index.json``, that maps feature filenames to their size,
+modification time, number of windows, ROIs, frequencies, and power feature shape and
+type. Indexed files are only read again when their size or modification time
+changes. The index is only written when it's requested, so reading features doesn't
+change the feature directory by default.
+
+"""
+__date__ = "October 2026"
+__all__ = ["get_feature_info"]
+
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import os
+import warnings
+
+from .feature_store import FEATURE_STORE_EXT, METADATA_FN, FeatureStore
+
+
+FEATURE_INDEX_FN = ".lpne_feature_index.json"
+"""Name of the index saved in each feature directory"""
+
+
+def get_feature_info(fns, n_threads=None, use_index=True, write_index=False):
+    """
+    Describe feature files without reading their features.
+
+    Files that aren't in the index or have changed since they were indexed are read
+    concurrently on a thread pool. If ``write_index`` is ``True``, they're also added
+    to the index.
+
+    Parameters
+    ----------
+    fns : str or list of str
+        Feature filenames. Supported file types: {'.npy', '.lpne'}
+    n_threads : None or int, optional
+        Number of threads used to read unindexed files. If ``None``, this is the
+        default of ``concurrent.futures.ThreadPoolExecutor``.
+    use_index : bool, optional
+        Whether to read the index in each feature directory. If ``False``, every
+        file is read.
+    write_index : bool, optional
+        Whether to write the updated index to each feature directory. A warning is
+        raised if a directory isn't writable.
+
+    Returns
+    -------
+    info : list of dict
+        Describes each file. Keys:
+        'n_windows' : int
+            Number of windows
+        'rois' : list of str
+            ROI names
+        'freq' : numpy.ndarray
+            Feature frequencies
+        'shape' : tuple of int
+            Shape of a single window of power features
+        'dtype' : str
+            Type of the power features
+    """
+    if isinstance(fns, str):
+        fns = [fns]
+    return _get_feature_info(fns, n_threads, use_index, write_index)[0]
+
+
+def _get_feature_info(fns, n_threads, use_index, write_index):
+    """
+    Describe feature files, keeping the power features of any ``.npy`` files read.
+
+    ``.npy`` files can't be described without reading them entirely, so their power
+    features are returned to save reading them again. Feature stores and indexed
+    files aren't read.
+
+    Returns
+    -------
+    info : list of dict
+        See ``get_feature_info``.
+    power : list of None or numpy.ndarray
+        Power features of each ``.npy`` file that was read, otherwise ``None``
+    """
+    assert isinstance(fns, list)
+    # Look up each file in the index of its directory.
+    indices = {}
+    info = [None] * len(fns)
+    stats = [_get_stat(fn) for fn in fns]
+    if use_index:
+        for i, fn in enumerate(fns):
+            dir_name, base_name = os.path.split(os.path.abspath(fn))
+            if dir_name not in indices:
+                indices[dir_name] = _read_index(dir_name)
+            entry = indices[dir_name].get(base_name)
+            if entry is not None and entry["stat"] == stats[i]:
+                info[i] = entry
+    # Read the missing files concurrently.
+    power = [None] * len(fns)
+    missing = [i for i in range(len(fns)) if info[i] is None]
+    if len(missing) > 0:
+        with ThreadPoolExecutor(n_threads) as executor:
+            results = list(executor.map(_read_info, [fns[i] for i in missing]))
+        for i, (entry, file_power) in zip(missing, results):
+            entry["stat"] = stats[i]
+            info[i], power[i] = entry, file_power
+        if use_index and write_index:
+            updated = set()
+            for i in missing:
+                dir_name, base_name = os.path.split(os.path.abspath(fns[i]))
+                indices[dir_name][base_name] = info[i]
+                updated.add(dir_name)
+            for dir_name in updated:
+                _write_index(indices[dir_name], dir_name)
+    info = [
+        dict(
+            n_windows=entry["n_windows"],
+            rois=list(entry["rois"]),
+            freq=np.array(entry["freq"]),
+            shape=tuple(entry["shape"]),
+            dtype=entry["dtype"],
+        )
+        for entry in info
+    ]
+    return info, power
+
+
+def _get_stat(fn):
+    """Return the size and modification time of a feature file."""
+    if fn.endswith(FEATURE_STORE_EXT):
+        # Feature stores rewrite their metadata on every change.
+        fn = os.path.join(fn, METADATA_FN)
+    stat = os.stat(fn)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_info(fn):
+    """
+    Read the description of a feature file from the file itself.
+
+    Returns
+    -------
+    entry : dict
+        Index entry, without ``'stat'``
+    power : None or numpy.ndarray
+        Power features, if the file is a ``.npy`` file and had to be read
+    """
+    if fn.endswith(FEATURE_STORE_EXT):
+        store = FeatureStore(fn)
+        assert "power" in store.keys(), f"No power features in {fn}"
+        metadata = store.metadata
+        power = store.load("power", mmap=True)
+    elif fn.endswith(".npy"):
+        metadata = np.load(fn, allow_pickle=True).item()
+        power = metadata["power"]
+    else:
+        raise NotImplementedError(f"Unsupported file type: {fn}")
+    entry = dict(
+        n_windows=len(power),
+        rois=list(metadata["rois"]),
+        freq=np.asarray(metadata["freq"]).tolist(),
+        shape=list(power.shape[1:]),
+        dtype=power.dtype.str,
+    )
+    return entry, (power if fn.endswith(".npy") else None)
+
+
+def _read_index(dir_name):
+    """Read the index of a feature directory, or an empty index."""
+    index_fn = os.path.join(dir_name, FEATURE_INDEX_FN)
+    try:
+        with open(index_fn, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(index, dir_name):
+    """Atomically write the index of a feature directory, if it's writable."""
+    index_fn = os.path.join(dir_name, FEATURE_INDEX_FN)
+    temp_fn = index_fn + f".{os.getpid()}.tmp"
+    try:
+        with open(temp_fn, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_fn, index_fn)
+    except OSError as error:
+        warnings.warn(f"Couldn't write the feature index {index_fn}: {error}")
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
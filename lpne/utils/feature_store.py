@@ -0,0 +1,587 @@
+"""
+An appendable on-disk store of LFP features
+
+A feature store is a directory holding one raw binary file per windowed feature,
+e.g. ``power.bin``, along with a small JSON sidecar, ``metadata.json``, that records
+the number of windows, the shape and type of each feature, and everything else in
+the ``lpne.make_features`` output (``rois``, ``freq``, ``__commit__``, and
+``__version__``). Windows are stored along the first axis, so new windows are
+appended to the end of each file, and each feature can be memory-mapped without
+reading the others.
+
+Features can also be compressed in chunks of windows. Each chunk is byte-shuffled,
+grouping the first bytes of every value, then the second bytes, and so on, which
+makes floating point features much more compressible, and then compressed with
+``zlib``, ``lz4``, or ``zstd``. The metadata records the size of every chunk, so
+indexing a compressed feature only reads and decompresses the chunks it needs.
+
+Floating point features can also be quantized to save space. With ``'float16'``
+quantization, features are stored in half precision. With ``'int8'`` or ``'uint16'``
+quantization, the values of each frequency in a block of up to ``chunk_windows``
+windows are rounded to evenly spaced integer codes between their minimum and maximum,
+and the minimum and the spacing of every block are saved alongside the codes in
+``<feature>.scale.bin``. The smallest code marks NaNs. Quantized features are
+dequantized to single precision on read.
+
+"""
+__date__ = "October 2026"
+__all__ = ["FeatureStore"]
+
+
+import json
+import numpy as np
+import os
+import zlib
+
+LZ4_INSTALLED = True
+try:
+    import lz4.frame
+except ModuleNotFoundError:
+    LZ4_INSTALLED = False
+ZSTD_INSTALLED = True
+try:
+    import zstandard
+except ModuleNotFoundError:
+    ZSTD_INSTALLED = False
+
+
+FEATURE_STORE_EXT = ".lpne"
+"""Extension of feature store directories"""
+FEATURE_STORE_VERSION = 2
+"""Version of the feature store format"""
+COMPRESSIONS = [None, "zlib", "lz4", "zstd"]
+"""Supported compression codecs"""
+DEFAULT_CHUNK_WINDOWS = 64
+"""Default number of windows in each compressed or quantized chunk"""
+QUANTIZATIONS = [None, "float16", "int8", "uint16"]
+"""Supported quantizations"""
+SCALE_SUFFIX = ".scale"
+"""Suffix of the files holding quantization scales"""
+METADATA_FN = "metadata.json"
+"""Name of the JSON sidecar"""
+METADATA_KEYS = ["freq", "rois", "__commit__", "__version__"]
+"""Keys of ``lpne.make_features`` output that aren't indexed by window"""
+
+
+class FeatureStore:
+    """
+    An appendable on-disk store of LFP features.
+
+    Parameters
+    ----------
+    path : str
+        Feature store directory. This is created on the first ``append`` if it
+        doesn't exist.
+    compression : {None, ``'zlib'``, ``'lz4'``, ``'zstd'``}, optional
+        How new features are compressed. ``'lz4'`` and ``'zstd'`` require the
+        ``lz4`` and ``zstandard`` packages. Features that are already stored keep
+        their compression.
+    chunk_windows : int, optional
+        Number of windows compressed or quantized together. Smaller chunks make
+        reading a few windows faster and compress less.
+    quantization : {None, ``'float16'``, ``'int8'``, ``'uint16'``}, optional
+        How new floating point features are quantized. Features that are already
+        stored keep their quantization. ``'float16'`` can only store values up to
+        about ``6.5e4``, and small values lose relative precision, so it's meant for
+        features with a modest dynamic range. See
+        ``FeatureStore.get_quantization_error``.
+
+    Examples
+    --------
+    >>> store = FeatureStore("features.lpne")
+    >>> for res in lpne.stream_features(lfp_chunks, fs=1000):
+    ...     store.append(res)
+    >>> power = store.load("power")  # memory-mapped
+    """
+
+    def __init__(
+        self,
+        path,
+        compression=None,
+        chunk_windows=DEFAULT_CHUNK_WINDOWS,
+        quantization=None,
+    ):
+        assert isinstance(path, str), f"path {path} is not a string!"
+        assert (
+            compression in COMPRESSIONS
+        ), f"Unsupported compression: {compression}, expected one of {COMPRESSIONS}"
+        assert compression != "lz4" or LZ4_INSTALLED, "lz4 needs to be installed!"
+        assert (
+            compression != "zstd" or ZSTD_INSTALLED
+        ), "zstandard needs to be installed!"
+        assert chunk_windows >= 1, f"Invalid chunk_windows: {chunk_windows}"
+        assert (
+            quantization in QUANTIZATIONS
+        ), f"Unsupported quantization: {quantization}, expected one of {QUANTIZATIONS}"
+        self.path = path
+        self.quantization = quantization
+        self.compression = compression
+        self.chunk_windows = chunk_windows
+        self._metadata = None
+        if os.path.exists(self._metadata_fn):
+            with open(self._metadata_fn, "r") as f:
+                self._metadata = json.load(f)
+            version = self._metadata["format_version"]
+            assert (
+                version <= FEATURE_STORE_VERSION
+            ), f"Unsupported feature store version: {version}"
+
+    @property
+    def _metadata_fn(self):
+        return os.path.join(self.path, METADATA_FN)
+
+    @property
+    def n_windows(self):
+        """Number of stored windows"""
+        if self._metadata is None:
+            return 0
+        return self._metadata["n_windows"]
+
+    @property
+    def metadata(self):
+        """Everything but the windowed features, e.g. ``rois`` and ``freq``"""
+        if self._metadata is None:
+            return {}
+        res = dict(self._metadata["metadata"])
+        if "freq" in res:
+            res["freq"] = np.array(res["freq"])
+        return res
+
+    def clear(self):
+        """Delete every stored window and feature."""
+        if self._metadata is None:
+            return
+        for key in self._metadata["arrays"]:
+            for fn in [self._array_fn(key), self._array_fn(key + SCALE_SUFFIX)]:
+                if os.path.exists(fn):
+                    os.remove(fn)
+        os.remove(self._metadata_fn)
+        self._metadata = None
+
+    def keys(self):
+        """Names of the windowed features"""
+        if self._metadata is None:
+            return []
+        return list(self._metadata["arrays"].keys())
+
+    def get_quantization_error(self, key):
+        """
+        Compare a quantized feature to the full-precision features that were stored.
+
+        Parameters
+        ----------
+        key : str
+            Feature name, e.g. ``'power'``
+
+        Returns
+        -------
+        error : float
+            Root-mean-square quantization error divided by the root-mean-square of
+            the full-precision features, ignoring NaNs. This is ``0.0`` if the feature
+            isn't quantized.
+        """
+        assert key in self.keys(), f"{key} is not in {self.path}: {self.keys()}"
+        info = self._metadata["arrays"][key]
+        if info.get("quantization") is None or info["sq_norm"] == 0.0:
+            return 0.0
+        return float(np.sqrt(info["sq_error"] / info["sq_norm"]))
+
+    def append(self, features):
+        """
+        Append windows of features to the store.
+
+        Parameters
+        ----------
+        features : dict
+            Output of ``lpne.make_features`` or ``lpne.stream_features``. Every
+            array except those in ``METADATA_KEYS`` must have the same number of
+            windows along its first axis.
+        """
+        arrays = {
+            k: np.asarray(v) for k, v in features.items() if k not in METADATA_KEYS
+        }
+        metadata = {k: _to_json(v) for k, v in features.items() if k in METADATA_KEYS}
+        assert len(arrays) > 0, "No windowed features to append!"
+        n = [len(arr) for arr in arrays.values()]
+        assert len(set(n)) == 1, f"Inconsistent numbers of windows: {n}"
+        if self._metadata is None:
+            os.makedirs(self.path, exist_ok=True)
+            array_info = {}
+            for k, arr in arrays.items():
+                array_info[k] = dict(dtype=arr.dtype.str, shape=list(arr.shape[1:]))
+                quantize = self.quantization is not None and arr.ndim >= 2
+                if quantize and np.issubdtype(arr.dtype, np.floating):
+                    array_info[k].update(
+                        dtype=np.dtype(self.quantization).str,
+                        quantization=self.quantization,
+                        sq_error=0.0,
+                        sq_norm=0.0,
+                    )
+                    if self.quantization != "float16":
+                        # Number of windows sharing each row of scales
+                        array_info[k]["scale_blocks"] = []
+            if self.compression is not None:
+                for info in array_info.values():
+                    info.update(compression=self.compression, chunks=[])
+            plain = self.compression is None and self.quantization is None
+            self._metadata = dict(
+                # Plain stores can still be read by older versions.
+                format_version=1 if plain else 2,
+                n_windows=0,
+                arrays=array_info,
+                metadata=metadata,
+            )
+        else:
+            self._check_consistent(arrays, metadata)
+        # Quantize the features.
+        stored = {}
+        for key, arr in arrays.items():
+            info = self._metadata["arrays"][key]
+            if info.get("quantization") is None:
+                stored[key] = arr
+                continue
+            blocks = [
+                arr[i : i + self.chunk_windows]
+                for i in range(0, len(arr), self.chunk_windows)
+            ]
+            quantized = [_quantize(block, info["quantization"]) for block in blocks]
+            stored[key] = np.concatenate([codes for codes, _ in quantized], axis=0)
+            if "scale_blocks" in info:
+                scales = np.stack([scale for _, scale in quantized], axis=0)
+                with open(self._array_fn(key + SCALE_SUFFIX), "ab") as f:
+                    # Drop anything written after the last complete append.
+                    f.truncate(len(info["scale_blocks"]) * scales[0].nbytes)
+                    f.write(scales.tobytes())
+                info["scale_blocks"] = info["scale_blocks"] + [len(b) for b in blocks]
+            # Keep track of the quantization error.
+            for block, (codes, scale) in zip(blocks, quantized):
+                if scale is not None:
+                    scale = np.broadcast_to(scale, (len(block),) + scale.shape)
+                error = _dequantize(codes, scale, info["quantization"]) - block
+                finite = np.isfinite(block)
+                info["sq_error"] += float(np.sum(np.square(error[finite])))
+                info["sq_norm"] += float(np.sum(np.square(block[finite])))
+        for key, arr in stored.items():
+            info = self._metadata["arrays"][key]
+            arr = np.ascontiguousarray(arr, dtype=info["dtype"])
+            with open(self._array_fn(key), "ab") as f:
+                # Drop anything written after the last complete append.
+                if info.get("compression") is None:
+                    f.truncate(self.n_windows * self._row_bytes(key))
+                    f.write(arr.tobytes())
+                    continue
+                f.truncate(sum(n_bytes for _, n_bytes in info["chunks"]))
+                chunks = []
+                for i in range(0, len(arr), self.chunk_windows):
+                    chunk = arr[i : i + self.chunk_windows]
+                    buf = _compress(chunk, info["compression"])
+                    f.write(buf)
+                    chunks.append([len(chunk), len(buf)])
+                info["chunks"] = info["chunks"] + chunks
+        self._metadata["n_windows"] += n[0]
+        self._write_metadata()
+
+    def load(self, key, mmap=True):
+        """
+        Load a windowed feature.
+
+        Parameters
+        ----------
+        key : str
+            Feature name, e.g. ``'power'``
+        mmap : bool, optional
+            Whether to return a read-only memory map instead of reading the feature
+            into memory. Compressed features are returned as a ``CompressedArray``,
+            which only decompresses the windows that are indexed. Quantized features
+            are returned as a ``QuantizedArray``, which only dequantizes the windows
+            that are indexed.
+
+        Returns
+        -------
+        arr : numpy.ndarray, CompressedArray, or QuantizedArray
+            Shape: ``[n_windows, ...]``. Quantized features are dequantized to
+            ``numpy.float32``.
+        """
+        assert key in self.keys(), f"{key} is not in {self.path}: {self.keys()}"
+        info = self._metadata["arrays"][key]
+        if info.get("quantization") is None:
+            return self._load_array(key, mmap)
+        codes = self._load_array(key, mmap=True)
+        scale, scale_blocks = None, None
+        if "scale_blocks" in info:
+            scale_blocks = info["scale_blocks"]
+            scale = np.fromfile(self._array_fn(key + SCALE_SUFFIX), dtype="<f4")
+            scale = scale[: len(scale_blocks) * 2 * info["shape"][-1]]
+            scale = scale.reshape(len(scale_blocks), 2, info["shape"][-1])
+        arr = QuantizedArray(codes, scale, info["quantization"], scale_blocks)
+        return arr if mmap else arr[:]
+
+    def _load_array(self, key, mmap):
+        """Load the stored array of a feature."""
+        info = self._metadata["arrays"][key]
+        shape = (self.n_windows,) + tuple(info["shape"])
+        if self.n_windows == 0:
+            return np.empty(shape, dtype=info["dtype"])
+        if info.get("compression") is not None:
+            arr = CompressedArray(self._array_fn(key), info)
+            return arr if mmap else arr[:]
+        if mmap:
+            return np.memmap(
+                self._array_fn(key), dtype=info["dtype"], mode="r", shape=shape
+            )
+        count = int(np.prod(shape))
+        return np.fromfile(
+            self._array_fn(key), dtype=info["dtype"], count=count
+        ).reshape(shape)
+
+    def _array_fn(self, key):
+        return os.path.join(self.path, key + ".bin")
+
+    def _row_bytes(self, key):
+        info = self._metadata["arrays"][key]
+        return int(np.prod(info["shape"])) * np.dtype(info["dtype"]).itemsize
+
+    def _check_consistent(self, arrays, metadata):
+        """Make sure appended features match the stored features."""
+        assert set(arrays) == set(
+            self.keys()
+        ), f"Features don't match: {sorted(arrays)} != {sorted(self.keys())}"
+        for key, arr in arrays.items():
+            shape = list(arr.shape[1:])
+            prev_shape = self._metadata["arrays"][key]["shape"]
+            assert (
+                shape == prev_shape
+            ), f"Inconsistent {key} shape: {shape} != {prev_shape}"
+        prev_metadata = self._metadata["metadata"]
+        if "rois" in metadata and "rois" in prev_metadata:
+            rois, prev_rois = metadata["rois"], prev_metadata["rois"]
+            assert rois == prev_rois, f"Inconsistent ROIs: {rois} != {prev_rois}"
+        if "freq" in metadata and "freq" in prev_metadata:
+            freq, prev_freq = metadata["freq"], prev_metadata["freq"]
+            assert len(freq) == len(prev_freq) and np.allclose(
+                freq, prev_freq
+            ), f"Inconsistent frequencies: {freq} != {prev_freq}"
+
+    def _write_metadata(self):
+        # Replace the sidecar atomically so that it always describes complete windows.
+        temp_fn = self._metadata_fn + ".tmp"
+        with open(temp_fn, "w") as f:
+            json.dump(self._metadata, f)
+        os.replace(temp_fn, self._metadata_fn)
+
+
+class QuantizedArray:
+    """
+    A read-only view of a quantized feature in a feature store.
+
+    Indexing along the first (window) axis dequantizes only the requested windows
+    to ``numpy.float32``.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray or CompressedArray
+        Quantized features
+    scale : None or numpy.ndarray
+        Offset and spacing of the integer codes for each block of windows and each
+        frequency. ``None`` for ``'float16'`` quantization.
+        Shape: ``[n_blocks,2,n_freq]``
+    quantization : {``'float16'``, ``'int8'``, ``'uint16'``}
+        Quantization
+    scale_blocks : None or list of int, optional
+        Number of consecutive windows in each block. ``None`` for ``'float16'``
+        quantization.
+    """
+
+    def __init__(self, codes, scale, quantization, scale_blocks=None):
+        self.codes = codes
+        self.scale = scale
+        self.quantization = quantization
+        if scale is not None:
+            assert scale_blocks is not None and len(scale_blocks) == len(scale)
+            self._block_offsets = np.cumsum([0] + list(scale_blocks))
+        self.dtype = np.dtype(np.float32)
+        self.shape = tuple(codes.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __getitem__(self, idx):
+        if not isinstance(idx, tuple):
+            idx = (idx,)
+        windows = np.arange(len(self))[idx[0]]
+        flat_windows = windows.reshape(-1)
+        codes = np.asarray(self.codes[flat_windows])
+        scale = None
+        if self.scale is not None:
+            blocks = np.searchsorted(self._block_offsets, flat_windows, side="right")
+            scale = self.scale[blocks - 1]  # [w,2,f]
+        res = _dequantize(codes, scale, self.quantization)
+        res = res.reshape(windows.shape + self.shape[1:])
+        return res[(slice(None),) * windows.ndim + idx[1:]]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[:]
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+
+class CompressedArray:
+    """
+    A read-only view of a compressed feature in a feature store.
+
+    Indexing along the first (window) axis reads and decompresses only the chunks
+    holding the requested windows.
+
+    Parameters
+    ----------
+    fn : str
+        Binary file holding the compressed chunks
+    info : dict
+        Feature metadata: ``dtype``, ``shape``, ``compression``, and ``chunks``
+    """
+
+    def __init__(self, fn, info):
+        self.fn = fn
+        self.compression = info["compression"]
+        self.dtype = np.dtype(info["dtype"])
+        n_windows = [chunk[0] for chunk in info["chunks"]]
+        n_bytes = [chunk[1] for chunk in info["chunks"]]
+        self.shape = (sum(n_windows),) + tuple(info["shape"])
+        self._window_offsets = np.cumsum([0] + n_windows)
+        self._byte_offsets = np.cumsum([0] + n_bytes)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __getitem__(self, idx):
+        if not isinstance(idx, tuple):
+            idx = (idx,)
+        windows = np.arange(len(self))[idx[0]]
+        res = self._read(windows.reshape(-1))
+        res = res.reshape(windows.shape + self.shape[1:])
+        return res[(slice(None),) * windows.ndim + idx[1:]]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[:]
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+    def _read(self, windows):
+        """Read the given windows, decompressing each chunk once."""
+        res = np.empty((len(windows),) + self.shape[1:], dtype=self.dtype)
+        chunk_nums = np.searchsorted(self._window_offsets, windows, side="right") - 1
+        with open(self.fn, "rb") as f:
+            for chunk_num in np.unique(chunk_nums):
+                start, stop = self._byte_offsets[chunk_num : chunk_num + 2]
+                f.seek(start)
+                n = (
+                    self._window_offsets[chunk_num + 1]
+                    - self._window_offsets[chunk_num]
+                )
+                shape = (n,) + self.shape[1:]
+                chunk = _decompress(f.read(stop - start), self.compression, self.dtype)
+                mask = chunk_nums == chunk_num
+                local = windows[mask] - self._window_offsets[chunk_num]
+                res[mask] = chunk.reshape(shape)[local]
+        return res
+
+
+def _quantize(arr, quantization):
+    """
+    Quantize a block of floating point features with one scale per frequency.
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        Shape: ``[n_windows,...,n_freq]``
+    scale : None or numpy.ndarray
+        Offset and spacing of the integer codes for each frequency. ``None`` for
+        ``'float16'`` quantization.
+        Shape: ``[2,n_freq]``
+    """
+    if quantization == "float16":
+        codes = arr.astype(np.float16)
+        assert not np.any(
+            np.isinf(codes) & np.isfinite(arr)
+        ), "Features overflow float16! Try 'uint16' quantization instead."
+        return codes, None
+    iinfo = np.iinfo(quantization)
+    n_steps = int(iinfo.max) - int(iinfo.min) - 1
+    nan_mask = np.isnan(arr)
+    axes = tuple(range(arr.ndim - 1))
+    low = np.min(np.where(nan_mask, np.inf, arr), axis=axes)  # [f]
+    high = np.max(np.where(nan_mask, -np.inf, arr), axis=axes)  # [f]
+    empty = low > high  # all NaNs
+    low[empty], high[empty] = 0.0, 0.0
+    scale = np.stack([low, (high - low) / n_steps], axis=0).astype(np.float32)
+    # Round using the stored scale so that codes are decoded consistently.
+    low, step = scale[0].astype(arr.dtype), scale[1].astype(arr.dtype)
+    step = np.where(step > 0.0, step, 1.0)
+    with np.errstate(invalid="ignore"):
+        codes = np.rint((arr - low) / step)
+    codes = np.clip(codes, 0, n_steps) + (int(iinfo.min) + 1)
+    codes = np.where(nan_mask, iinfo.min, codes).astype(quantization)
+    return codes, scale
+
+
+def _dequantize(codes, scale, quantization):
+    """Dequantize features to single precision, given the scale of each window."""
+    if quantization == "float16":
+        return codes.astype(np.float32)
+    iinfo = np.iinfo(quantization)
+    expand = (slice(None),) + (None,) * (codes.ndim - 2) + (slice(None),)
+    res = codes.astype(np.float32) - (int(iinfo.min) + 1)
+    res = res * scale[:, 1][expand] + scale[:, 0][expand]
+    res[codes == iinfo.min] = np.nan
+    return res
+
+
+def _compress(arr, compression):
+    """Byte-shuffle and compress a contiguous array."""
+    itemsize = arr.dtype.itemsize
+    buf = arr.reshape(-1).view(np.uint8).reshape(-1, itemsize).T.tobytes()
+    if compression == "zlib":
+        return zlib.compress(buf, 1)
+    if compression == "lz4":
+        return lz4.frame.compress(buf)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(buf)
+    raise NotImplementedError(compression)
+
+
+def _decompress(buf, compression, dtype):
+    """Decompress and unshuffle a flattened array."""
+    if compression == "zlib":
+        buf = zlib.decompress(buf)
+    elif compression == "lz4":
+        assert LZ4_INSTALLED, "lz4 needs to be installed!"
+        buf = lz4.frame.decompress(buf)
+    elif compression == "zstd":
+        assert ZSTD_INSTALLED, "zstandard needs to be installed!"
+        buf = zstandard.ZstdDecompressor().decompress(buf)
+    else:
+        raise NotImplementedError(compression)
+    arr = np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(arr.T).view(dtype).reshape(-1)
+
+
+def _to_json(value):
+    """Convert metadata values to JSON-serializable types."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
@@ -3,10 +3,11 @@ File system-related utilities
 
 TODO: clean this up and deprecate some functions
 """
-__date__ = "July 2021 - November 2022"
+__date__ = "July 2021 - October 2026"
 __all__ = [
     "get_all_fns",
     "get_feature_filenames",
+    "get_file_hash",
     "get_feature_label_filenames",
     "get_label_filenames_from_feature_filenames",
     "get_lfp_chans_filenames",
@@ -14,6 +15,7 @@ __all__ = [
     "infer_groups_from_fns",
 ]
 
+import hashlib
 import numpy as np
 import os
 import warnings
@@ -22,6 +24,8 @@ LFP_FN_SUFFIX = "_LFP.mat"
 CHANS_FN_SUFFIX = "_CHANS.mat"
 FEATURE_FN_SUFFIX = ".npy"
 LABEL_FN_SUFFIX = ".npy"
+HASH_BLOCK_SIZE = 2**20
+"""Number of bytes hashed at once"""
 
 
 def get_all_fns(
@@ -99,30 +103,22 @@ def get_all_fns(
     assert isinstance(label_suffix, str) and len(label_suffix) > 0
     assert isinstance(lfp_suffix, str) and len(lfp_suffix) > 0
 
-    # Figure out the missing/extra files.
-    j = len(chans_suffix)
-    chans_fns = [i[:-j] for i in os.listdir(chans_dir) if i.endswith(chans_suffix)]
-    chans_fns = np.array(chans_fns)
-    j = len(label_suffix)
-    label_fns = [i[:-j] for i in os.listdir(label_dir) if i.endswith(label_suffix)]
-    label_fns = np.array(label_fns)
-    j = len(lfp_suffix)
-    lfp_fns = [i[:-j] for i in os.listdir(lfp_dir) if i.endswith(lfp_suffix)]
-    lfp_fns = np.array(lfp_fns)
-    kw = dict(invert=True, assume_unique=True)
-    chan_label_f = chans_fns[np.isin(chans_fns, label_fns, **kw)]
-    label_chan_f = label_fns[np.isin(label_fns, chans_fns, **kw)]
-    chan_lfp_f = chans_fns[np.isin(chans_fns, lfp_fns, **kw)]
-    lfp_chan_f = lfp_fns[np.isin(lfp_fns, chans_fns, **kw)]
-    label_lfp_f = label_fns[np.isin(label_fns, lfp_fns, **kw)]
-    lfp_label_f = lfp_fns[np.isin(lfp_fns, label_fns, **kw)]
+    # Figure out the missing/extra files, listing each directory once.
+    def list_names(dir_name, suffix):
+        return set(
+            i[: -len(suffix)] for i in os.listdir(dir_name) if i.endswith(suffix)
+        )
+
+    chans_fns = list_names(chans_dir, chans_suffix)
+    label_fns = list_names(label_dir, label_suffix)
+    lfp_fns = list_names(lfp_dir, lfp_suffix)
     temp = [
-        chan_label_f,
-        label_chan_f,
-        chan_lfp_f,
-        lfp_chan_f,
-        label_lfp_f,
-        lfp_label_f,
+        chans_fns - label_fns,
+        label_fns - chans_fns,
+        chans_fns - lfp_fns,
+        lfp_fns - chans_fns,
+        label_fns - lfp_fns,
+        lfp_fns - label_fns,
     ]
     lens = [len(i) for i in temp]
     msg = ""
@@ -145,8 +141,7 @@ def get_all_fns(
         warnings.warn(msg)
 
     # Figure out the common group of files.
-    fns = np.intersect1d(chans_fns, label_fns)
-    fns = np.intersect1d(fns, lfp_fns)  # guaranteed to be sorted
+    fns = sorted(chans_fns & label_fns & lfp_fns)
     assert len(fns) > 0, (
         f"Found no filenames in common between CHANS, label, and " f"LFP directories!"
     )
@@ -224,6 +219,27 @@ def get_feature_label_filenames(feature_dir, label_dir):
     return feature_fns, label_fns
 
 
+def get_file_hash(fn):
+    """
+    Return the SHA-256 hash of a file's contents.
+
+    Parameters
+    ----------
+    fn : str
+        Filename
+
+    Returns
+    -------
+    file_hash : str
+        Hexadecimal digest
+    """
+    file_hash = hashlib.sha256()
+    with open(fn, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
 def get_label_filenames_from_feature_filenames(feature_fns, label_dir):
     """
     Given features filenames, return corresponding label filenames.
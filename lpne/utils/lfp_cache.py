@@ -0,0 +1,183 @@
+"""
+A cache of LFP files converted to a memory-mappable binary format
+
+Parsing ``.mat`` files is slow, so ``lpne.load_lfps`` can convert each LFP file once
+into a directory holding a raw float32 ``[channel,time]`` array, ``lfps.bin``, and a
+JSON channel index, ``channels.json``. Converted files are keyed by the SHA-256 hash
+of the source file, so renamed or copied recordings share a single conversion.
+
+The cache also keeps ``index.json``, which maps each source filename to its size,
+modification time, and hash. Files are only rehashed when their size or modification
+time changes.
+
+"""
+__date__ = "October 2026"
+__all__ = ["clear_lfp_cache"]
+
+
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+from .file_utils import get_file_hash
+
+
+LFP_CACHE_ENV = "LPNE_LFP_CACHE"
+"""Environment variable holding the default cache directory"""
+INDEX_FN = "index.json"
+CHANNELS_FN = "channels.json"
+LFPS_FN = "lfps.bin"
+
+
+def get_lfp_cache_dir(cache_dir=None):
+    """
+    Resolve the cache directory.
+
+    Parameters
+    ----------
+    cache_dir : None, bool, or str
+        Cache directory. If ``None`` or ``True``, the directory in the
+        ``LPNE_LFP_CACHE`` environment variable is used. If ``False``, caching is
+        disabled.
+
+    Returns
+    -------
+    cache_dir : None or str
+        ``None`` if caching is disabled.
+    """
+    if cache_dir is False:
+        return None
+    if cache_dir is None or cache_dir is True:
+        return os.environ.get(LFP_CACHE_ENV)
+    return cache_dir
+
+
+def load_cached_lfps(fn, cache_dir, load_func, channels=None, samples=slice(None)):
+    """
+    Load LFPs through the cache, converting the file first if necessary.
+
+    Parameters
+    ----------
+    fn : str
+        LFP filename
+    cache_dir : str
+        Cache directory
+    load_func : function
+        Loads every channel of an LFP file: ``load_func(fn) -> dict``
+    channels : None or list of str, optional
+        Channels to load. If ``None``, every channel is loaded.
+    samples : slice, optional
+        Samples to load
+
+    Returns
+    -------
+    lfps : None or dict
+        Maps channel names to LFP waveforms. ``None`` if the file's channels have
+        different lengths and can't be cached.
+    """
+    entry_dir = _get_entry_dir(fn, cache_dir)
+    if not os.path.exists(os.path.join(entry_dir, CHANNELS_FN)):
+        if not _convert(fn, entry_dir, load_func):
+            return None
+    with open(os.path.join(entry_dir, CHANNELS_FN), "r") as f:
+        index = json.load(f)
+    all_channels, n_samples = index["channels"], index["n_samples"]
+    if channels is None:
+        channels = all_channels
+    shape = (len(all_channels), n_samples)
+    if 0 in shape:
+        arr = np.zeros(shape, dtype=np.float32)
+    else:
+        arr = np.memmap(
+            os.path.join(entry_dir, LFPS_FN), dtype=np.float32, mode="r", shape=shape
+        )
+    lfps = {}
+    for channel in channels:
+        if channel in all_channels:
+            # Copy so that the LFPs can be modified in place.
+            lfps[channel] = np.array(arr[all_channels.index(channel), samples])
+    return lfps
+
+
+def clear_lfp_cache(cache_dir=None):
+    """
+    Delete every converted LFP file in the cache.
+
+    Parameters
+    ----------
+    cache_dir : None or str, optional
+        Cache directory. If ``None``, the directory in the ``LPNE_LFP_CACHE``
+        environment variable is used.
+    """
+    cache_dir = get_lfp_cache_dir(cache_dir)
+    if cache_dir is None or not os.path.exists(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path) and os.path.exists(os.path.join(path, CHANNELS_FN)):
+            shutil.rmtree(path)
+    if os.path.exists(os.path.join(cache_dir, INDEX_FN)):
+        os.remove(os.path.join(cache_dir, INDEX_FN))
+
+
+def _get_entry_dir(fn, cache_dir):
+    """Find the cache directory of a file, rehashing it only if it changed."""
+    os.makedirs(cache_dir, exist_ok=True)
+    index_fn = os.path.join(cache_dir, INDEX_FN)
+    index = {}
+    if os.path.exists(index_fn):
+        with open(index_fn, "r") as f:
+            index = json.load(f)
+    key = os.path.abspath(fn)
+    stat = os.stat(fn)
+    entry = index.get(key, {})
+    if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        entry = dict(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=get_file_hash(fn)
+        )
+        index[key] = entry
+        _write_json(index, index_fn)
+    return os.path.join(cache_dir, entry["hash"])
+
+
+def _convert(fn, entry_dir, load_func):
+    """Convert an LFP file and move it into the cache. Return whether it worked."""
+    lfps = load_func(fn)
+    channels = sorted(lfps.keys())
+    lengths = set(len(lfps[channel]) for channel in channels)
+    if len(lengths) > 1:
+        return False
+    n_samples = lengths.pop() if len(lengths) == 1 else 0
+    # Write to a temporary directory first so that entries are always complete.
+    parent = os.path.dirname(entry_dir)
+    temp_dir = tempfile.mkdtemp(dir=parent)
+    try:
+        with open(os.path.join(temp_dir, LFPS_FN), "wb") as f:
+            for channel in channels:
+                f.write(np.ascontiguousarray(lfps[channel], dtype=np.float32).tobytes())
+        index = dict(channels=channels, n_samples=n_samples)
+        _write_json(index, os.path.join(temp_dir, CHANNELS_FN))
+        os.replace(temp_dir, entry_dir)
+    except OSError:
+        # Another process made the same entry first.
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(entry_dir, CHANNELS_FN)):
+            raise
+    return True
+
+
+def _write_json(obj, fn):
+    """Atomically write a JSON file."""
+    temp_fn = fn + f".{os.getpid()}.tmp"
+    with open(temp_fn, "w") as f:
+        json.dump(obj, f)
+    os.replace(temp_fn, fn)
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
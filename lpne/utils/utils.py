@@ -2,9 +2,10 @@
 Useful functions that don't fit cleanly into another file
 
 """
-__date__ = "July 2021 - November 2022"
+__date__ = "July 2021 - October 2026"
 __all__ = [
     "confusion_matrix",
+    "get_n_jobs",
     "get_outlier_summary",
     "get_weights",
     "write_fake_labels",
@@ -47,41 +48,84 @@ def confusion_matrix(true_labels, pred_labels):
     return sk_confusion_matrix(true_labels[idx], pred_labels[idx])
 
 
-def get_outlier_summary(lfps, fs, window_duration, top_n=6):
+def get_n_jobs(n_jobs):
+    """
+    Resolve the number of parallel jobs.
+
+    Negative values count back from the number of CPUs, so ``-1`` uses every CPU.
+
+    Parameters
+    ----------
+    n_jobs : None or int
+        Requested number of jobs. ``None`` means ``1``.
+
+    Returns
+    -------
+    n_jobs : int
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = max(1, os.cpu_count() + 1 + n_jobs)
+    assert n_jobs >= 1, f"Invalid number of jobs: {n_jobs}"
+    return n_jobs
+
+
+def get_outlier_summary(
+    lfps, fs, window_duration, top_n=6, mask=None, return_matrix=False
+):
     """
     Return a message summarizing the outliers found
 
+    The LFPs are tiled with windows like ``lpne.make_features`` with the default
+    ``window_step``. A window of a channel contains outliers if any of its samples
+    are NaNs.
+
     Parameters
     ----------
-    lfps :
+    lfps : dict
+        Maps ROI names to LFP waveforms
     fs : int
         Samplerate
     window_duration : float
         LFP window duration, in seconds
     top_n : int, optional
         Show stats for this many channels
+    mask : None or lpne.IntervalMask, optional
+        NaN intervals of the LFPs, e.g. from ``lpne.mark_outliers``. If this is
+        given, the windows with outliers are found from the intervals instead of by
+        scanning every sample.
+    return_matrix : bool, optional
+        Whether to also return which windows of which channels contain outliers
 
     Returns
     -------
     message : str
         A description of the outliers found.
+    outlier_matrix : numpy.ndarray
+        Whether each window of each channel contains outliers, with channels in
+        sorted order. This can be passed to ``lpne.make_features`` as its ``mask``
+        if ``lfps`` are the LFPs the features are made from. Only returned if
+        ``return_matrix`` is ``True``.
+        Shape: ``[n_roi,n_window]``
     """
     rois = sorted(list(lfps.keys()))
-    roi_counts = np.zeros(len(rois), dtype=int)
     window_samples = int(fs * window_duration)
     n_windows = len(lfps[rois[0]]) // window_samples
-    window_count = 0
-    # Collect the number of windows each window is implicated in.
-    for i in range(n_windows):
-        flag = False
-        i1 = int(fs * i * window_duration)
-        i2 = i1 + window_samples
+    if mask is not None:
+        # Look up the windows that overlap the NaN intervals.
+        onsets = window_samples * np.arange(n_windows)
+        outlier_matrix = mask.get_window_mask(onsets, window_samples, rois)
+    else:
+        # View each channel as [window,samples], one channel at a time to avoid
+        # copying the LFPs.
+        outlier_matrix = np.zeros((len(rois), n_windows), dtype=bool)
         for j, roi in enumerate(rois):
-            if np.isnan(lfps[roi][i1:i2]).sum() > 0:
-                roi_counts[j] += 1
-                flag = True
-        if flag:
-            window_count += 1
+            trace = lfps[roi].reshape(-1)[: n_windows * window_samples]
+            trace = trace.reshape(n_windows, window_samples)
+            outlier_matrix[j] = np.isnan(trace).any(axis=-1)
+    roi_counts = np.sum(outlier_matrix, axis=1)
+    window_count = int(np.sum(np.any(outlier_matrix, axis=0)))
     # Make the message.
     msg = (
         f"{window_count} of {n_windows} windows contain outliers "
@@ -95,6 +139,8 @@ def get_outlier_summary(lfps, fs, window_duration, top_n=6):
         numerator = -sorted_counts[i]
         percent = 100 * numerator / n_windows
         msg += f"  {i+1}) {roi}: {numerator}/{n_windows} ({percent:.2f}%)\n"
+    if return_matrix:
+        return msg, outlier_matrix
     return msg
 
 
@@ -2,7 +2,7 @@
 Test lpne.channel_maps functions.
 
 """
-__date__ = "July 2021 - November 2022"
+__date__ = "July 2021 - October 2026"
 
 
 import numpy as np
@@ -78,6 +78,29 @@ def test_average_channels():
         pass
 
 
+def test_average_channels_mask():
+    """Make sure NaN intervals are grouped and used like the NaNs themselves."""
+    fs, n = 1000, 20000
+    lfps = {roi: np.random.randn(n) for roi in FAKE_ROIS}
+    lfps["foo_L_01"][1000:1500] = np.nan
+    lfps["foo_R_02"][1400:2000] = np.nan
+    lfps["bar_L_02"][12345:12346] = np.nan
+    mask = lpne.IntervalMask.from_lfps(lfps)
+    channel_map = _get_fake_channel_map()
+    summary = lpne.get_outlier_summary(lfps, fs, 2.0)
+    assert lpne.get_outlier_summary(lfps, fs, 2.0, mask=mask) == summary
+    avg_lfps, avg_mask = lpne.average_channels(lfps, channel_map, mask=mask)
+    target = lpne.IntervalMask.from_lfps(avg_lfps)
+    assert sorted(avg_mask.keys()) == sorted(target.keys())
+    for roi in target.keys():
+        assert np.array_equal(avg_mask[roi], target[roi])
+    assert np.array_equal(avg_mask["foo"], [[1000, 2000]])
+    kwargs = dict(fs=fs, window_duration=2.0)
+    features = lpne.make_features(avg_lfps, **kwargs)
+    mask_features = lpne.make_features(avg_lfps, mask=avg_mask, **kwargs)
+    assert np.array_equal(features["power"], mask_features["power"], equal_nan=True)
+
+
 def _get_fake_rois():
     return FAKE_ROIS
 
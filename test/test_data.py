@@ -2,10 +2,14 @@
 Test lpne.data functions.
 
 """
-__date__ = "July 2021"
+__date__ = "July 2021 - October 2026"
 
 
+import h5py
+import numpy as np
+import os
 import pytest
+from scipy.io import savemat
 
 import lpne
 
@@ -22,6 +26,206 @@ def test_load_lfps_2():
         x = lpne.load_lfps("possibly_a_real_lfp_filename.npy")
 
 
+def test_load_lfps_3(tmp_path):
+    """Load some of the channels and samples from v5 and v7.3 mat files."""
+    lfps = {"a": np.random.randn(100), "b": np.random.randn(100)}
+    fn_1, fn_2 = str(tmp_path / "lfps_1.mat"), str(tmp_path / "lfps_2.mat")
+    savemat(fn_1, lfps)
+    # Write an HDF5 file with a Matlab v7.3 header.
+    with h5py.File(fn_2, "w", userblock_size=512) as f:
+        f["a"] = lfps["a"][None]
+        f["b"] = lfps["b"][:, None]
+    with open(fn_2, "r+b") as f:
+        f.write(b"MATLAB 7.3 MAT-file".ljust(124) + b"\x00\x02IM")
+    for fn in [fn_1, fn_2]:
+        assert lpne.get_lfp_channels(fn) == ["a", "b"]
+        res = lpne.load_lfps(fn)
+        assert sorted(res.keys()) == ["a", "b"]
+        res = lpne.load_lfps(fn, channels=["b"], t_start=10, t_stop=20)
+        assert list(res.keys()) == ["b"]
+        assert np.allclose(res["b"], lfps["b"][10:20])
+        with pytest.warns(UserWarning):
+            lpne.load_lfps(fn, channels=["c"])
+
+
+def test_load_lfps_4(tmp_path):
+    """Make sure cached LFPs match and are rebuilt when the file changes."""
+    cache_dir = str(tmp_path / "cache")
+    fn = str(tmp_path / "lfps.mat")
+    lfps = {"a": np.random.randn(100), "b": np.random.randn(100)}
+    savemat(fn, lfps)
+    target = lpne.load_lfps(fn, cache_dir=False)
+    for _ in range(2):
+        res = lpne.load_lfps(fn, cache_dir=cache_dir)
+        assert sorted(res.keys()) == ["a", "b"]
+        for channel in res:
+            assert np.array_equal(res[channel], target[channel])
+    res = lpne.load_lfps(fn, channels=["a"], t_start=5, t_stop=9, cache_dir=cache_dir)
+    assert list(res.keys()) == ["a"]
+    assert np.array_equal(res["a"], target["a"][5:9])
+    savemat(fn, {"c": np.ones(10)})
+    assert list(lpne.load_lfps(fn, cache_dir=cache_dir).keys()) == ["c"]
+    lpne.clear_lfp_cache(cache_dir)
+    assert os.listdir(cache_dir) == []
+
+
+def test_save_features(tmp_path):
+    """Make sure features saved to a feature store load like ``.npy`` features."""
+    lfps = {f"roi_{i}": np.random.randn(10000) for i in range(3)}
+    features = lpne.make_features(lfps, directed_spectrum=True)
+    fns = [str(tmp_path / ("features" + ext)) for ext in [".npy", ".lpne"]]
+    for fn in fns:
+        lpne.save_features(features, fn)
+    lpne.save_features(features, fns[1])  # overwrite the store
+    for feature in ["power", "dir_spec"]:
+        res_1 = lpne.load_features(fns[0], feature=feature, return_freqs=True)
+        res_2 = lpne.load_features(fns[1], feature=feature, return_freqs=True)
+        assert np.array_equal(res_1[0], res_2[0])
+        assert res_1[1] == res_2[1]
+        assert np.array_equal(res_1[2], res_2[2])
+    power = lpne.load_features(fns[1], mmap=True)[0]
+    assert isinstance(power, np.memmap)
+    assert np.array_equal(power, features["power"])
+
+
+def test_save_features_compressed(tmp_path):
+    """Make sure compressed features match and can be read a few windows at a time."""
+    lfps = {f"roi_{i}": np.random.randn(50000) for i in range(3)}
+    features = lpne.make_features(lfps, directed_spectrum=True)
+    fn = str(tmp_path / "features.lpne")
+    lpne.save_features(features, fn, compression="zlib")
+    for feature in ["power", "dir_spec"]:
+        res = lpne.load_features(fn, feature=feature)[0]
+        assert np.array_equal(res, features[feature])
+    store = lpne.FeatureStore(fn, compression="zlib", chunk_windows=3)
+    store.append(features)
+    power = store.load("power")
+    target = np.concatenate([features["power"]] * 2, axis=0)
+    idx = np.array([15, 2, 9, 2])
+    assert np.array_equal(power[idx], target[idx])
+    assert np.array_equal(power[4:13, 1], target[4:13, 1])
+    assert np.array_equal(power[-1], target[-1])
+    assert np.array_equal(lpne.FeatureDataset(fn)[:], target)
+
+
+def test_save_features_quantized(tmp_path):
+    """Make sure quantized features are close and keep their NaNs."""
+    lfps = {f"roi_{i}": np.random.randn(50000) for i in range(3)}
+    features = lpne.make_features(lfps)
+    features["power"][2] = np.nan
+    for quantization, tol in [("float16", 1e-3), ("int8", 1e-2), ("uint16", 1e-4)]:
+        fn = str(tmp_path / f"features_{quantization}.lpne")
+        lpne.save_features(features, fn, compression="zlib", quantization=quantization)
+        res = lpne.load_features(fn)[0]
+        assert res.dtype == np.float32
+        assert np.array_equal(np.isnan(res), np.isnan(features["power"]))
+        assert np.allclose(
+            res, features["power"], atol=tol * np.nanmax(res), equal_nan=True
+        )
+        error = lpne.FeatureStore(fn).get_quantization_error("power")
+        assert 0.0 < error < tol
+        lazy = lpne.FeatureStore(fn).load("power")
+        assert np.array_equal(lazy[[4, 1]], res[[4, 1]])
+
+
+def test_quantized_store_size(tmp_path):
+    """Make sure int8 stores are smaller than float32 stores, scales included."""
+    lfps = {f"roi_{i}": np.random.randn(500000) for i in range(3)}
+    features = lpne.make_features(lfps)
+    features["power"] = features["power"].astype(np.float32)
+    sizes = {}
+    for quantization in [None, "int8"]:
+        fn = str(tmp_path / f"features_{quantization}.lpne")
+        store = lpne.FeatureStore(fn, chunk_windows=16, quantization=quantization)
+        store.append(dict(power=features["power"][:40], rois=features["rois"]))
+        store.append(dict(power=features["power"][40:], rois=features["rois"]))
+        sizes[quantization] = sum(
+            os.path.getsize(os.path.join(fn, name))
+            for name in os.listdir(fn)
+            if name.endswith(".bin")
+        )
+        res = store.load("power")
+        assert np.allclose(res[:], features["power"], atol=1e-2 * np.max(res[:]))
+        assert np.array_equal(res[[90, 3, 41]], res[:][[90, 3, 41]])
+    assert sizes["int8"] < 0.3 * sizes[None]
+
+
+def test_load_features_and_labels(tmp_path):
+    """Make sure features and labels are loaded in order from mixed file types."""
+    feature_fns, label_fns, target = [], [], []
+    for i, ext in enumerate([".npy", ".lpne", ".npy", ".lpne"]):
+        lfps = {f"roi_{j}": np.random.randn(5000 * (i + 1)) for j in range(2)}
+        # Later files in double precision shouldn't be cast to single precision.
+        dtype = np.float32 if i == 0 else np.float64
+        features = lpne.make_features(lfps, dtype=dtype)
+        feature_fns.append(str(tmp_path / f"features_{i}{ext}"))
+        label_fns.append(str(tmp_path / f"labels_{i}.npy"))
+        lpne.save_features(features, feature_fns[-1])
+        lpne.save_labels(np.full(len(features["power"]), i), label_fns[-1])
+        target.append(features["power"])
+    target = np.concatenate(target, axis=0)
+    for out_fn in [None, str(tmp_path / "out.npy")]:
+        res = lpne.load_features_and_labels(
+            feature_fns,
+            label_fns,
+            group_func=lambda fn: len(fn),
+            n_threads=2,
+            out_fn=out_fn,
+        )
+        assert res[0].dtype == np.float64
+        assert np.array_equal(res[0], target)
+        assert np.array_equal(res[1], np.repeat(np.arange(4), [1, 2, 3, 4]))
+        assert res[2] == ["roi_0", "roi_1"]
+        assert np.array_equal(
+            res[3], np.repeat([len(fn) for fn in feature_fns], [1, 2, 3, 4])
+        )
+
+
+def test_load_features_and_labels_reads(tmp_path, monkeypatch):
+    """Make sure each unindexed .npy feature file is only read once."""
+    feature_fns, label_fns = [], []
+    for i in range(3):
+        lfps = {f"roi_{j}": np.random.randn(5000 * (i + 1)) for j in range(2)}
+        feature_fns.append(str(tmp_path / f"features_{i}.npy"))
+        label_fns.append(str(tmp_path / f"labels_{i}.npy"))
+        lpne.save_features(lpne.make_features(lfps), feature_fns[-1])
+        lpne.save_labels(np.zeros(i + 1), label_fns[-1])
+    loaded_fns = []
+    np_load = np.load
+
+    def counting_load(fn, *args, **kwargs):
+        loaded_fns.append(str(fn))
+        return np_load(fn, *args, **kwargs)
+
+    monkeypatch.setattr(np, "load", counting_load)
+    res = lpne.load_features_and_labels(feature_fns, label_fns)
+    assert len(res[0]) == 6
+    assert sorted(fn for fn in loaded_fns if fn in feature_fns) == feature_fns
+
+
+def test_get_feature_info(tmp_path):
+    """Make sure the feature index matches the files and is updated when they change."""
+    fns = [str(tmp_path / fn) for fn in ["features_1.npy", "features_2.lpne"]]
+    for i, fn in enumerate(fns):
+        lfps = {f"roi_{j}": np.random.randn(5000 * (i + 1)) for j in range(2)}
+        lpne.save_features(lpne.make_features(lfps), fn)
+    index_fn = str(tmp_path / ".lpne_feature_index.json")
+    lpne.get_feature_info(fns)
+    assert not os.path.exists(index_fn)  # reading doesn't change the directory
+    for _ in range(2):
+        info = lpne.get_feature_info(fns, write_index=True)
+        assert [file_info["n_windows"] for file_info in info] == [1, 2]
+        assert info[0]["rois"] == ["roi_0", "roi_1"]
+        assert info[0]["shape"] == lpne.load_features(fns[0])[0].shape[1:]
+        assert np.array_equal(info[0]["freq"], info[1]["freq"])
+    assert os.path.exists(index_fn)
+    lfps = {f"roi_{j}": np.random.randn(10000) for j in range(3)}
+    lpne.save_features(lpne.make_features(lfps), fns[1])
+    assert lpne.get_feature_info(fns[1])[0]["rois"] == ["roi_0", "roi_1", "roi_2"]
+    with pytest.raises(AssertionError):
+        lpne.load_features_and_labels(fns, [fn + ".npy" for fn in fns])
+
+
 if __name__ == "__main__":
     pass
 
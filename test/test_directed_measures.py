@@ -44,6 +44,39 @@ def test_directed_measures_1():
         assert abs(f_max - 40.0) < 5.0, f"{name} peak is too far from 40 Hz!"
 
 
+def test_directed_measures_2():
+    """Check the batched pairwise directed spectrum against each pair alone."""
+    X = np.random.randn(4, 4, 400)
+    X[:, 1:] += 0.5 * np.roll(X[:, :-1], 2, axis=-1)
+    csd_params = dict(nperseg=64, noverlap=32)
+    f, sg, ds = lpne.get_directed_spectral_measures(X, 100, csd_params=csd_params)
+    for i in range(4):
+        for j in range(i + 1, 4):
+            _, sg_ij, ds_ij = lpne.get_directed_spectral_measures(
+                X[:, [i, j]],
+                100,
+                pairwise=False,
+                csd_params=csd_params,
+            )
+            assert np.allclose(ds[:, :, [i, j]][..., [i, j]], ds_ij)
+            assert np.allclose(sg[:, :, [i, j]][..., [i, j]], sg_ij)
+
+
+def test_directed_measures_3():
+    """Check that the parallel measures are identical to the serial measures."""
+    X = np.random.randn(5, 3, 400)
+    csd_params = dict(nperseg=64, noverlap=32)
+    for pairwise in [True, False]:
+        res_1 = lpne.get_directed_spectral_measures(
+            X, 100, pairwise=pairwise, csd_params=csd_params
+        )
+        res_2 = lpne.get_directed_spectral_measures(
+            X, 100, pairwise=pairwise, csd_params=csd_params, n_jobs=2
+        )
+        for arr_1, arr_2 in zip(res_1, res_2):
+            assert np.array_equal(arr_1, arr_2)
+
+
 if __name__ == "__main__":
     pass
 
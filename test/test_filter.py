@@ -0,0 +1,82 @@
+"""
+Test lpne.preprocess.filter
+
+"""
+__date__ = "October 2026"
+
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.signal import butter, iirnotch, lfilter
+
+import lpne
+
+
+def test_filter_lfps():
+    """Make sure the cached filter bank matches separately applied filters."""
+    fs, lowcut, highcut, q = 1000, 0.5, 55.0, 2.0
+    lfps = {f"roi_{i}": np.random.randn(5000) for i in range(3)}
+    lfps["roi_0"][100:200] = np.nan
+    target = {}
+    for channel, x in lfps.items():
+        nan_mask = np.isnan(x)
+        x = np.where(nan_mask, 0.0, x)
+        b, a = butter(3, [lowcut / (0.5 * fs), highcut / (0.5 * fs)], btype="band")
+        x = lfilter(b, a, x)
+        for i, freq in enumerate(range(60, fs // 2, 60)):
+            b, a = iirnotch(freq, (i + 1) * q, fs)
+            x = lfilter(b, a, x)
+        x[nan_mask] = np.nan
+        target[channel] = x
+    res = lpne.filter_lfps({k: v.copy() for k, v in lfps.items()}, fs)
+    for channel in lfps:
+        assert np.allclose(res[channel], target[channel], atol=1e-6, equal_nan=True)
+
+
+def test_filter_lfps_threads():
+    """Make sure filtering and outlier marking don't depend on the threads."""
+    lfps = {f"roi_{i}": np.random.randn(5000) for i in range(5)}
+    lfps["roi_2"][1000] = 100.0
+    res = []
+    for n_threads in [None, 3]:
+        temp = lpne.filter_lfps({k: v.copy() for k, v in lfps.items()}, 1000)
+        temp = lpne.mark_outliers(temp, 1000, n_threads=n_threads)
+        res.append(temp)
+    for channel in lfps:
+        assert np.array_equal(res[0][channel], res[1][channel], equal_nan=True)
+    assert np.isnan(res[1]["roi_2"]).any()
+    with ThreadPoolExecutor(2) as executor:
+        temp = {k: v.copy() for k, v in lfps.items()}
+        temp = lpne.filter_lfps(temp, 1000, executor=executor)
+    assert np.array_equal(temp["roi_0"], res[0]["roi_0"])
+
+
+def test_mark_outliers():
+    """Compare the MAD methods to full medians and check the outlier intervals."""
+    x = np.random.randn(20000)
+    x[1000:1010] += 100.0
+    x[15000:15005] -= 100.0
+    trace = lpne.filter_signal(x.copy(), 1000, 30.0, 55.0, apply_notch_filters=False)
+    deviation = np.abs(trace - np.median(trace))
+    target = deviation > 15.0 * np.median(deviation)
+    for mad_method in ["exact", "histogram"]:
+        lfps, intervals = lpne.mark_outliers(
+            {"a": x.copy()},
+            1000,
+            mad_method=mad_method,
+            chunk_size=3000,
+            return_intervals=True,
+        )
+        assert np.array_equal(np.isnan(lfps["a"]), target)
+        mask = np.zeros(len(x), dtype=bool)
+        for start, stop in intervals["a"]:
+            mask[start:stop] = True
+        assert np.array_equal(mask, target)
+        assert np.all(intervals["a"][1:, 0] > intervals["a"][:-1, 1])
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
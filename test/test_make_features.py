@@ -2,12 +2,15 @@
 Test lpne.make_features functions.
 
 """
-__date__ = "July 2021"
+__date__ = "July 2021 - October 2026"
 
 
 import numpy as np
+from scipy.signal import csd
 
 import lpne
+from lpne.preprocess.cpsd import get_cpsd
+from lpne.preprocess.windows import get_window_onsets, iter_window_chunks, stack_lfps
 
 
 def test_make_features_1():
@@ -42,6 +45,110 @@ def test_make_features_1():
         assert len(res["rois"]) == n_rois, "Incorrect number of ROIs!"
 
 
+def test_make_features_2():
+    """Make sure chunked, overlapping windows match explicitly copied windows."""
+    fs = 1000
+    lfps = {f"roi_{i}": np.random.randn(4321) for i in range(3)}
+    _, X = stack_lfps(lfps)
+    onsets = get_window_onsets(X.shape[1], fs, 1.0, window_step=0.3)
+    chunks = [chunk for _, _, chunk in iter_window_chunks(X, onsets, fs, 4)]
+    target = np.stack([X[:, k : k + fs] for k in onsets], axis=0)
+    assert np.array_equal(np.concatenate(chunks, axis=0), target)
+    res_1 = lpne.make_features(lfps, fs=fs, window_duration=1.0, window_step=0.3)
+    res_2 = lpne.make_features(
+        lfps, fs=fs, window_duration=1.0, window_step=0.3, chunk_size=2
+    )
+    assert res_1["power"].shape[0] == len(onsets)
+    assert np.allclose(res_1["power"], res_2["power"])
+
+
+def test_get_cpsd():
+    """Compare the CPSD engine to scipy.signal.csd."""
+    X = np.random.randn(3, 4, 1000)
+    idx_i, idx_j = np.tril_indices(4)
+    params_2 = {"nperseg": 200, "noverlap": 50, "nfft": 301, "detrend": "linear"}
+    for csd_params in [{}, params_2]:
+        csd_params = {**lpne.preprocess.make_features.DEFAULT_CSD_PARAMS, **csd_params}
+        f, target = csd(X[:, :, None], X[:, None], fs=1000, **csd_params)
+        i1, i2 = np.searchsorted(f, [1.0, 55.0])
+        target = target[:, idx_i, idx_j, i1:i2]
+        f_cpsd, cpsd = get_cpsd(X, 1000, 1.0, 55.0, csd_params)
+        assert np.allclose(f[i1:i2], f_cpsd)
+        assert np.allclose(target, cpsd)
+
+
+def test_spectral_cache():
+    """Make sure features made from a shared SpectralCache match."""
+    fs = 1000
+    lfps = {f"roi_{i}": np.random.randn(5000) for i in range(3)}
+    kwargs = dict(fs=fs, window_duration=1.0, window_step=0.5)
+    res_1 = lpne.make_features(lfps, directed_spectrum=True, psi=True, **kwargs)
+    psi = lpne.get_psi(lfps, **kwargs)["psi"]
+    spectra = lpne.SpectralCache(lfps, chunk_size=3, **kwargs)
+    res_2 = lpne.make_features(spectra, directed_spectrum=True, **kwargs)
+    psi_2 = lpne.get_psi(spectra, **kwargs)["psi"]
+    assert np.allclose(res_1["power"], res_2["power"])
+    assert np.allclose(res_1["dir_spec"], res_2["dir_spec"])
+    assert np.allclose(res_1["psi"], psi)
+    assert np.allclose(psi, psi_2)
+
+
+def test_make_features_zero_windows():
+    """Make sure recordings shorter than a window have empty features."""
+    lfps = {f"roi_{i}": np.random.randn(3000) for i in range(3)}
+    kwargs = dict(fs=1000, window_duration=5.0)
+    target = lpne.make_features({k: np.tile(v, 2) for k, v in lfps.items()}, **kwargs)
+    res = lpne.make_features(lfps, directed_spectrum=True, psi=True, **kwargs)
+    assert res["power"].shape == (0,) + target["power"].shape[1:]
+    assert res["dir_spec"].shape == res["psi"].shape == (0, 3, 3, len(res["freq"]))
+    psi = lpne.get_psi(lfps, **kwargs)
+    assert psi["psi"].shape == (0, 3, 3, len(psi["freq"]))
+    assert np.array_equal(res["freq"], target["freq"])
+    assert np.array_equal(psi["freq"], target["freq"])
+
+
+def test_make_features_3():
+    """Compare single precision features to double precision features."""
+    lfps = {str(i): np.random.randn(6000).astype(np.float32) for i in range(3)}
+    kwargs = dict(window_duration=2.0, spectral_granger=True, directed_spectrum=True)
+    kwargs = {**kwargs, "psi": True, "csd_params": dict(nperseg=256, noverlap=128)}
+    res_64 = lpne.make_features(lfps, **kwargs)
+    res_32 = lpne.make_features(lfps, dtype=np.float32, **kwargs)
+    for key, bound in zip(
+        ["power", "spectral_granger", "dir_spec", "psi"], [1e-6, 1e-5, 1e-5, 1e-5]
+    ):
+        assert res_32[key].dtype == np.float32
+        err = np.max(np.abs(res_32[key] - res_64[key]))
+        assert err <= bound * np.max(np.abs(res_64[key])), key
+
+
+def test_stream_features(tmp_path):
+    """Make sure streamed features match features made from the whole recording."""
+    fs = 1000
+    lfps = {f"roi_{i}": np.random.randn(7777) for i in range(3)}
+    kwargs = dict(fs=fs, window_duration=1.0, directed_spectrum=True, psi=True)
+    for window_step in [None, 0.3, 1.7]:
+        kwargs["window_step"] = window_step
+        target = lpne.make_features(lfps, **kwargs)
+        bounds = [0, 500, 1234, 1235, 4000, 7777]
+        lfp_chunks = (
+            {roi: lfp[t1:t2] for roi, lfp in lfps.items()}
+            for t1, t2 in zip(bounds[:-1], bounds[1:])
+        )
+        store = lpne.FeatureStore(str(tmp_path / f"{window_step}.lpne"))
+        res = list(
+            lpne.stream_features(lfp_chunks, chunk_size=2, store=store, **kwargs)
+        )
+        for key in ["power", "dir_spec", "psi"]:
+            streamed = np.concatenate([r[key] for r in res], axis=0)
+            assert np.allclose(streamed, target[key]), key
+            assert np.allclose(store.load(key), target[key]), key
+        store = lpne.FeatureStore(store.path)
+        assert store.n_windows == len(target["power"])
+        assert store.metadata["rois"] == target["rois"]
+        assert np.allclose(store.metadata["freq"], target["freq"])
+
+
 if __name__ == "__main__":
     pass
 
@@ -2,14 +2,15 @@
 Test lpne.models.
 
 """
-__date__ = "July - November 2021"
+__date__ = "July 2021 - October 2026"
 
 
 from itertools import product
 import numpy as np
 import pytest
 
-from lpne.models import FaSae, CpSae
+import lpne
+from lpne.models import FaSae, CpSae, DcsfaNmf, GridSearchCV
 
 
 def test_factor_analysis_sae():
@@ -82,6 +83,51 @@ def test_cp_sae():
     assert weighted_acc_orig == weighted_acc
 
 
+def test_feature_dataset(tmp_path, monkeypatch):
+    """Train models on lazily loaded features."""
+    b, f, r = 12, 9, 4
+    fns = []
+    for i in range(2):
+        power = np.abs(np.random.randn(b, (r * (r + 1)) // 2, f))
+        power[0, 0, 0] = np.nan
+        fns.append(str(tmp_path / f"features_{i}.lpne"))
+        rois = [str(j) for j in range(r)]
+        lpne.save_features(dict(power=power, rois=rois, freq=np.arange(f)), fns[-1])
+    power = lpne.load_features(fns)[0]
+    labels = np.arange(2 * b) % 3
+    groups = np.repeat([0, 1], b)
+
+    def transform(x):
+        return np.moveaxis(lpne.unsqueeze_triangular_array(x, 1), -1, 1)
+
+    features = lpne.FeatureDataset(fns, transform=transform)
+    assert features.shape == (2 * b, f, r, r)
+    target = transform(power[b - 3 : b + 2])
+    assert np.array_equal(features[b - 3 : b + 2], target, equal_nan=True)
+    order = np.random.permutation(2 * b)
+    for idx, batch in features.iter_batches(5, order=order):
+        assert np.array_equal(batch, transform(power[idx]), equal_nan=True)
+    model = GridSearchCV(CpSae(n_iter=1), {"reg_strength": [0.1]}, cv=2, test_size=1)
+    model.fit(features, labels, groups)
+    assert np.array_equal(
+        model.predict(features, groups), model.predict(np.array(features), groups)
+    )
+    # Flatten the windows for DcsfaNmf.
+    features = lpne.FeatureDataset(fns, transform=lambda x: x.reshape(len(x), -1))
+    idx = np.argwhere(~features.get_nan_mask()).flatten()
+    model = DcsfaNmf(n_components=3, save_folder=str(tmp_path) + "/")
+    # By default, NMF pretraining shouldn't read the whole dataset.
+    monkeypatch.setattr(lpne.models.dcsfa_nmf, "DEFAULT_NMF_MAX_SAMPLES", 10)
+    monkeypatch.setattr(lpne.FeatureDataset, "__array__", None)
+    model.fit(
+        features.subset(idx),
+        (labels[idx] == 0)[:, None].astype(float),
+        n_epochs=1,
+        n_pre_epochs=1,
+        verbose=True,
+    )
+
+
 if __name__ == "__main__":
     pass
 
@@ -0,0 +1,55 @@
+"""
+Test lpne.pipelines
+
+"""
+__date__ = "October 2026"
+
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import lpne
+from lpne.pipelines.standard_pipeline import _iter_file_results
+
+
+def test_manifests(tmp_path):
+    """Make sure features are out of date when their inputs or parameters change."""
+    feature_fn = str(tmp_path / "features.npy")
+    input_fns = dict(lfp=str(tmp_path / "lfp.mat"), chans=str(tmp_path / "chans.mat"))
+    for fn in [feature_fn] + list(input_fns.values()):
+        with open(fn, "wb") as f:
+            f.write(b"data")
+    params = dict(fs=1000, window_duration=2.0, bands=[(1, 4)])
+    assert not lpne.pipelines.is_up_to_date(feature_fn, input_fns, params)
+    lpne.pipelines.write_manifest(feature_fn, input_fns, params)
+    assert lpne.pipelines.is_up_to_date(feature_fn, input_fns, params)
+    assert not lpne.pipelines.is_up_to_date(feature_fn, input_fns, dict(params, fs=500))
+    # Touching a file without changing it doesn't invalidate the features.
+    os.utime(input_fns["lfp"], ns=(0, 0))
+    assert lpne.pipelines.is_up_to_date(feature_fn, input_fns, params)
+    with open(input_fns["chans"], "wb") as f:
+        f.write(b"new data")
+    assert not lpne.pipelines.is_up_to_date(feature_fn, input_fns, params)
+
+
+def test_iter_file_results(tmp_path):
+    """Make sure per-file failures are returned in order instead of raised."""
+    params = lpne.DEFAULT_PIPELINE_PARAMS["preprocess"]
+    jobs = []
+    for ext in [".mat", ".npy", ".mat"]:
+        lfp_fn = str(tmp_path / f"lfp_{len(jobs)}{ext}")
+        chans_fn = str(tmp_path / f"chans_{len(jobs)}.mat")
+        feature_fn = str(tmp_path / f"features_{len(jobs)}.npy")
+        jobs.append((lfp_fn, chans_fn, feature_fn, chans_fn, None, params))
+    with ProcessPoolExecutor(2) as executor:
+        results = list(_iter_file_results(jobs, executor))
+    assert [msg for msg, _ in results] == [None, None, None]
+    errors = [type(error) for _, error in results]
+    assert errors == [FileNotFoundError, NotImplementedError, FileNotFoundError]
+
+
+if __name__ == "__main__":
+    pass
+
+
+###
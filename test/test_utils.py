@@ -74,6 +74,35 @@ def test_get_weights_2():
     assert np.allclose(weights[-2:], np.ones(2))
 
 
+def test_get_outlier_summary():
+    """Compare the outlier matrix to a loop over windows and ROIs."""
+    fs, window_duration = 100, 0.5
+    lfps = {roi: np.random.randn(1234) for roi in ["b", "a", "c"]}
+    lfps["a"][49:51] = np.nan
+    lfps["b"][1199] = np.nan  # in the last complete window
+    lfps["c"][1200:] = np.nan  # after the last complete window
+    msg, outlier_matrix = lpne.get_outlier_summary(
+        lfps, fs, window_duration, return_matrix=True
+    )
+    target = np.zeros((3, 24), dtype=bool)
+    for j, roi in enumerate(["a", "b", "c"]):
+        for i in range(24):
+            target[j, i] = np.isnan(lfps[roi][50 * i : 50 * (i + 1)]).any()
+    assert np.array_equal(outlier_matrix, target)
+    assert msg.startswith("3 of 24 windows contain outliers")
+    mask = lpne.IntervalMask.from_lfps(lfps)
+    res = lpne.get_outlier_summary(
+        lfps, fs, window_duration, mask=mask, return_matrix=True
+    )
+    assert res[0] == msg and np.array_equal(res[1], target)
+    # The outlier matrix can stand in for scanning the LFPs for NaNs.
+    kwargs = dict(fs=fs, window_duration=window_duration, max_freq=40.0)
+    kwargs["csd_params"] = dict(nperseg=32, noverlap=16)
+    features = lpne.make_features(lfps, **kwargs)
+    mask_features = lpne.make_features(lfps, mask=outlier_matrix, **kwargs)
+    assert np.array_equal(features["power"], mask_features["power"], equal_nan=True)
+
+
 if __name__ == "__main__":
     pass
 
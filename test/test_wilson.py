@@ -2,9 +2,10 @@
 Test the Wilson factorization implementation
 
 """
-__date__ = "January 2024"
+__date__ = "January 2024 - October 2026"
 
 import numpy as np
+import pytest
 from scipy.signal import csd
 
 
@@ -37,6 +38,54 @@ def test_wilson_1():
         assert np.allclose(S, rec_S)
 
 
+def test_wilson_2():
+    """Check that factorizing windows together matches factorizing them separately."""
+    d = np.random.randn(6, 3, 200)
+    _, S = csd(
+        d[:, :, None],
+        d[:, None],
+        scaling="spectrum",
+        nperseg=16,
+        return_onesided=False,
+    )
+    S = np.moveaxis(S, -1, 1)  # [n,f,r,r]
+    H, Z, diag = _wilson_factorize(S, return_diagnostics=True)
+    for i in range(len(S)):
+        H_i, Z_i, diag_i = _wilson_factorize(S[i : i + 1], return_diagnostics=True)
+        assert np.allclose(H[i], H_i[0])
+        assert np.allclose(Z[i], Z_i[0])
+        for key in diag:
+            assert diag[key][i] == diag_i[key][0]
+
+
+def test_wilson_3():
+    """Check the diagnostics, including for a singular CPSD."""
+    d = np.random.randn(4, 3, 200)
+    d[1, 1] = d[1, 0]  # singular CPSD
+    _, S = csd(
+        d[:, :, None],
+        d[:, None],
+        scaling="spectrum",
+        nperseg=16,
+        return_onesided=False,
+    )
+    S = np.moveaxis(S, -1, 1)  # [n,f,r,r]
+    with pytest.warns(UserWarning, match="singular"):
+        _, _, diag = _wilson_factorize(S, return_diagnostics=True)
+    assert np.all(diag["converged"])
+    assert np.all(diag["n_iter"] > 0)
+    # Stop at a residual target instead.
+    with pytest.warns(UserWarning, match="singular"):
+        _, _, diag = _wilson_factorize(S, residual_tol=1e-8, return_diagnostics=True)
+    assert np.all(diag["converged"])
+    assert np.all(diag["residual"] < 1e-8)
+    # Run out of iterations.
+    with pytest.warns(UserWarning, match="failed to converge"):
+        _, _, diag = _wilson_factorize(S[[0]], max_iter=1, return_diagnostics=True)
+    assert not diag["converged"][0]
+    assert diag["n_iter"][0] == 1
+
+
 if __name__ == "__main__":
     pass
 